@@ -0,0 +1,5 @@
+"""
+    Benchmarks for pysmith. The benchmarks generate synthetic sites of a configurable size and run representative
+    pipelines over them, recording the time spent in each phase of the build and the peak memory usage. Run
+    :code:`python -m benchmarks --help` for usage.
+"""
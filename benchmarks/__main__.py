@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from pysmith import Pysmith
+
+from .generate import SIZES, generate_site
+from .pipelines import PIPELINES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks pysmith builds.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Generate a synthetic site.")
+    generate_parser.add_argument("site", help="The directory to generate the site in.")
+    _add_size_arguments(generate_parser)
+
+    run_parser = subparsers.add_parser("run", help="Build a generated site and record timings and peak memory.")
+    run_parser.add_argument("site", nargs="?", help="A directory generated by the generate command. If this is not "
+                                                    "specified, a site is generated in a temporary directory.")
+    _add_size_arguments(run_parser)
+    run_parser.add_argument("--pipeline", choices=sorted(PIPELINES), default="full", help="The pipeline to run.")
+    run_parser.add_argument("--repeat", type=int, default=1, help="The number of builds to run.")
+    run_parser.add_argument("--jobs", type=int, help="The jobs option passed to Pysmith.")
+    run_parser.add_argument("--io-workers", type=int, help="The io_workers option passed to Pysmith.")
+    run_parser.add_argument("--sort-files", action="store_true", help="Set the sort_files option of Pysmith.")
+    run_parser.add_argument("--tracemalloc", action="store_true",
+                            help="Measure the peak Python heap with tracemalloc. This slows the build down noticeably.")
+    run_parser.add_argument("--output", help="A JSON file to write the results to.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two results files written by the run command.")
+    compare_parser.add_argument("baseline", help="The results to compare against.")
+    compare_parser.add_argument("candidate", help="The results to check for regressions.")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="The relative slowdown of a phase that counts as a regression.")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        generate_site(args.site, _get_pages(args))
+        return 0
+    elif args.command == "run":
+        return _run(args)
+    else:
+        return _compare(args)
+
+
+def _add_size_arguments(parser):
+    parser.add_argument("--size", choices=sorted(SIZES), default="1k", help="The number of pages to generate.")
+    parser.add_argument("--pages", type=int, help="An exact number of pages to generate, overriding --size.")
+
+
+def _get_pages(args):
+    return args.pages if args.pages is not None else SIZES[args.size]
+
+
+def _run(args):
+    temp_dir = tempfile.mkdtemp(prefix="pysmith-benchmark-")
+    try:
+        site = args.site
+        if site is None:
+            site = os.path.join(temp_dir, "site")
+            generate_site(site, _get_pages(args))
+
+        builds = []
+        for _ in range(args.repeat):
+            dest = os.path.join(temp_dir, "dest")
+            shutil.rmtree(dest, ignore_errors=True)
+
+            pysmith = Pysmith(src=os.path.join(site, "src"), dest=dest, jobs=args.jobs, io_workers=args.io_workers,
+                              sort_files=args.sort_files)
+            PIPELINES[args.pipeline](pysmith, site)
+
+            if args.tracemalloc:
+                tracemalloc.start()
+
+            report = pysmith.build()
+            build = report.to_dict()
+
+            if args.tracemalloc:
+                build["peak_heap"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            builds.append(build)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    results = {
+        "pipeline": args.pipeline,
+        "jobs": args.jobs,
+        "io_workers": args.io_workers,
+        "sort_files": args.sort_files,
+        "builds": builds,
+        "peak_rss": _get_peak_rss(),
+    }
+
+    for i, build in enumerate(builds):
+        print("Build {}: {:.2f}s".format(i + 1, build["wall_time"]))
+        for phase in build["phases"]:
+            files = "-" if phase["files"] is None else phase["files"]
+            print("  {:<20} {:>8.3f}s wall {:>8.3f}s cpu {:>8} files".format(
+                phase["name"], phase["wall_time"], phase["cpu_time"], files))
+
+    print("Peak RSS: {:.1f} MiB".format(results["peak_rss"] / (1024 * 1024)))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+
+def _get_peak_rss():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _compare(args):
+    with open(args.baseline) as f:
+        baseline = _best_phase_times(json.load(f))
+    with open(args.candidate) as f:
+        candidate = _best_phase_times(json.load(f))
+
+    regressions = 0
+    for name, candidate_time in candidate.items():
+        baseline_time = baseline.get(name)
+        if baseline_time is None:
+            print("{:<20} {:>8.3f}s (new)".format(name, candidate_time))
+            continue
+
+        change = (candidate_time - baseline_time) / baseline_time if baseline_time else 0.0
+        regression = change > args.threshold
+        regressions += regression
+        print("{:<20} {:>8.3f}s -> {:>8.3f}s {:>+7.1%}{}".format(
+            name, baseline_time, candidate_time, change, " REGRESSION" if regression else ""))
+
+    return 1 if regressions else 0
+
+
+def _best_phase_times(results):
+    times = {}
+    for build in results["builds"]:
+        phases = build["phases"] + [{"name": "total", "wall_time": build["wall_time"]}]
+        for phase in phases:
+            times[phase["name"]] = min(times.get(phase["name"], phase["wall_time"]), phase["wall_time"])
+
+    return times
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+    Generates synthetic sites to benchmark against.
+"""
+
+import datetime
+import os
+import random
+
+
+#: Named site sizes, mapping to the number of markdown pages to generate.
+SIZES = {
+    "1k": 1000,
+    "10k": 10000,
+    "100k": 100000,
+}
+
+_WORDS = (
+    "lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod", "tempor",
+    "incididunt", "ut", "labore", "et", "dolore", "magna", "aliqua", "enim", "ad", "minim", "veniam", "quis",
+)
+
+_PAGE_LAYOUT = """<!DOCTYPE html>
+<html>
+  <head><title>{{ page.title }}</title></head>
+  <body>
+    <nav>
+      {% for post in site.collections.posts[:10] %}
+      <a href="/{{ post.metadata.permalink }}">{{ post.metadata.title }}</a>
+      {% endfor %}
+    </nav>
+    <article>{{ contents }}</article>
+  </body>
+</html>
+"""
+
+
+def generate_site(path, pages, *, seed=0, asset_size=64 * 1024):
+    """
+        Generates a synthetic site. The site consists of markdown pages with YAML frontmatter, plus one SCSS file, one
+        javascript file and one binary asset for every hundred pages. The source files are written to
+        :code:`<path>/src` and the layouts to :code:`<path>/layouts`.
+
+        :param str path: The directory to generate the site in.
+        :param int pages: The number of markdown pages to generate.
+        :param int seed: The seed for the random contents, so the same site is generated every time.
+        :param int asset_size: The size of each binary asset in bytes.
+    """
+
+    rng = random.Random(seed)
+    src = os.path.join(path, "src")
+    layouts = os.path.join(path, "layouts")
+    os.makedirs(layouts, exist_ok=True)
+
+    with open(os.path.join(layouts, "page.html"), "w") as f:
+        f.write(_PAGE_LAYOUT)
+
+    start_date = datetime.date(2000, 1, 1)
+    for i in range(pages):
+        date = start_date + datetime.timedelta(days=i)
+        _write(os.path.join(src, "posts", str(date.year), "post-{}.md".format(i)), "\n".join((
+            "---",
+            "title: Post {}".format(i),
+            "date: {}".format(date.isoformat()),
+            "layout: page.html",
+            "permalink: /posts/{}/{}/".format(date.year, i),
+            "---",
+            "# Post {}".format(i),
+            "",
+            _paragraphs(rng, 3),
+            "",
+            "* {}".format(_sentence(rng)),
+            "* {}".format(_sentence(rng)),
+            "",
+            "```",
+            "print({})".format(i),
+            "```",
+        )).encode())
+
+    for i in range(max(1, pages // 100)):
+        _write(os.path.join(src, "css", "style-{}.scss".format(i)), "\n".join((
+            "$primary: #{:06x};".format(rng.randrange(0x1000000)),
+            ".block-{} {{".format(i),
+            "  color: $primary;",
+            "  .inner {{ margin: {}px; }}".format(rng.randrange(20)),
+            "}",
+        )).encode())
+        _write(os.path.join(src, "js", "script-{}.js".format(i)), "\n".join((
+            "// Script {}".format(i),
+            "function handler{}(event) {{".format(i),
+            "    var value = event.target.value ;",
+            "    return value   +   {} ;".format(i),
+            "}",
+        )).encode())
+        _write(os.path.join(src, "assets", "asset-{}.bin".format(i)), rng.getrandbits(asset_size * 8).to_bytes(
+            asset_size, "little"))
+
+
+def _write(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(contents)
+
+
+def _sentence(rng):
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randrange(6, 14))).capitalize() + "."
+
+
+def _paragraphs(rng, count):
+    return "\n\n".join(" ".join(_sentence(rng) for _ in range(4)) for _ in range(count))
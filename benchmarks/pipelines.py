@@ -0,0 +1,52 @@
+"""
+    The pipelines that can be benchmarked.
+"""
+
+import os
+
+
+def full_pipeline(pysmith, site):
+    """
+        A typical blog pipeline: Frontmatter, Markdown, Collection, Permalink, LayoutTemplate, Sass and Minify.
+
+        :param pysmith: The pipeline to add the plugins to.
+        :type pysmith: ~pysmith.Pysmith
+        :param str site: The directory the site was generated in.
+    """
+
+    import jinja2
+
+    from pysmith.contrib.core.collection import Collection
+    from pysmith.contrib.core.frontmatter import Frontmatter
+    from pysmith.contrib.web.markdown import Markdown
+    from pysmith.contrib.web.minify import Minify
+    from pysmith.contrib.web.permalink import Permalink
+    from pysmith.contrib.web.sass import Sass
+    from pysmith.contrib.web.template import LayoutTemplate
+
+    pysmith.use(Frontmatter(match_pattern="*.md"))
+    pysmith.use(Markdown(extras=["fenced-code-blocks"]))
+    pysmith.use(Collection(collection_name="posts", match_pattern="*.md", order_by="date", reverse=True))
+    pysmith.use(Permalink(match_pattern="*.md"))
+    pysmith.use(LayoutTemplate(match_pattern="*.html", environment_args={
+        "loader": jinja2.FileSystemLoader(os.path.join(site, "layouts")),
+    }))
+    pysmith.use(Sass())
+    pysmith.use(Minify())
+
+
+def copy_pipeline(pysmith, site):
+    """
+        A pipeline without any plugins, which measures loading and writing the files.
+
+        :param pysmith: The pipeline to add the plugins to.
+        :type pysmith: ~pysmith.Pysmith
+        :param str site: The directory the site was generated in.
+    """
+
+
+#: The available pipelines, by name.
+PIPELINES = {
+    "full": full_pipeline,
+    "copy": copy_pipeline,
+}
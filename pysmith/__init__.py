@@ -3,17 +3,47 @@
     reading of the files, pipeline execution, and finally writing of the files.
 """
 
-import fnmatch
+import asyncio
+import concurrent.futures
+import contextlib
+import cProfile
+import functools
 import logging
+import mmap
 import os
 import shutil
+import stat
+import tempfile
+import threading
 import time
-
-from .util import scantree
+import uuid
+
+from .aio import DEFAULT_CONCURRENCY, CoroutineRunner
+from .cache import DEFAULT_CACHE_SIZE, NullCache, PluginCache
+from .checkpoint import get_checkpoint_key, get_sources_digest, load_checkpoint, save_checkpoint
+from .dependencies import SOURCE, DependencyGraph
+from .diff import diff_outputs
+from .fusion import run_file_chain, split_stages
+from .ignore import IgnoreRules
+from .manifest import Manifest
+from .parallel import run_file_plugin
+from .plugin_util import get_access, is_async_plugin, is_file_plugin
+from .report import BuildReport
+from .schedule import combine_access, get_dependencies, run_graph
+from .server import DevServer, SiteContents
+from .shard import get_listing_digest, get_shard, get_shard_key, get_shard_stop, load_shards, save_shard
+from .store import FileStore
+from .util import (config_fingerprint, content_digest, exchange_paths, file_digest, read_file, scantree,
+                   scantree_parallel)
+from .watch import RESCAN, create_watcher
+from .writer import DELETED, LINK_MODES, UNCHANGED, OutputWriter
 
 
 logger = logging.getLogger("pysmith")
 
+#: Files at least this large are memory-mapped by :meth:`FileInfo.get_buffer` instead of being read into memory.
+MMAP_THRESHOLD = 1024 * 1024
+
 
 class BuildInfo(object):
     """
@@ -25,27 +55,46 @@ class BuildInfo(object):
             The global metadata for the build.
 
         .. attribute:: files
-            :type: dict(str, FileInfo)
+            :type: ~pysmith.store.FileStore
 
             The files uses the file path relative to the source folder as the key and :class:`~pysmith.FileInfo` objects
             as the values. Keys can be added or removed by the plugin, and files can be modified. At the end of the
-            processing pipeline, files will be written based on the keys relative to the destination directory.
+            processing pipeline, files will be written based on the keys relative to the destination directory. The
+            files are held in a dict-like store that indexes the keys, so that :meth:`get_files_by_pattern` does not
+            need to check every key.
+
+        .. attribute:: cache
+            :type: ~pysmith.cache.PluginCache
+
+            The cache plugins can store the results of expensive processing in, using
+            :meth:`~pysmith.cache.PluginCache.get_or_compute`. If the build does not have a cache configured, this is a
+            :class:`~pysmith.cache.NullCache` that always computes the result.
+
+        .. attribute:: dependencies
+            :type: ~pysmith.dependencies.DependencyGraph
+
+            The dependency graph of the build. Plugins that aggregate files, such as collections, record the inputs of
+            the aggregate here. The inputs of the individual outputs are taken from their
+            :attr:`~pysmith.FileInfo.dependencies` at the end of the build.
     """
 
-    __slots__ = ("metadata", "files")
+    __slots__ = ("metadata", "files", "cache", "dependencies", "_rename_count")
 
     def __init__(self, files=None):
         self.metadata = {}
-        self.files = files or {}
+        self.files = files if isinstance(files, FileStore) else FileStore(files)
+        self.cache = NullCache()
+        self.dependencies = DependencyGraph()
+        self._rename_count = 0
 
     def get_files_by_pattern(self, match_pattern):
         """
             Retrieves files from the :attr:`files` object using the given glob pattern.
 
-            :param str match_pattern: The pattern to pass to :func:`fnmatch.filter`.
+            :param str match_pattern: A glob pattern, following the rules of :func:`fnmatch.filter`.
         """
 
-        for file_name in fnmatch.filter(self.files.keys(), match_pattern):
+        for file_name in self.files.match(match_pattern):
             yield file_name, self.files[file_name]
 
     def get_files_by_regex(self, regex):
@@ -56,9 +105,9 @@ class BuildInfo(object):
             :type regex: :class:`re.Pattern`
         """
 
-        for file_name in list(self.files.keys()):
+        for file_name, file_info in self.files.snapshot():
             if regex.search(file_name):
-                yield file_name, self.files[file_name]
+                yield file_name, file_info
 
     def rename_file(self, file_name, new_file_name):
         """
@@ -74,9 +123,16 @@ class BuildInfo(object):
         if file_name == new_file_name:
             return
 
-        file_info = self.files[file_name]
-        del self.files[file_name]
-        self.files[new_file_name] = file_info
+        self.files.rename(file_name, new_file_name)
+        self._rename_count += 1
+
+    def _view(self, metadata):
+        # Shares the files and cache, but counts its own renames, for a stage running concurrently with others.
+        view = BuildInfo(self.files)
+        view.metadata = metadata
+        view.cache = self.cache
+        view.dependencies = self.dependencies
+        return view
 
     def __repr__(self):  # pragma: no cover
         self_type = type(self)
@@ -111,24 +167,60 @@ class FileInfo(object):
         .. attribute:: contents
             :type: bytes
 
-            The raw binary contents of the file.
+            The raw binary contents of the file. Files loaded from the source directory are read lazily the first
+            time this attribute is accessed, so files that are never read only cost their :attr:`stats`.
+
+        .. attribute:: text
+            :type: str
+
+            The contents of the file decoded as UTF-8. The decoded text is kept alongside the bytes, and assigning
+            text replaces the contents without encoding them until the bytes are requested, so a chain of plugins
+            working on text, such as frontmatter, markdown and templates, decodes each file once and encodes it once
+            when it is written. Plugins working on text should use this rather than decoding and encoding
+            :attr:`contents` themselves.
+
+        .. attribute:: modified
+            :type: bool
+
+            Whether the contents of the file were set, either when the file was created or by assigning
+            :attr:`contents` or :attr:`text`. Files that were not modified are copied from :attr:`path` when the output
+            is written.
+
+        .. attribute:: dependencies
+            :type: frozenset(tuple(str, str))
+
+            The inputs the file was produced from, as tuples of the kind and name of the input (see
+            :mod:`pysmith.dependencies`). Files loaded from the source directory depend on their source file, and
+            plugins record the other inputs they read using :meth:`add_dependency`.
+
+        .. attribute:: digest
+            :type: str
+
+            The hex digest of the contents (see :func:`~pysmith.util.content_digest`). It is computed the first time it
+            is requested and kept until :attr:`contents` or :attr:`text` is assigned, so the cache, the manifest and the
+            output writer share a single hash of each file. The contents of files that were not loaded are streamed
+            from their path, rather than loaded or memory-mapped, to compute it. Plugins that need to identify the
+            contents of a file should use it rather than hashing the contents themselves.
     """
 
-    __slots__ = ("name", "path", "stats", "metadata", "_contents")
+    __slots__ = ("name", "path", "stats", "metadata", "_contents", "_text", "_mmap", "_modified", "_dependencies",
+                 "_digest")
 
-    def __init__(self, name, path, stats, contents):
+    def __init__(self, name, path, stats, contents=None):
         self.name = name
         self.path = path
         self.stats = stats
         self.metadata = {}
         self._contents = contents
+        self._text = None
+        self._mmap = None
+        self._modified = contents is not None
+        self._dependencies = None
+        self._digest = None
 
     @staticmethod
     def _from_entry(entry):
-        with open(entry.path, "rb") as f:
-            contents = f.read()
-
-        return FileInfo(entry.name, entry.path, entry.stat(), contents)
+        return FileInfo(entry.name, entry.path, entry.stat())
 
     @property
     def contents(self) -> bytes:
@@ -138,6 +230,14 @@ class FileInfo(object):
             :returns: The file contents
         """
 
+        if self._contents is None:
+            if self._text is not None:
+                self._contents = self._text.encode()
+            else:
+                self._contents = read_file(self.path, self.stats.st_size if self.stats is not None else None)
+
+            self._mmap = None
+
         return self._contents
 
     @contents.setter
@@ -146,6 +246,143 @@ class FileInfo(object):
             raise ValueError("contents field must be a bytes object")
 
         self._contents = value
+        self._text = None
+        self._mmap = None
+        self._modified = True
+        self._digest = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.contents.decode()
+
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        if not isinstance(value, str):
+            raise ValueError("text field must be a str object")
+
+        self._text = value
+        self._contents = None
+        self._mmap = None
+        self._modified = True
+        self._digest = None
+
+    @property
+    def modified(self):
+        return self._modified
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            if self._contents is not None or self._text is not None:
+                self._digest = content_digest(self.contents)
+            elif self._mmap is not None:
+                self._digest = content_digest(self._mmap)
+            else:
+                # Unloaded files are streamed from disk, so hashing them does not keep them in memory.
+                self._digest = file_digest(self.path)
+
+        return self._digest
+
+    @property
+    def dependencies(self):
+        return frozenset(self._dependencies or ())
+
+    def add_dependency(self, kind, name):
+        """
+            Records an input the file was produced from, so the file is regenerated when the input changes.
+
+            :param str kind: The kind of the input, e.g. :data:`~pysmith.dependencies.TEMPLATE`.
+            :param str name: The name of the input.
+        """
+
+        if self._dependencies is None:
+            self._dependencies = set()
+
+        self._dependencies.add((kind, name))
+
+    @property
+    def size(self):
+        """
+            Get the size of the contents without loading them.
+
+            :returns: The size of the contents in bytes
+        """
+
+        if self._contents is not None:
+            return len(self._contents)
+
+        if self._text is not None:
+            # ASCII text has the same length once encoded, which is much cheaper to check than encoding it.
+            return len(self._text) if self._text.isascii() else len(self.contents)
+
+        return self.stats.st_size
+
+    def get_buffer(self):
+        """
+            Get the contents of the file as an object supporting the buffer protocol, without loading large files into
+            memory. If the contents have not been loaded and the file is at least :data:`~pysmith.MMAP_THRESHOLD`
+            bytes, the file is memory-mapped read-only. Otherwise this is the same as :attr:`contents`. The buffer is
+            only valid until the contents are replaced.
+
+            :returns: The file contents
+            :rtype: bytes or mmap.mmap
+        """
+
+        if self._contents is not None or self._text is not None:
+            return self.contents
+
+        if self._mmap is None:
+            # Files that are small according to their stats are read right away, rather than opened twice.
+            if self.stats is not None and self.stats.st_size < MMAP_THRESHOLD:
+                return self.contents
+
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                    return self.contents
+
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self._mmap
+
+    def __getstate__(self):
+        # Unmodified contents are not sent along, since they can be reloaded from the path, and modified contents are
+        # sent in a single representation.
+        contents = self._contents if self._modified else None
+        text = self._text if self._modified and contents is None else None
+        return (self.name, self.path, self.stats, self.metadata, contents, text, self._dependencies, self._digest)
+
+    def __setstate__(self, state):
+        (self.name, self.path, self.stats, self.metadata, self._contents, self._text, self._dependencies,
+         self._digest) = state
+        self._mmap = None
+        self._modified = self._contents is not None or self._text is not None
+
+    def _update_from(self, other):
+        self.metadata = other.metadata
+        self._dependencies = other._dependencies
+        if other._modified:
+            self._contents = other._contents
+            self._text = other._text
+            self._mmap = None
+            self._modified = True
+            self._digest = other._digest
+        elif self._digest is None:
+            # The contents were not modified, so a digest computed by a worker process still applies.
+            self._digest = other._digest
+
+    def _release(self, path):
+        # Drops the contents once they were written to path. Modified contents are reloaded from there if needed.
+        if self._modified:
+            self.path = path
+            self.stats = os.stat(path)
+            self._modified = False
+
+        self._contents = None
+        self._text = None
+        self._mmap = None
 
     def __repr__(self):  # pragma: no cover
         self_type = type(self)
@@ -160,12 +397,145 @@ class Pysmith(object):
 
         :param str src: The path to the source directory.
         :param str dest: The path to the destination directory.
+        :param manifest: The path of the build manifest. If this is specified, builds are incremental: the manifest
+                         records the sources and outputs of each build, the pipeline is skipped entirely when no source
+                         changed, and only outputs whose contents changed are rewritten. Outputs that are no longer
+                         produced are deleted from the destination. A full build is run when the manifest is missing,
+                         when the plugin configuration changed, or when the destination directory does not exist.
+        :type manifest: str or None
+        :param link_mode: How files whose contents were never modified are copied to the destination. If this is None,
+                          the copy is done by the kernel (using :func:`os.copy_file_range` where available) without
+                          passing the contents through Python. If this is :code:`"hardlink"`, the output is a hard link
+                          to the source file. If this is :code:`"reflink"`, the output is a copy-on-write clone of the
+                          source file, falling back to a kernel copy if the file system does not support it.
+        :type link_mode: str or None
+        :param io_workers: The number of threads used to scan the source directory and to write the output files.
+                           Directory listings, file stats and writes are overlapped across the threads, which helps on
+                           network or cold-cache file systems. The loaded files are in the same order regardless of this
+                           setting. If this is None, all I/O is done on the calling thread.
+        :type io_workers: int or None
+        :param jobs: The number of worker processes used to run per-file plugins (see
+                     :class:`~pysmith.plugin_util.FilePlugin`). The results are merged back in file order, so the output
+                     is the same as running the plugins sequentially. If this is None, all plugins run in the calling
+                     process.
+        :type jobs: int or None
+        :param report: The path of a JSON file to write the :class:`~pysmith.report.BuildReport` of each build to. The
+                       size of the files before and after each plugin is only measured when this or
+                       :code:`profile_dir` is set, since measuring modified text means encoding it.
+        :type report: str or None
+        :param profile_dir: A directory to write a :mod:`cProfile` profile of each plugin to. The profiles are named
+                            after the plugin's position in the pipeline and its type, e.g. :code:`01-Markdown.prof`,
+                            and can be inspected with :mod:`pstats`.
+        :type profile_dir: str or None
+        :param cache: A directory to cache the results of plugins in (see :class:`~pysmith.cache.PluginCache`). Plugins
+                      that support caching, such as the bundled markdown, sass, minify and frontmatter plugins, skip
+                      reprocessing files whose contents and plugin configuration were already seen. If this is None and
+                      a :code:`manifest` is set, the cache is kept in a directory named after the manifest with a
+                      :code:`.cache` suffix, so incremental builds only reprocess the changed files: the whole pipeline
+                      still runs, since collections and other plugins may read any file, but cached plugins return the
+                      previous results for unchanged files. Pass False to disable caching.
+        :type cache: str or bool or None
+        :param int cache_size: The maximum size of the cache, in bytes. The least recently used entries are evicted
+                               after each build.
+        :param bool skip_unchanged: Whether to compare each output with the file already in the destination directory
+                                    and leave it untouched if the contents are the same, preserving its modification
+                                    time. Files of a different size are always written. Otherwise the existing file is
+                                    hashed, unless the manifest shows it was not modified since the previous build. The
+                                    outcome of each output is recorded in the :class:`~pysmith.report.BuildReport`.
+        :param bool prune: Whether to delete every file in the destination directory that is not an output of the
+                           build, including files that were not written by pysmith. This removes the outputs of deleted
+                           sources without having to :meth:`clean` the destination.
+        :param bool atomic: Whether to build the new destination directory in a staging directory next to it and swap it
+                            into place once it is complete, so readers never see a partially written site. Outputs that
+                            are unchanged compared to the existing destination are hard linked from it rather than
+                            written, and files that are not outputs of the build are left behind, as with
+                            :code:`prune`. On Linux the swap is atomic. Elsewhere the old directory is renamed away just
+                            before the new one is renamed into place. If the destination is a symbolic link, the
+                            directory it points to is staged and swapped, and the link is kept.
+        :param bool fuse: Whether to fuse consecutive per-file plugins (see :class:`~pysmith.plugin_util.FilePlugin`),
+                          so each file goes through the whole chain of plugins before the next file is processed,
+                          rather than each plugin going through every file. Plugins that are not per-file plugins, such
+                          as collections, and plugins setting :attr:`~pysmith.plugin_util.FilePlugin.barrier` are
+                          barriers between fused chains. When the pipeline ends with a fused chain, each output is
+                          written as soon as it leaves the chain and its contents are then dropped from memory, so
+                          processing and writing overlap and the peak memory use stays low. Fused plugins must not read
+                          the contents of other files, since those files may be at any point of the chain.
+        :param plugin_workers: The number of threads used to run plugins that do not depend on each other
+                               concurrently. Plugins declare the files and metadata they use (see
+                               :class:`~pysmith.plugin_util.Access`), and each plugin waits for the earlier plugins
+                               using the same files or metadata, so the result is the same as running the plugins in
+                               order. Plugins without a declaration wait for every earlier plugin and are waited for by
+                               every later one. If this is None, or if :code:`profile_dir` is set, the plugins run one
+                               after the other.
+        :type plugin_workers: int or None
+        :param checkpoint_dir: The directory to save the checkpoints requested using the :code:`checkpoint` argument of
+                               :meth:`use` in.
+        :type checkpoint_dir: str or None
+        :param ignore: Patterns of files and directories in the source directory to skip, using the syntax of
+                       :code:`.gitignore` files (see :class:`~pysmith.ignore.IgnoreRules`), e.g. :code:`[".git/",
+                       "node_modules/", "*.swp"]`. The patterns are applied while scanning, so ignored directories are
+                       never entered and ignored files are never loaded. Changes to ignored files do not trigger a
+                       rebuild in :meth:`watch`.
+        :type ignore: list(str) or None
+        :param ignore_file: The path of a file containing more ignore patterns, one per line, in the same syntax. It is
+                            read when the :class:`Pysmith` object is created. The file itself is only skipped if it is
+                            in the source directory and matches a pattern.
+        :type ignore_file: str or None
+        :param bool sort_files: Whether to load the files of each directory sorted by name, rather than in the order the
+                                file system lists them in, so the order of the files, and of anything built from it, is
+                                the same on every system.
     """
 
-    def __init__(self, *, src, dest):
+    def __init__(self, *, src, dest, manifest=None, link_mode=None, io_workers=None, jobs=None, report=None,
+                 profile_dir=None, cache=None, cache_size=DEFAULT_CACHE_SIZE, skip_unchanged=False, prune=False,
+                 atomic=False, fuse=False, plugin_workers=None, checkpoint_dir=None, ignore=None, ignore_file=None,
+                 sort_files=False):
+        if link_mode not in LINK_MODES:
+            raise ValueError("Unknown link mode \"{}\"".format(link_mode))
+
         self._src = src
         self._dest = dest
+        self._manifest = manifest
+        self._link_mode = link_mode
+        self._io_workers = io_workers
+        self._jobs = jobs
+        self._report = report
+        self._profile_dir = profile_dir
+        if cache is None and manifest is not None:
+            cache = manifest + ".cache"
+
+        self._cache = PluginCache(cache, max_size=cache_size) if cache not in (None, False) else NullCache()
+        self._skip_unchanged = skip_unchanged
+        self._prune = prune
+        self._atomic = atomic
+        self._fuse = fuse
+        self._plugin_workers = plugin_workers
+        self._checkpoint_dir = checkpoint_dir
+        self._ignore = IgnoreRules(ignore or (), ignore_file=ignore_file)
+        self._sort_files = sort_files
         self._plugins = []
+        self._fingerprints = []
+        self._checkpoints = []
+        self._dependencies = None
+        self._runner = CoroutineRunner()
+
+    @property
+    def dependencies(self):
+        """
+            The dependency graph of the most recent build (see :class:`~pysmith.dependencies.DependencyGraph`). It
+            records the source files, templates and collections behind each output, and can find the outputs that must
+            be regenerated when some of them change. If no build ran yet, the graph is loaded from the manifest.
+
+            :returns: The dependency graph, or None if it is not known.
+            :rtype: ~pysmith.dependencies.DependencyGraph or None
+        """
+
+        if self._dependencies is None and self._manifest is not None:
+            manifest = Manifest.load(self._manifest)
+            if manifest is not None:
+                self._dependencies = manifest.dependencies
+
+        return self._dependencies
 
     def enable_logging(self):  # pragma: no cover
         """
@@ -185,23 +555,41 @@ class Pysmith(object):
 
         return self
 
-    def use(self, plugin):
+    def use(self, plugin, *, checkpoint=False):
         """
-            Add a new plugin instance to the pipeline.
-
-            :param plugin: A plugin that implements the :meth:`build` method.
+            Add a new plugin instance to the pipeline. The plugin's configuration is fingerprinted when it is added, so
+            it should be fully configured before being passed in.
+
+            If :code:`checkpoint` is true, the files, build metadata and dependency graph are saved to the
+            :code:`checkpoint_dir` once the plugin has run. Later builds resume from the most recent checkpoint whose
+            source files (compared by size and modification time), plugin configurations up to the checkpoint and
+            recorded template dependencies are unchanged, skipping every plugin before it. This is useful after
+            expensive plugins, such as markdown or sass, when iterating on the plugins that follow them. The build
+            metadata must be picklable for the checkpoint to be saved.
+
+            :param plugin: A plugin that implements the :meth:`build` method, or an async plugin (see
+                           :func:`~pysmith.plugin_util.is_async_plugin`).
+            :param bool checkpoint: Whether to save a checkpoint after the plugin.
             :returns: self
         """
 
-        if not callable(plugin.build):
+        if not callable(getattr(plugin, "build", None)) and not is_async_plugin(plugin):
             raise ValueError("The passed in plugin does not define a build method")
 
+        if checkpoint and self._checkpoint_dir is None:
+            raise ValueError("A checkpoint directory is required to save checkpoints")
+
+        if checkpoint:
+            self._checkpoints.append(len(self._plugins))
+
         self._plugins.append(plugin)
+        self._fingerprints.append(config_fingerprint(plugin))
         return self
 
     def clean(self):
         """
-            Recursively deletes the destination directory.
+            Recursively deletes the destination directory. To remove the outputs of deleted sources without rewriting
+            the whole site, use the :code:`prune` or :code:`atomic` options instead.
 
             :returns: self
         """
@@ -209,44 +597,797 @@ class Pysmith(object):
         shutil.rmtree(self._dest, onerror=self._handle_clean_error)
         return self
 
-    def build(self):
+    def clear_cache(self):
+        """
+            Deletes every entry in the plugin cache. This has no effect if no cache is configured.
+
+            :returns: self
+        """
+
+        self._cache.clear()
+        return self
+
+    def build(self, *, dry_run=False):
         """
             Executes the plugins in the pipeline to run the build.
+
+            If :code:`dry_run` is true, the pipeline is run, but rather than writing the outputs, they are compared with
+            the existing destination directory, and the differences are returned as the
+            :attr:`~pysmith.report.BuildReport.diff` of the report (see :class:`~pysmith.diff.OutputDiff`). Outputs of a
+            different size are modified without reading the existing file, and existing files are only hashed when the
+            manifest does not show they were left untouched since the previous build. Nothing is written to the
+            destination directory, the manifest or the checkpoints, though checkpoints are resumed from and the plugin
+            cache is used as in a normal build.
+
+            :param bool dry_run: Whether to compare the outputs with the destination directory without writing them.
+            :returns: A report of the time spent in each phase of the build.
+            :rtype: ~pysmith.report.BuildReport
         """
 
-        start_time = time.time()
+        start_time = time.perf_counter()
         logger.info("Starting the build...")
+        report = BuildReport()
 
-        files = self._load_files()
-        build_info = BuildInfo(files)
-        for plugin in self._plugins:
-            logger.info("Executing {}".format(type(plugin).__name__))
-            plugin.build(build_info)
+        with report.add_phase("load").measure() as phase:
+            files = self._load_files()
+            phase.files = len(files)
+            phase.bytes_out = sum(file_info.size for file_info in files.values())
+
+        if dry_run:
+            self._diff_files(report, files)
+        else:
+            self._build_files(report, files, self._manifest is not None)
+
+        return self._finish_report(report, start_time)
+
+    async def build_async(self, *, concurrency=DEFAULT_CONCURRENCY, dry_run=False):
+        """
+            Runs the build like :meth:`build`, without blocking the event loop. The pipeline runs on a thread of the
+            loop's default executor, so synchronous plugins, reading the sources and writing the outputs do not block
+            other tasks. Async plugins, which define a :code:`build_async(self, build_info)` coroutine or implement the
+            per-file contract with a :code:`process_file_async` coroutine (see
+            :class:`~pysmith.plugin_util.AsyncFilePlugin`), are run on the event loop. Async per-file plugins process up
+            to :code:`concurrency` files at the same time, which overlaps their waits on subprocesses or other I/O.
+            With the :code:`plugin_workers` option, async plugins also run concurrently with the synchronous plugins
+            they do not depend on.
+
+            Builds of the same :class:`Pysmith` object must not run at the same time.
+
+            :param int concurrency: The maximum number of files an async per-file plugin processes at the same time.
+            :param bool dry_run: See :meth:`build`.
+            :returns: A report of the time spent in each phase of the build.
+            :rtype: ~pysmith.report.BuildReport
+        """
+
+        loop = asyncio.get_running_loop()
+        runner = self._runner
+        self._runner = CoroutineRunner(concurrency, loop)
+        try:
+            return await loop.run_in_executor(None, functools.partial(self.build, dry_run=dry_run))
+        finally:
+            self._runner = runner
+
+    def build_shard(self, shard, shards, path):
+        """
+            Runs one shard of a sharded build, for sites that take too long to build in a single process or on a single
+            machine. The source files are split into :code:`shards` shards by a stable hash of their names (see
+            :func:`~pysmith.shard.get_shard`), and each shard runs the per-file plugins at the start of the pipeline on
+            its own files. The rest of the pipeline, from the first plugin that is not a per-file plugin, such as a
+            collection, or that sets :attr:`~pysmith.plugin_util.FilePlugin.barrier`, is run by :meth:`merge_shards`.
+            The result of the shard is saved to :code:`path`, and nothing is written to the destination directory.
+
+            Shards only communicate through their result files, so they can run as separate processes on one machine or
+            as separate CI jobs, as long as they see the same source files and plugin configuration. Every shard hashes
+            all the source files to check this. The build metadata and the files must be picklable.
+
+            :param int shard: The index of this shard, from 0 to :code:`shards - 1`.
+            :param int shards: The number of shards.
+            :param str path: The path to save the result of the shard to.
+            :returns: A report of the time spent in each phase of the shard.
+            :rtype: ~pysmith.report.BuildReport
+        """
+
+        if not 0 <= shard < shards:
+            raise ValueError("The shard index must be between 0 and {}".format(shards - 1))
+
+        start_time = time.perf_counter()
+        logger.info("Starting shard {} of {}...".format(shard + 1, shards))
+        report = BuildReport()
+
+        with report.add_phase("load").measure() as phase:
+            sources = self._load_files()
+            files = {file_name: file_info for file_name, file_info in sources.items()
+                     if get_shard(file_name, shards) == shard}
+            phase.files = len(files)
+            phase.bytes_out = sum(file_info.size for file_info in files.values())
 
-        logger.info("Writing the output files to disk...")
+            stop = get_shard_stop(self._plugins)
+            # The sources are identified by their contents, so the key is computed before the plugins modify them.
+            key = get_shard_key(self._fingerprints[:stop], get_listing_digest(sources))
+
+        build_info = BuildInfo(files)
+        build_info.cache = self._cache
+        source_names = {}
         for file_name, file_info in files.items():
-            self._write_file(file_name, file_info.contents)
+            file_info.add_dependency(SOURCE, file_name)
+            source_names[id(file_info)] = file_name
+
+        self._run_plugins(build_info, report, stop=stop)
+
+        with report.add_phase("shard").measure() as phase:
+            shard_files = [
+                (source_names.get(id(file_info)), file_name, file_info)
+                for file_name, file_info in build_info.files.snapshot()
+            ]
+            phase.files = len(shard_files)
+            phase.bytes_out = save_shard(path, key, shard, shards, shard_files, build_info.metadata)
 
-        logger.info("Build completed in {:.2}s".format(time.time() - start_time))
+        self._cache.prune()
+        return self._finish_report(report, start_time)
+
+    def merge_shards(self, paths):
+        """
+            Runs the merge step of a sharded build (see :meth:`build_shard`). The results of every shard are combined,
+            and the plugins the shards did not run are run on the combined files, which are then written to the
+            destination directory as in :meth:`build`. The combined files are in the order of the source files they
+            were loaded from, whatever the number of shards. Files whose contents the shards did not modify are read
+            from the source directory of the merging build.
+
+            :param paths: The paths of the results of every shard, in any order.
+            :type paths: collections.abc.Iterable(str)
+            :returns: A report of the time spent in each phase of the build.
+            :rtype: ~pysmith.report.BuildReport
+            :raises ValueError: If the result of a shard is missing, or if the shards were run with other source files
+                                or another configuration of the plugins they ran.
+        """
+
+        paths = list(paths)
+        start_time = time.perf_counter()
+        logger.info("Merging the results of {} shards...".format(len(paths)))
+        report = BuildReport()
+
+        with report.add_phase("load").measure() as phase:
+            files = self._load_files()
+            phase.files = len(files)
+            phase.bytes_out = sum(file_info.size for file_info in files.values())
+
+        self._build_files(report, files, self._manifest is not None, shard_paths=paths)
+        return self._finish_report(report, start_time)
+
+    def watch(self, *, debounce=0.1, polling=False, poll_interval=1.0, stop_event=None):
+        """
+            Runs a build, then watches the source directory and rebuilds whenever it changes, until interrupted with
+            :code:`Ctrl+C` or until :code:`stop_event` is set.
+
+            Changes are detected using inotify on Linux, or by periodically scanning the source directory elsewhere.
+            Bursts of changes, such as an editor saving several files, are combined into a single rebuild. Between
+            builds the state of the sources and outputs is kept in memory: modified files are re-stat'd rather than
+            rescanning the source directory, the pipeline is skipped if no contents changed, and only outputs whose
+            contents changed are rewritten. If no :code:`cache` directory is configured, a temporary
+            :class:`~pysmith.cache.PluginCache` is used for the duration of the watch, so per-file plugins that support
+            caching only reprocess the changed files. Errors raised by a rebuild are logged, and the next change
+            triggers another rebuild.
+
+            :param float debounce: How long to wait for further changes after a change is detected before rebuilding,
+                                   in seconds.
+            :param bool polling: Whether to detect changes by periodically scanning the source directory, even where
+                                 inotify is available.
+            :param float poll_interval: The interval between scans of the source directory when polling, in seconds.
+            :param stop_event: An event that stops watching once set. It is checked at least twice a second.
+            :type stop_event: threading.Event or None
+        """
+
+        self._run_session(None, True, debounce, polling, poll_interval, stop_event)
+
+    def serve(self, *, host="localhost", port=8000, watch=True, debounce=0.1, polling=False, poll_interval=1.0,
+              stop_event=None):
+        """
+            Runs a development server that serves the outputs of the build from memory, without writing them to the
+            destination directory. The server runs until interrupted with :code:`Ctrl+C` or until :code:`stop_event` is
+            set. Requests for a directory are answered with its :code:`index.html` file, matching the paths created by
+            :class:`~pysmith.contrib.web.permalink.Permalink`, and missing paths with the site's :code:`404.html` file
+            if there is one. Responses carry an ETag and a Last-Modified time derived from the contents, so browsers
+            only download outputs that changed. The build manifest is neither read nor written.
+
+            :param str host: The host to listen on.
+            :param int port: The port to listen on.
+            :param bool watch: Whether to rebuild when the source directory changes, as in :meth:`watch`. The server
+                               keeps serving the previous outputs while rebuilding, and if the rebuild fails.
+            :param float debounce: See :meth:`watch`.
+            :param bool polling: See :meth:`watch`.
+            :param float poll_interval: See :meth:`watch`.
+            :param stop_event: An event that stops the server once set. It is checked at least twice a second.
+            :type stop_event: threading.Event or None
+        """
+
+        site = SiteContents()
+        server = DevServer((host, port), site)
+        thread = threading.Thread(target=server.serve_forever, name="pysmith-server", daemon=True)
+        thread.start()
+        logger.info("Serving on http://{}:{}/".format(host, server.server_address[1]))
+        try:
+            self._run_session(site, watch, debounce, polling, poll_interval, stop_event)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def _run_session(self, site, watch, debounce, polling, poll_interval, stop_event):
+        with contextlib.ExitStack() as stack:
+            watcher = None
+            if watch:
+                if isinstance(self._cache, NullCache):
+                    cache_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="pysmith-cache-"))
+                    stack.callback(setattr, self, "_cache", self._cache)
+                    self._cache = PluginCache(cache_dir, max_size=DEFAULT_CACHE_SIZE)
+
+                watcher = stack.enter_context(create_watcher(self._src, polling=polling, poll_interval=poll_interval,
+                                                             ignore=self._ignore))
+                logger.info("Watching {} for changes...".format(self._src))
+
+            try:
+                self._watch(watcher, debounce, stop_event, site)
+            except KeyboardInterrupt:
+                pass
+
+        logger.info("Stopped")
+
+    def _watch(self, watcher, debounce, stop_event, site):
+        files = sources = manifest = None
+        changes = {RESCAN}
+        while True:
+            if changes:
+                start_time = time.perf_counter()
+                report = BuildReport()
+                try:
+                    with report.add_phase("load").measure() as phase:
+                        if sources is None or not self._restat_sources(sources, changes):
+                            files = self._load_files()
+                        else:
+                            files = {file_name: file_info for file_name, file_info in sources.items()}
+
+                        phase.files = len(files)
+                        phase.bytes_out = sum(file_info.size for file_info in files.values())
+
+                    # The plugins modify the file info objects, so a pristine copy of the sources is kept for the next
+                    # build.
+                    sources = {
+                        file_name: FileInfo(file_info.name, file_info.path, file_info.stats)
+                        for file_name, file_info in files.items()
+                    }
+                    manifest = self._build_files(report, files, True, manifest, site)
+                    self._finish_report(report, start_time)
+                except Exception:
+                    logger.exception("Build failed")
+                    sources = None
+
+            if stop_event is not None and stop_event.is_set():
+                return
+
+            if watcher is None:
+                changes = None
+                time.sleep(0.5)
+                continue
+
+            changes = watcher.wait(0.5)
+            if changes:
+                while True:
+                    more_changes = watcher.wait(debounce)
+                    if not more_changes:
+                        break
+
+                    changes |= more_changes
+
+                logger.info("Detected changes in {}".format(", ".join(sorted(map(str, changes)))))
+
+    def _restat_sources(self, sources, changes):
+        # Modified files are updated in place. Anything else changes the set of files, so the source directory is
+        # rescanned to keep the files in the same order as a full build.
+        for file_name in changes:
+            if file_name is RESCAN:
+                return False
+
+            try:
+                stats = os.stat(os.path.join(self._src, file_name))
+            except FileNotFoundError:
+                if file_name in sources:
+                    return False
+
+                continue
+
+            if file_name not in sources:
+                if stat.S_ISDIR(stats.st_mode) or stat.S_ISREG(stats.st_mode):
+                    return False
+
+                continue
+
+            if not stat.S_ISREG(stats.st_mode):
+                return False
+
+            file_info = sources[file_name]
+            sources[file_name] = FileInfo(file_info.name, file_info.path, stats)
+
+        return True
+
+    def _build_files(self, report, files, incremental, previous_manifest=None, site=None, shard_paths=None):
+        # Outputs served from memory do not match the destination directory, so the manifest file is not used.
+        save_manifest = self._manifest is not None and site is None
+
+        manifest = None
+        # The outputs of the previous build, which are deleted if they are not produced again, even if the previous
+        # manifest cannot be used to skip work because the configuration changed.
+        previous_outputs = previous_manifest.outputs if previous_manifest is not None else {}
+        if incremental:
+            with report.add_phase("manifest").measure():
+                manifest = Manifest(config_fingerprint(self._fingerprints))
+                if previous_manifest is None and save_manifest:
+                    previous_manifest, previous_outputs = self._load_manifest(manifest.fingerprint)
+
+                changes = manifest.update_sources(files, previous_manifest)
+                changed_inputs = previous_manifest.get_changed_inputs() if previous_manifest is not None else []
+
+            if previous_manifest is not None and not changes and not changed_inputs:
+                logger.info("No source changes detected, skipping the pipeline")
+                manifest.outputs = previous_manifest.outputs
+                manifest.output_stats = previous_manifest.output_stats
+                manifest.dependencies = previous_manifest.dependencies
+                manifest.inputs = previous_manifest.inputs
+                self._dependencies = manifest.dependencies
+                report.outputs = {file_name: UNCHANGED for file_name in manifest.outputs}
+                if save_manifest:
+                    manifest.save(self._manifest)
+
+                return manifest
+
+            logger.info("Sources changed: {} added, {} changed, {} removed, {} other inputs changed".format(
+                len(changes.added), len(changes.changed), len(changes.removed), len(changed_inputs)))
+            if previous_manifest is not None:
+                changed_sources = [(SOURCE, file_name) for file_name in changes.changed + changes.removed]
+                affected = previous_manifest.dependencies.affected_outputs(
+                    changed_sources + changed_inputs, added_sources=changes.added)
+                logger.info("{} outputs depend on the changes".format(len(affected)))
+
+        build_info = BuildInfo(files)
+        build_info.cache = self._cache
+        for file_name, file_info in files.items():
+            file_info.add_dependency(SOURCE, file_name)
+
+        checkpoint_keys = self._get_checkpoint_keys(files)
+        if shard_paths is not None:
+            start = self._merge_shards(build_info, files, shard_paths, report)
+        else:
+            start = self._resume(build_info, checkpoint_keys, report)
+
+        if site is not None:
+            self._run_pipeline(build_info, report, start=start, checkpoint_keys=checkpoint_keys)
+            self._record_dependencies(build_info, manifest)
+            with report.add_phase("publish").measure() as phase:
+                for file_name, file_info in files.items():
+                    manifest.outputs[file_name] = file_info.digest
+
+                site.update(files, manifest.outputs)
+                phase.files = len(files)
+
+            logger.info("Serving {} files".format(len(files)))
+            self._cache.prune()
+            return manifest
+
+        writer, staging = self._open_writer()
+        try:
+            with writer:
+                def write_output(file_name, file_info):
+                    self._write_output(writer, file_name, file_info, manifest, previous_manifest, release=True)
+
+                streamed = self._run_pipeline(build_info, report, write_output if self._fuse else None, start,
+                                              checkpoint_keys)
+
+                logger.info("Writing the output files to disk...")
+                with report.add_phase("write").measure() as phase:
+                    if not streamed:
+                        # Stale files are deleted before anything is written, since deleting them may remove their
+                        # directories.
+                        self._delete_stale_outputs(writer, staging, files, previous_outputs)
+                        for file_name, file_info in files.items():
+                            self._write_output(writer, file_name, file_info, manifest, previous_manifest)
+
+                    writer.close()
+                    if staging is not None:
+                        self._swap_staged_files(writer, staging, files)
+                    elif streamed:
+                        self._delete_stale_outputs(writer, staging, files, previous_outputs)
+
+                    if manifest is not None and (self._skip_unchanged or self._atomic):
+                        for file_name in files:
+                            output = writer.outputs[file_name]
+                            manifest.outputs[file_name] = output["digest"]
+                            manifest.output_stats[file_name] = {"size": output["size"], "mtime": output["mtime"]}
+
+                    phase.files = writer.files_written
+                    phase.bytes_out = writer.bytes_written
+                    report.outputs = writer.outcomes
+        except BaseException:
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+
+            raise
+
+        logger.info("Wrote {} files ({} bytes), {} files unchanged, deleted {} files".format(
+            writer.files_written, writer.bytes_written, writer.files_unchanged, writer.files_deleted))
+        self._record_dependencies(build_info, manifest)
+        if save_manifest:
+            manifest.save(self._manifest)
+
+        self._cache.prune()
+        return manifest
+
+    def _diff_files(self, report, files):
+        build_info = BuildInfo(files)
+        build_info.cache = self._cache
+        for file_name, file_info in files.items():
+            file_info.add_dependency(SOURCE, file_name)
+
+        start = self._resume(build_info, self._get_checkpoint_keys(files), report)
+        self._run_pipeline(build_info, report, start=start)
+
+        with report.add_phase("diff").measure() as phase:
+            # The recorded state of the outputs describes the destination whatever the plugin configuration was.
+            previous_manifest = Manifest.load(self._manifest) if self._manifest is not None else None
+            previous_outputs = {}
+            for file_name in files:
+                previous_output = self._get_previous_output(file_name, previous_manifest)
+                if previous_output is not None:
+                    previous_outputs[file_name] = previous_output
+
+            if self._io_workers is None:
+                diff = diff_outputs(self._dest, files, previous_outputs)
+            else:
+                with concurrent.futures.ThreadPoolExecutor(self._io_workers) as executor:
+                    diff = diff_outputs(self._dest, files, previous_outputs, executor)
+
+            phase.files = len(files)
+            phase.bytes_in = sum(file_info.size for file_info in files.values())
+
+        logger.info("Dry run: {} added, {} modified, {} removed, {} unchanged, {:+d} bytes".format(
+            len(diff.added), len(diff.modified), len(diff.removed), len(diff.unchanged), diff.size_delta))
+        report.diff = diff
+        self._cache.prune()
+
+    def _record_dependencies(self, build_info, manifest):
+        dependencies = build_info.dependencies
+        for file_name, file_info in build_info.files.items():
+            dependencies.add_output(file_name, file_info.dependencies)
+
+        self._dependencies = dependencies
+        if manifest is not None:
+            manifest.update_inputs(dependencies)
 
     def _handle_clean_error(self, fn, path, exception_info):
         if exception_info[0] != FileNotFoundError:
             raise exception_info[1]
 
+    def _finish_report(self, report, start_time):
+        report.wall_time = time.perf_counter() - start_time
+        if self._report is not None:
+            report.write_json(self._report)
+
+        logger.info("Build completed in {:.2f}s".format(report.wall_time))
+        return report
+
+    def _get_checkpoint_keys(self, files):
+        if not self._checkpoints:
+            return {}
+
+        sources_digest = get_sources_digest(files)
+        return {
+            index: get_checkpoint_key(self._fingerprints[:index + 1], sources_digest) for index in self._checkpoints
+        }
+
+    def _get_checkpoint_path(self, index):
+        file_name = "{:02d}-{}.checkpoint".format(index, type(self._plugins[index]).__name__)
+        return os.path.join(self._checkpoint_dir, file_name)
+
+    def _resume(self, build_info, checkpoint_keys, report):
+        if not checkpoint_keys:
+            return 0
+
+        with report.add_phase("resume").measure() as phase:
+            for index in reversed(self._checkpoints):
+                path = self._get_checkpoint_path(index)
+                state = load_checkpoint(path, checkpoint_keys[index])
+                if state is None:
+                    continue
+
+                files, build_info.metadata, build_info.dependencies = state
+                build_info.files.clear()
+                build_info.files.update(files)
+                phase.files = len(files)
+                phase.bytes_in = os.path.getsize(path)
+                logger.info("Resuming from the checkpoint after {}".format(type(self._plugins[index]).__name__))
+                return index + 1
+
+        return 0
+
+    def _save_checkpoint(self, build_info, report, index, key):
+        with report.add_phase("checkpoint").measure() as phase:
+            files = build_info.files.snapshot()
+            size = save_checkpoint(self._get_checkpoint_path(index), key, files, build_info.metadata,
+                                   build_info.dependencies)
+            phase.files = len(files)
+            phase.bytes_out = size or 0
+
+    def _merge_shards(self, build_info, files, paths, report):
+        stop = get_shard_stop(self._plugins)
+        with report.add_phase("merge").measure() as phase:
+            key = get_shard_key(self._fingerprints[:stop], get_listing_digest(files))
+            merged_files, metadata = load_shards(paths, key, files)
+            build_info.files.clear()
+            build_info.files.update(merged_files)
+            build_info.metadata.update(metadata)
+            phase.files = len(merged_files)
+            phase.bytes_in = sum(os.path.getsize(path) for path in paths)
+
+        return stop
+
+    def _run_pipeline(self, build_info, report, write=None, start=0, checkpoint_keys=None):
+        # The pipeline is split at the checkpoints, so every plugin before a checkpoint has finished when it is saved.
+        stops = [index + 1 for index in self._checkpoints if index >= start]
+        if not stops or stops[-1] < len(self._plugins):
+            stops.append(len(self._plugins))
+
+        streamed = False
+        for stop in stops:
+            checkpoint = stop - 1 if checkpoint_keys and stop - 1 in checkpoint_keys else None
+            # Streamed outputs are released once written, so they are only streamed after the last checkpoint.
+            streamed = self._run_plugins(build_info, report, write if checkpoint is None else None, start, stop)
+            if checkpoint is not None:
+                self._save_checkpoint(build_info, report, checkpoint, checkpoint_keys[checkpoint])
+
+            start = stop
+
+        return streamed
+
+    def _run_plugins(self, build_info, report, write=None, start=0, stop=None):
+        plugins = self._plugins[start:stop]
+        if self._fuse:
+            stages = [(index + start, plugins, fused) for index, plugins, fused in split_stages(plugins)]
+        else:
+            stages = [(index, [plugin], False) for index, plugin in enumerate(plugins, start)]
+
+        # Phases are added up front, so the report lists them in pipeline order even if stages run concurrently.
+        phases = [report.add_phase("+".join(type(plugin).__name__ for plugin in plugins)) for _, plugins, _ in stages]
+        executor = None
+        executor_lock = threading.Lock()
+        streamed = False
+
+        def get_executor():
+            nonlocal executor
+            with executor_lock:
+                if executor is None:
+                    executor = concurrent.futures.ProcessPoolExecutor(self._jobs)
+
+                return executor
+
+        def create_task(stage_number, stage_build_info):
+            index, plugins, fused = stages[stage_number]
+            # The outputs of the last stage are written as soon as each file went through the chain.
+            on_done = write if fused and stage_number == len(stages) - 1 else None
+            return functools.partial(self._run_stage, stage_build_info, phases[stage_number], index, plugins, fused,
+                                     on_done, get_executor)
+
+        try:
+            # Profiles only cover the thread they were enabled on, so plugins run one after the other when profiling.
+            if self._plugin_workers is None or self._profile_dir is not None or len(stages) < 2:
+                for stage_number in range(len(stages)):
+                    create_task(stage_number, build_info)()
+            else:
+                accesses = [combine_access(map(get_access, plugins)) for _, plugins, _ in stages]
+                dependencies = get_dependencies(accesses, build_info.files)
+                if write is not None and stages[-1][2]:
+                    # Streamed outputs must not change after they are written.
+                    dependencies[-1] = set(range(len(stages) - 1))
+
+                tasks = []
+                for stage_number, access in enumerate(accesses):
+                    uses_metadata = access is None or access.reads_metadata or access.writes_metadata
+                    stage_build_info = build_info._view(build_info.metadata if uses_metadata else {})
+                    tasks.append(create_task(stage_number, stage_build_info))
+
+                run_graph(tasks, dependencies, self._plugin_workers)
+
+            streamed = write is not None and bool(stages) and stages[-1][2]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return streamed
+
+    def _run_stage(self, build_info, phase, index, plugins, fused, on_done, get_executor):
+        plugin = plugins[0]
+        logger.info("Executing {}".format(phase.name))
+
+        rename_count = build_info._rename_count
+        with phase.measure(), self._profile(index, phase.name):
+            if fused:
+                files = [file_info for _, file_info in build_info.files.snapshot()]
+                phase.files = len(files)
+                phase.bytes_in = self._get_size(build_info, files)
+
+                executor = get_executor() if self._jobs is not None else None
+                phase.cpu_time += run_file_chain(plugins, build_info, on_done, executor, self._jobs)
+                phase.bytes_out = self._get_size(build_info, files)
+            elif is_async_plugin(plugin):
+                phase.bytes_in = self._get_size(build_info)
+                self._runner.run(plugin, build_info)
+                phase.bytes_out = self._get_size(build_info)
+            elif not is_file_plugin(plugin):
+                phase.bytes_in = self._get_size(build_info)
+                plugin.build(build_info)
+                phase.bytes_out = self._get_size(build_info)
+            else:
+                matched = list(plugin.get_files(build_info))
+                files = [file_info for _, file_info in matched]
+                phase.files = len(files)
+                phase.bytes_in = self._get_size(build_info, files)
+
+                if self._jobs is None:
+                    plugin.build(build_info)
+                else:
+                    phase.cpu_time += run_file_plugin(plugin, build_info, matched, get_executor(), self._jobs)
+
+                phase.bytes_out = self._get_size(build_info, files)
+
+        phase.renames = build_info._rename_count - rename_count
+
+    def _get_size(self, build_info, file_infos=None):
+        # Sizing text contents encodes it, so plugin phases are only measured when a report or profile is requested.
+        if self._report is None and self._profile_dir is None:
+            return 0
+
+        if file_infos is None:
+            file_infos = [file_info for _, file_info in build_info.files.snapshot()]
+
+        return sum(file_info.size for file_info in file_infos)
+
+    @contextlib.contextmanager
+    def _profile(self, index, name):
+        if self._profile_dir is None:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            os.makedirs(self._profile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(self._profile_dir, "{:02d}-{}.prof".format(index, name)))
+
+    def _load_manifest(self, fingerprint):
+        # Returns the previous manifest if it can be used for an incremental build, and the outputs it lists either way.
+        previous_manifest = Manifest.load(self._manifest)
+        if previous_manifest is None:
+            logger.info("No previous manifest found, running a full build")
+            return None, {}
+
+        if previous_manifest.fingerprint != fingerprint:
+            logger.info("Plugin configuration changed, running a full build")
+        elif not os.path.isdir(self._dest):
+            logger.info("Destination directory is missing, running a full build")
+        else:
+            return previous_manifest, previous_manifest.outputs
+
+        return None, previous_manifest.outputs
+
     def _load_files(self):
+        if self._io_workers is None:
+            return self._load_entries(scantree(self._src, ignore=self._ignore, sort=self._sort_files))
+
+        with concurrent.futures.ThreadPoolExecutor(self._io_workers) as executor:
+            return self._load_entries(scantree_parallel(self._src, executor, self._ignore, self._sort_files))
+
+    def _load_entries(self, entries):
         files = {}
-        for file_name, entry in scantree(self._src):
+        for file_name, entry in entries:
             files[file_name] = FileInfo._from_entry(entry)
 
         return files
 
-    def _write_file(self, file_name, contents):
-        path = os.path.join(self._dest, file_name)
-        dirname = os.path.dirname(path)
-        if not os.path.exists(dirname):
-            os.makedirs(dirname)
-        elif not os.path.isdir(dirname):
-            raise NotADirectoryError("\"{}\" is not a directory".format(dirname))
+    def _open_writer(self):
+        if not self._atomic:
+            writer = OutputWriter(self._dest, workers=self._io_workers, link_mode=self._link_mode,
+                                  skip_unchanged=self._skip_unchanged)
+            return writer, None
+
+        # A symlinked destination is staged and swapped where it points to, so the link itself is left in place.
+        dest = os.path.realpath(self._dest)
+        previous_dest = dest if os.path.isdir(dest) else None
+        staging = os.path.join(os.path.dirname(dest), ".{}.staging-{}".format(
+            os.path.basename(dest), uuid.uuid4().hex[:8]))
+        os.mkdir(staging)
+        writer = OutputWriter(staging, workers=self._io_workers, link_mode=self._link_mode, skip_unchanged=True,
+                              previous_dest=previous_dest)
+        return writer, staging
+
+    def _write_output(self, writer, file_name, file_info, manifest, previous_manifest, release=False):
+        if manifest is None or self._skip_unchanged or self._atomic:
+            # The writer compares the output with the destination, using the recorded state to avoid hashing it.
+            writer.write(file_name, file_info, self._get_previous_output(file_name, previous_manifest), release=release)
+            return
+
+        digest = file_info.digest
+        manifest.outputs[file_name] = digest
+        if (previous_manifest is None or previous_manifest.outputs.get(file_name) != digest or
+                not self._is_output_intact(file_name, file_info, previous_manifest)):
+            writer.write(file_name, file_info, release=release)
+            return
+
+        writer.keep(file_name)
+        if release:
+            file_info._release(os.path.join(self._dest, file_name))
+
+    def _is_output_intact(self, file_name, file_info, previous_manifest):
+        # Outputs deleted or edited outside of pysmith since the previous build are written again.
+        try:
+            stats = os.stat(os.path.join(self._dest, file_name))
+        except OSError:
+            return False
+
+        if not stat.S_ISREG(stats.st_mode) or stats.st_size != file_info.size:
+            return False
+
+        recorded = previous_manifest.output_stats.get(file_name)
+        return recorded is None or (recorded["size"], recorded["mtime"]) == (stats.st_size, stats.st_mtime_ns)
+
+    def _delete_stale_outputs(self, writer, staging, files, previous_outputs):
+        if staging is not None:
+            return
+
+        for file_name in previous_outputs:
+            if file_name not in files:
+                writer.delete(file_name)
+
+        if self._prune and os.path.isdir(self._dest):
+            writer.prune(files)
+
+    def _swap_staged_files(self, writer, staging, files):
+        dest = os.path.realpath(self._dest)
+        if os.path.isdir(dest):
+            shutil.copymode(dest, staging)
+            for file_name, _ in scantree(dest):
+                if file_name not in files:
+                    writer.outcomes[file_name] = DELETED
+                    writer.files_deleted += 1
+
+        self._swap_destination(staging)
+
+        # Files released while streaming refer to their staged output, which is now in the destination.
+        prefix = staging + os.sep
+        for file_info in files.values():
+            if file_info.path.startswith(prefix):
+                file_info.path = os.path.join(dest, file_info.path[len(prefix):])
+
+    def _swap_destination(self, staging):
+        dest = os.path.realpath(self._dest)
+        if not os.path.lexists(dest):
+            os.rename(staging, dest)
+            return
+
+        if not exchange_paths(staging, dest):
+            logger.warning("Atomic directory exchange is not supported, replacing {} with two renames".format(dest))
+            old = staging + ".old"
+            os.rename(dest, old)
+            os.rename(staging, dest)
+            staging = old
+
+        shutil.rmtree(staging)
+
+    def _get_previous_output(self, file_name, previous_manifest):
+        if previous_manifest is None:
+            return None
+
+        stats = previous_manifest.output_stats.get(file_name)
+        digest = previous_manifest.outputs.get(file_name)
+        if stats is None or digest is None:
+            return None
 
-        with open(path, "wb") as f:
-            f.write(contents)
+        return dict(stats, digest=digest)
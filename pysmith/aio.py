@@ -0,0 +1,89 @@
+"""
+    Runs async plugins (see :func:`~pysmith.plugin_util.is_async_plugin`) on an asyncio event loop, for
+    :meth:`~pysmith.Pysmith.build_async`.
+"""
+
+import asyncio
+import inspect
+
+
+#: The number of files an async per-file plugin processes at the same time by default.
+DEFAULT_CONCURRENCY = 16
+
+
+class CoroutineRunner(object):
+    """
+        Runs the coroutines of async plugins from the thread running the pipeline. If the runner has an event loop, the
+        coroutines are run on it and the calling thread waits for them, so the loop stays free for other tasks while the
+        synchronous plugins run. Otherwise each plugin is run using :func:`asyncio.run`.
+
+        :param int concurrency: The maximum number of files an async per-file plugin processes at the same time.
+        :param loop: The event loop to run the coroutines on. It must be running in another thread than the pipeline.
+        :type loop: asyncio.AbstractEventLoop or None
+    """
+
+    __slots__ = ("_concurrency", "_loop")
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, loop=None):
+        if concurrency < 1:
+            raise ValueError("The concurrency must be at least 1")
+
+        self._concurrency = concurrency
+        self._loop = loop
+
+    def run(self, plugin, build_info):
+        """
+            Runs an async plugin and waits for it to finish.
+
+            :param plugin: The plugin to run.
+            :param build_info: The information for the current build.
+            :type build_info: ~pysmith.BuildInfo
+        """
+
+        coroutine = run_plugin_async(plugin, build_info, self._concurrency)
+        if self._loop is None:
+            asyncio.run(coroutine)
+        else:
+            asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}(concurrency={!r}, loop={!r})".format(
+            type(self).__module__, type(self).__name__, self._concurrency, self._loop)
+
+
+async def run_plugin_async(plugin, build_info, concurrency=DEFAULT_CONCURRENCY):
+    """
+        Runs an async plugin. Plugins defining :code:`build_async` are awaited directly. Otherwise the plugin's
+        :code:`process_file_async` coroutine is run for each of its matching files, with at most :code:`concurrency`
+        files in progress at a time. Files are renamed once every file was processed, in the order they were matched
+        in, so the result is the same as processing the files one after the other.
+
+        :param plugin: The plugin to run.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param int concurrency: The maximum number of files processed at the same time.
+    """
+
+    if inspect.iscoroutinefunction(getattr(plugin, "build_async", None)):
+        await plugin.build_async(build_info)
+        return
+
+    files = list(plugin.get_files(build_info))
+    output_names = [None] * len(files)
+    # The workers share a single iterator, so no more than one coroutine per worker exists at any time.
+    pending = iter(enumerate(files))
+
+    async def work():
+        for index, (file_name, file_info) in pending:
+            output_names[index] = await plugin.process_file_async(build_info, file_name, file_info)
+
+    tasks = [asyncio.ensure_future(work()) for _ in range(min(concurrency, len(files)))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    for (file_name, _), output_name in zip(files, output_names):
+        if output_name is not None:
+            build_info.rename_file(file_name, output_name)
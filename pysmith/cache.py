@@ -0,0 +1,205 @@
+"""
+    A content-addressed cache for the outputs of plugins.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+from .util import config_fingerprint
+
+
+logger = logging.getLogger("pysmith")
+
+#: The default maximum size of a :class:`PluginCache`, in bytes.
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+_ENTRY_SUFFIX = ".pickle"
+
+# Part of every key, so entries written by versions of pysmith whose bundled plugins cached other values, e.g. bytes
+# rather than text, are never read.
+_KEY_VERSION = 2
+
+
+class PluginCache(object):
+    """
+        An on-disk cache for results that are a pure function of a file's contents and a plugin's configuration, such
+        as rendered markdown or compiled sass. Entries are keyed by the plugin's type, a fingerprint of its
+        configuration (see :func:`~pysmith.util.config_fingerprint`) and the digest of the file contents, so changing
+        either the plugin options or the file results in a new entry rather than a stale one.
+
+        Entries are written atomically, so the cache can be shared by the worker processes of a build. When the cache
+        grows beyond its maximum size, :meth:`prune` evicts the least recently used entries. The values are stored
+        using :mod:`pickle`, so the cache directory should only be writable by trusted users.
+
+        :param str path: The directory to store the cache in. It is created if it does not exist.
+        :param int max_size: The maximum total size of the entries, in bytes.
+    """
+
+    def __init__(self, path, *, max_size=DEFAULT_CACHE_SIZE):
+        self._path = path
+        self._max_size = max_size
+        self._fingerprints = {}
+
+    def get_or_compute(self, plugin, file_info, compute, *inputs):
+        """
+            Retrieves the cached result for a file, or computes and caches it if there is no entry.
+
+            :param plugin: The plugin producing the result.
+            :param file_info: The file the result is computed from.
+            :type file_info: ~pysmith.FileInfo
+            :param compute: A function without arguments computing the result. It is only called on a cache miss, and
+                            its return value must be picklable. If it raises, nothing is cached.
+            :param inputs: Additional values the result depends on besides the file contents and the plugin
+                           configuration, e.g. the state of files the plugin reads itself. They must be str or bytes.
+            :returns: The cached or computed result.
+        """
+
+        entry_path = self._get_entry_path(self._get_key(plugin, file_info, inputs))
+        try:
+            with open(entry_path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Discarding unreadable cache entry {}: {}".format(entry_path, e))
+        else:
+            # The modification time records the last use, which is what prune evicts by.
+            os.utime(entry_path)
+            return value
+
+        value = compute()
+        self._write_entry(entry_path, value)
+        return value
+
+    def prune(self):
+        """
+            Evicts the least recently used entries until the total size of the cache is within its maximum size.
+
+            :returns: The number of evicted entries.
+            :rtype: int
+        """
+
+        entries = []
+        total_size = 0
+        for entry in self._scan_entries():
+            stats = entry.stat()
+            entries.append((stats.st_mtime_ns, stats.st_size, entry.path))
+            total_size += stats.st_size
+
+        evicted = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
+            evicted += 1
+
+        if evicted:
+            logger.info("Evicted {} entries from the plugin cache".format(evicted))
+
+        return evicted
+
+    def clear(self):
+        """
+            Deletes every entry in the cache.
+        """
+
+        try:
+            shutil.rmtree(self._path)
+        except FileNotFoundError:
+            pass
+
+    def _get_key(self, plugin, file_info, inputs):
+        plugin_type = type(plugin)
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(b"%d\0" % _KEY_VERSION)
+        hasher.update("{}.{}\0".format(plugin_type.__module__, plugin_type.__qualname__).encode())
+        hasher.update(self._get_fingerprint(plugin).encode())
+        hasher.update(file_info.digest.encode())
+        for value in inputs:
+            if isinstance(value, str):
+                value = value.encode()
+
+            hasher.update(b"\0%d\0" % len(value))
+            hasher.update(value)
+
+        return hasher.hexdigest()
+
+    def _get_fingerprint(self, plugin):
+        # The plugin is kept alongside its fingerprint so its id cannot be reused by another object.
+        cached = self._fingerprints.get(id(plugin))
+        if cached is None or cached[0] is not plugin:
+            cached = (plugin, config_fingerprint(plugin))
+            self._fingerprints[id(plugin)] = cached
+
+        return cached[1]
+
+    def _get_entry_path(self, key):
+        return os.path.join(self._path, key[:2], key + _ENTRY_SUFFIX)
+
+    def _write_entry(self, entry_path, value):
+        directory = os.path.dirname(entry_path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _scan_entries(self):
+        try:
+            directories = [entry for entry in os.scandir(self._path) if entry.is_dir()]
+        except FileNotFoundError:
+            return
+
+        for directory in directories:
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    yield entry
+
+    def __getstate__(self):
+        return (self._path, self._max_size)
+
+    def __setstate__(self, state):
+        self._path, self._max_size = state
+        self._fingerprints = {}
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}({!r}, max_size={!r})".format(
+            type(self).__module__, type(self).__name__, self._path, self._max_size)
+
+
+class NullCache(object):
+    """
+        A cache that stores nothing, used by builds that do not have a cache configured. It has the same interface as
+        :class:`PluginCache`.
+    """
+
+    __slots__ = ()
+
+    def get_or_compute(self, plugin, file_info, compute, *inputs):
+        return compute()
+
+    def prune(self):
+        return 0
+
+    def clear(self):
+        pass
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}()".format(type(self).__module__, type(self).__name__)
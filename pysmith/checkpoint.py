@@ -0,0 +1,110 @@
+"""
+    Saves the state of a build after a stage of the pipeline, so later builds can resume from it rather than rerunning
+    the stages before it (see the :code:`checkpoint` argument of :meth:`~pysmith.Pysmith.use`).
+"""
+
+import hashlib
+import logging
+import pickle
+import zlib
+
+from .dependencies import find_changed_inputs, stat_inputs
+from .util import config_fingerprint, write_compressed
+
+
+logger = logging.getLogger("pysmith")
+
+CHECKPOINT_VERSION = 3
+
+
+def get_sources_digest(files):
+    """
+        Computes a digest of the state of the source files, from their names, sizes and modification times.
+
+        :param files: The files loaded from the source directory.
+        :type files: dict(str, ~pysmith.FileInfo)
+        :returns: The hex digest.
+        :rtype: str
+    """
+
+    hasher = hashlib.blake2b(digest_size=20)
+    for file_name, file_info in files.items():
+        stats = file_info.stats
+        hasher.update("{}\0{}\0{}\0".format(file_name, stats.st_size, stats.st_mtime_ns).encode())
+
+    return hasher.hexdigest()
+
+
+def get_checkpoint_key(fingerprints, sources_digest):
+    """
+        Computes the key identifying a checkpoint. A checkpoint can only be resumed from by a build with the same key,
+        i.e. the same source files and the same configuration for every plugin up to and including the checkpoint.
+
+        :param fingerprints: The configuration fingerprints of the plugins before the checkpoint, in order.
+        :type fingerprints: list(str)
+        :param str sources_digest: The digest of the source files, as returned by :func:`get_sources_digest`.
+        :rtype: str
+    """
+
+    return config_fingerprint((list(fingerprints), sources_digest))
+
+
+def save_checkpoint(path, key, files, metadata, dependencies):
+    """
+        Saves the state of a build. Files whose contents were not modified are saved without their contents, which
+        are reloaded from their path on resume. The state of the templates and other inputs outside the source
+        directory the files depend on is recorded, so the checkpoint is not used once they change.
+
+        :param str path: The path of the checkpoint file.
+        :param str key: The key of the checkpoint, as returned by :func:`get_checkpoint_key`.
+        :param files: The files of the build, as returned by :meth:`~pysmith.store.FileStore.snapshot`.
+        :type files: list(tuple(str, ~pysmith.FileInfo))
+        :param dict metadata: The build metadata.
+        :param dependencies: The dependency graph of the build.
+        :type dependencies: ~pysmith.dependencies.DependencyGraph
+        :returns: The size of the checkpoint file in bytes, or None if the build state cannot be pickled.
+        :rtype: int or None
+    """
+
+    inputs = set(dependencies.inputs)
+    for _, file_info in files:
+        inputs.update(file_info.dependencies)
+
+    try:
+        # Files and metadata are pickled together, so collections keep referring to the same file info objects.
+        state = pickle.dumps((files, metadata, dependencies), pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        logger.warning("The build cannot be saved to a checkpoint: {}".format(e))
+        return None
+
+    inputs = sorted(inputs)
+    return write_compressed(path, (CHECKPOINT_VERSION, key, inputs, stat_inputs(inputs)), state)
+
+
+def load_checkpoint(path, key):
+    """
+        Loads the state of a build saved using :func:`save_checkpoint`. The rest of the file is only read once the
+        header shows the checkpoint is still valid.
+
+        :param str path: The path of the checkpoint file.
+        :param str key: The key the checkpoint must have been saved with.
+        :returns: The files, metadata and dependency graph of the build, or None if there is no valid checkpoint.
+        :rtype: tuple(list(tuple(str, ~pysmith.FileInfo)), dict, ~pysmith.dependencies.DependencyGraph) or None
+    """
+
+    try:
+        with open(path, "rb") as f:
+            version, checkpoint_key, inputs, states = pickle.load(f)
+            if version != CHECKPOINT_VERSION or checkpoint_key != key:
+                return None
+
+            if find_changed_inputs(inputs, states):
+                logger.info("The inputs of {} changed, ignoring it".format(path))
+                return None
+
+            return pickle.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Could not load the checkpoint {}: {}".format(path, e))
+        return None
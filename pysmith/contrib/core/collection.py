@@ -1,4 +1,5 @@
 import pysmith.plugin_util
+from pysmith.dependencies import ANY, COLLECTION
 
 
 COLLECTIONS_KEY = "collections"
@@ -25,6 +26,9 @@ class Collection(object):
         self._order_by = pysmith.plugin_util.lambda_or_metadata_selector(order_by)
         self._reverse = reverse
 
+    def get_access(self):
+        return pysmith.plugin_util.Access(files=[self._match_pattern], writes_metadata=True)
+
     def build(self, build_info):
         if COLLECTIONS_KEY not in build_info.metadata:
             build_info.metadata[COLLECTIONS_KEY] = {}
@@ -35,3 +39,61 @@ class Collection(object):
         filtered_files = [f for file_name, f in build_info.get_files_by_pattern(self._match_pattern)]
         filtered_files.sort(key=self._order_by, reverse=self._reverse)
         build_info.metadata[COLLECTIONS_KEY][self._collection_name] = filtered_files
+        build_info.dependencies.add_collection(
+            self._collection_name, (dependency for f in filtered_files for dependency in f.dependencies))
+
+
+def track_collections(metadata, file_info):
+    """
+        Wraps the collections in the build metadata so that reading a collection records a dependency of a file on it.
+        Plugins that render files with access to the whole build metadata, such as the template plugins, use this to
+        find the outputs that must be regenerated when a member of a collection changes.
+
+        :param dict metadata: The build metadata.
+        :param file_info: The file the metadata is used for.
+        :type file_info: ~pysmith.FileInfo
+        :returns: A shallow copy of the metadata with the collections wrapped, or the metadata itself if it contains no
+                  collections.
+        :rtype: dict
+    """
+
+    collections = metadata.get(COLLECTIONS_KEY)
+    if not isinstance(collections, dict):
+        return metadata
+
+    metadata = dict(metadata)
+    metadata[COLLECTIONS_KEY] = _TrackedCollections(collections, file_info)
+    return metadata
+
+
+class _TrackedCollections(dict):
+
+    __slots__ = ("_file_info",)
+
+    def __init__(self, collections, file_info):
+        super().__init__(collections)
+        self._file_info = file_info
+
+    def __getitem__(self, key):
+        self._file_info.add_dependency(COLLECTION, key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._file_info.add_dependency(COLLECTION, key)
+        return super().get(key, default)
+
+    def __iter__(self):
+        self._file_info.add_dependency(COLLECTION, ANY)
+        return super().__iter__()
+
+    def keys(self):
+        self._file_info.add_dependency(COLLECTION, ANY)
+        return super().keys()
+
+    def values(self):
+        self._file_info.add_dependency(COLLECTION, ANY)
+        return super().values()
+
+    def items(self):
+        self._file_info.add_dependency(COLLECTION, ANY)
+        return super().items()
@@ -2,26 +2,32 @@ import logging
 
 import frontmatter
 
+from pysmith.plugin_util import Access, FilePlugin
+
 
 logger = logging.getLogger("pysmith.plugin.frontmatter")
 
 
-class Frontmatter(object):
+class Frontmatter(FilePlugin):
     """
         Parses YAML frontmatter from files. The parsed frontmatter metadata will be added to the file's
-        :attr:`~pysmith.FileInfo.metadata` and removed from the :attr:`~pysmith.FileInfo.contents`.
+        :attr:`~pysmith.FileInfo.metadata` and removed from the :attr:`~pysmith.FileInfo.text`. The parsed result is
+        stored in the build's :attr:`~pysmith.BuildInfo.cache`.
 
         :param str match_pattern: The pattern of files to parse metadata from.
     """
 
     def __init__(self, *, match_pattern="*"):
-        self._match_pattern = match_pattern
-
-    def build(self, build_info):
-        for file_name, file_info in build_info.get_files_by_pattern(self._match_pattern):
-            try:
-                metadata, contents = frontmatter.parse(file_info.contents)
-                file_info.metadata.update(metadata)
-                file_info.contents = contents.encode()
-            except Exception:
-                logger.error("Error parsing frontmatter for {}".format(file_name))
+        super().__init__(match_pattern)
+
+    def get_access(self):
+        return Access(files=[self._match_pattern])
+
+    def process_file(self, build_info, file_name, file_info):
+        try:
+            metadata, contents = build_info.cache.get_or_compute(
+                self, file_info, lambda: frontmatter.parse(file_info.text))
+            file_info.metadata.update(metadata)
+            file_info.text = contents
+        except Exception:
+            logger.error("Error parsing frontmatter for {}".format(file_name))
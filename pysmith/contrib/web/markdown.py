@@ -1,10 +1,12 @@
 import markdown2
 
+from pysmith.plugin_util import Access, FilePlugin
 
-class Markdown(object):
+
+class Markdown(FilePlugin):
     """
-        Renders markdown into html. The file's :attr:`~pysmith.FileInfo.contents` will be updated and the source file
-        will not be renamed.
+        Renders markdown into html. The file's :attr:`~pysmith.FileInfo.text` will be updated and the source file
+        will not be renamed. The rendered html is stored in the build's :attr:`~pysmith.BuildInfo.cache`.
 
         :param str match_pattern: The pattern of files to render.
         :param extras: A list of `extras <https://github.com/trentm/python-markdown2/wiki/Extras>`_ to pass to
@@ -13,9 +15,15 @@ class Markdown(object):
     """
 
     def __init__(self, *, match_pattern="*.md", extras=None):
-        self._match_pattern = match_pattern
+        super().__init__(match_pattern)
         self._extras = extras
 
-    def build(self, build_info):
-        for file_name, f in build_info.get_files_by_pattern(self._match_pattern):
-            f.contents = markdown2.markdown(f.contents, extras=self._extras).encode()
+    def get_access(self):
+        return Access(files=[self._match_pattern])
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.text = build_info.cache.get_or_compute(self, file_info, lambda: self._render(file_info.text))
+
+    def _render(self, text):
+        # markdown2 returns a str subclass carrying extra attributes, which are not needed.
+        return str(markdown2.markdown(text, extras=self._extras))
@@ -1,17 +1,22 @@
 import rjsmin
 
+from pysmith.plugin_util import Access, FilePlugin
 
-class Minify(object):
+
+class Minify(FilePlugin):
     """
-        Minifies javascript using :func:`rjsmin.jsmin`. The file's :attr:`~pysmith.FileInfo.contents` will be updated
-        and the source file will not be renamed.
+        Minifies javascript using :func:`rjsmin.jsmin`. The file's :attr:`~pysmith.FileInfo.text` will be updated
+        and the source file will not be renamed. The minified javascript is stored in the build's
+        :attr:`~pysmith.BuildInfo.cache`.
 
         :param str js_match_pattern: The pattern of javascript files to minify.
     """
 
     def __init__(self, js_match_pattern="*.js"):
-        self._js_match_pattern = js_match_pattern
+        super().__init__(js_match_pattern)
+
+    def get_access(self):
+        return Access(files=[self._match_pattern])
 
-    def build(self, build_info):
-        for _, f in build_info.get_files_by_pattern(self._js_match_pattern):
-            f.contents = rjsmin.jsmin(f.contents)
+    def process_file(self, build_info, file_name, file_info):
+        file_info.text = build_info.cache.get_or_compute(self, file_info, lambda: rjsmin.jsmin(file_info.text))
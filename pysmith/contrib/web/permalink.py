@@ -1,8 +1,8 @@
 from pysmith import BuildInfo
-from pysmith.plugin_util import lambda_or_metadata_selector
+from pysmith.plugin_util import Access, FilePlugin, lambda_or_metadata_selector
 
 
-class Permalink(object):
+class Permalink(FilePlugin):
     """
         Creates permalinks for pages. The permalink will be pulled from the :class:`~pysmith.FileInfo` object as
         specified by the `permalink_selector`, and the file will be moved under the correct key for the new path. If the
@@ -18,20 +18,23 @@ class Permalink(object):
     """
 
     def __init__(self, match_pattern="*.html", permalink_selector="permalink"):
-        self._match_pattern = match_pattern
+        super().__init__(match_pattern)
         self._permalink_selector = lambda_or_metadata_selector(permalink_selector)
 
-    def build(self, build_info: BuildInfo):
-        for file_name, file_info in build_info.get_files_by_pattern(self._match_pattern):
-            try:
-                permalink = self._permalink_selector(file_info)
-            except Exception:
-                continue
+    def get_access(self):
+        # Permalinks can be any path.
+        return Access(files=[self._match_pattern], creates=["*"])
 
-            if permalink.startswith("/"):
-                permalink = permalink[1:]
+    def process_file(self, build_info: BuildInfo, file_name, file_info):
+        try:
+            permalink = self._permalink_selector(file_info)
+        except Exception:
+            return None
 
-            if permalink.endswith("/") or permalink == "":
-                permalink += "index.html"
+        if permalink.startswith("/"):
+            permalink = permalink[1:]
 
-            build_info.rename_file(file_name, permalink)
+        if permalink.endswith("/") or permalink == "":
+            permalink += "index.html"
+
+        return permalink
@@ -3,11 +3,18 @@ import re
 
 import sass
 
+from pysmith.plugin_util import Access, FilePlugin
 
-class Sass(object):
+
+# Files with imports depend on the contents of other files, which are not part of the cache key.
+_IMPORT_REGEX = re.compile(rb"@import\b")
+
+
+class Sass(FilePlugin):
     """
-        Compiles sass/scss into css. The file's :attr:`~pysmith.FileInfo.contents` will be updated and the file will be
-        renamed if necessary based on the output extension.
+        Compiles sass/scss into css. The file's :attr:`~pysmith.FileInfo.text` will be updated and the file will be
+        renamed if necessary based on the output extension. The compiled css of files that do not import other files is
+        stored in the build's :attr:`~pysmith.BuildInfo.cache`.
 
         :param str match_pattern: A regex pattern to specify which files to compile.
         :param str output_extension: The extension the file should have after compilation.
@@ -17,14 +24,24 @@ class Sass(object):
     """
 
     def __init__(self, *, match_pattern=r".*\.(sass|scss)", output_extension=".css", compile_args={}):
-        self._match_pattern = re.compile(match_pattern)
+        super().__init__(re.compile(match_pattern))
         self._output_extension = output_extension
         self._compile_args = compile_args
 
-    def build(self, build_info):
-        for file_name, f in build_info.get_files_by_regex(self._match_pattern):
-            f.contents = sass.compile(string=f.contents, **self._compile_args).encode()
+    def get_access(self):
+        return Access(files=[self._match_pattern], creates=["*" + self._output_extension])
+
+    def process_file(self, build_info, file_name, file_info):
+        if _IMPORT_REGEX.search(file_info.get_buffer()):
+            file_info.text = self._compile(file_info.text)
+        else:
+            file_info.text = build_info.cache.get_or_compute(self, file_info, lambda: self._compile(file_info.text))
+
+        file_name_parts = os.path.splitext(file_name)
+        if file_name_parts[1] != self._output_extension:
+            return file_name_parts[0] + self._output_extension
+
+        return None
 
-            file_name_parts = os.path.splitext(file_name)
-            if file_name_parts[1] != self._output_extension:
-                build_info.rename_file(file_name, file_name_parts[0] + self._output_extension)
+    def _compile(self, text):
+        return sass.compile(string=text, **self._compile_args)
@@ -2,18 +2,26 @@ import logging
 import os
 
 import jinja2
+from jinja2 import meta
 
 import pysmith.plugin_util
+from pysmith.contrib.core.collection import track_collections
+from pysmith.dependencies import ANY, TEMPLATE
+from pysmith.plugin_util import Access, FilePlugin
 
 
 logger = logging.getLogger("pysmith.plugin.template")
 
 
-class _BaseTemplate(object):
+class _BaseTemplate(FilePlugin):
     """
         This class is not intended to be instantiated directly, but instead just serves to hold common logic for both
         template plugins.
 
+        Rendered files record a :data:`~pysmith.dependencies.TEMPLATE` dependency on every template they use, including
+        the templates those extend, include or import, and a :data:`~pysmith.dependencies.COLLECTION` dependency on
+        every collection they read.
+
         :param str match_pattern: The pattern of files to process.
         :param globals: Global values to insert into the underlying :class:`~jinja2.Environment`.
         :type globals: dict(str, object)
@@ -26,8 +34,15 @@ class _BaseTemplate(object):
     """
 
     def __init__(self, *, match_pattern="*", globals=None, global_include=None, environment_args={}):
-        self._match_pattern = match_pattern
+        self._options = {
+            "match_pattern": match_pattern,
+            "globals": globals,
+            "global_include": global_include,
+            "environment_args": environment_args,
+        }
+        super().__init__(match_pattern)
         self._jinja = jinja2.Environment(**environment_args)
+        self._template_dependencies = {}
 
         if globals:
             self._jinja.globals.update(globals)
@@ -38,14 +53,68 @@ class _BaseTemplate(object):
                 if isinstance(val, jinja2.runtime.Macro):
                     self._jinja.globals[key] = val
 
-    def build(self, build_info):
-        for file_name, file_info in build_info.get_files_by_pattern(self._match_pattern):
-            output_name = self.process_file(build_info, file_name, file_info)
-            if output_name is not None:
-                build_info.rename_file(file_name, output_name)
+    def get_access(self):
+        return Access(files=[self._options["match_pattern"]], reads_metadata=True)
+
+    def _add_dependencies(self, file_info, template_names):
+        template_names = list(template_names)
+        if self._options["global_include"]:
+            template_names.append(self._options["global_include"])
+
+        for template_name in template_names:
+            if template_name is None:
+                file_info.add_dependency(TEMPLATE, ANY)
+                continue
+
+            for dependency in self._get_template_dependencies(template_name):
+                file_info.add_dependency(TEMPLATE, dependency)
+
+    def _get_template_dependencies(self, template_name):
+        cached = self._template_dependencies.get(template_name)
+        if cached is not None and all(uptodate() for uptodate in cached[1]):
+            return cached[0]
+
+        dependencies = set()
+        uptodates = []
+        pending = [template_name]
+        seen = set()
+        while pending:
+            name = pending.pop()
+            if name is None:
+                dependencies.add(ANY)
+                continue
+
+            if name in seen:
+                continue
 
-    def process_file(self, build_info, file_name, file_info):  # pragma: no cover
-        raise NotImplementedError("process_file is not implemented")
+            seen.add(name)
+            if self._jinja.loader is None:
+                dependencies.add(name)
+                continue
+
+            try:
+                source, file_name, uptodate = self._jinja.loader.get_source(self._jinja, name)
+            except jinja2.TemplateNotFound:
+                dependencies.add(name)
+                continue
+
+            # Loaders with a relative search path return relative file names, which would not be found once the
+            # working directory changes, and are not recorded as inputs by stat_inputs.
+            dependencies.add(os.path.abspath(file_name) if file_name else name)
+            if uptodate is not None:
+                uptodates.append(uptodate)
+
+            pending.extend(meta.find_referenced_templates(self._jinja.parse(source)))
+
+        # The references of a template are only found again once one of the templates of the closure was modified.
+        self._template_dependencies[template_name] = (dependencies, uptodates)
+        return dependencies
+
+    def __getstate__(self):
+        return self._options
+
+    def __setstate__(self, state):
+        self.__init__(**state)
 
 
 class ContentTemplate(_BaseTemplate):
@@ -56,8 +125,10 @@ class ContentTemplate(_BaseTemplate):
     """
 
     def process_file(self, build_info, file_name, file_info):
-        template = self._jinja.from_string(file_info.contents.decode())
-        file_info.contents = template.render(site=build_info.metadata).encode()
+        source = self._jinja.parse(file_info.text)
+        self._add_dependencies(file_info, meta.find_referenced_templates(source))
+        template = self._jinja.from_string(source)
+        file_info.text = template.render(site=track_collections(build_info.metadata, file_info))
 
 
 class LayoutTemplate(_BaseTemplate):
@@ -80,10 +151,16 @@ class LayoutTemplate(_BaseTemplate):
 
     def __init__(self, *, layout_selector="layout", output_extension=".html", **kwargs):
         super().__init__(**kwargs)
+        self._options.update(layout_selector=layout_selector, output_extension=output_extension)
 
         self._output_extension = output_extension
         self._layout_selector = pysmith.plugin_util.lambda_or_metadata_selector(layout_selector)
 
+    def get_access(self):
+        access = super().get_access()
+        access.creates.append("*" + self._output_extension)
+        return access
+
     def process_file(self, build_info, file_name, file_info):
         try:
             template_name = self._layout_selector(file_info)
@@ -92,9 +169,10 @@ class LayoutTemplate(_BaseTemplate):
             return None
 
         template = self._jinja.get_template(template_name)
-        file_info.contents = template.render(contents=file_info.contents.decode(),
-                                             page=file_info.metadata,
-                                             site=build_info.metadata).encode()
+        self._add_dependencies(file_info, [template_name])
+        file_info.text = template.render(contents=file_info.text,
+                                         page=file_info.metadata,
+                                         site=track_collections(build_info.metadata, file_info))
         file_name_parts = os.path.splitext(file_name)
         if file_name_parts[1] == self._output_extension:
             return None
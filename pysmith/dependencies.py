@@ -0,0 +1,228 @@
+"""
+    Tracks which inputs each output of a build was produced from.
+"""
+
+import os
+
+
+#: The kind of the dependency of a file on the source file it was loaded from. The name is the file name relative to
+#: the source directory.
+SOURCE = "source"
+
+#: The kind of the dependency of a file on a template. The name is the path of the template file, or the template name
+#: if its loader does not load it from a file.
+TEMPLATE = "template"
+
+#: The kind of the dependency of a file on a collection (see :class:`~pysmith.contrib.core.collection.Collection`). The
+#: name is the collection name.
+COLLECTION = "collection"
+
+#: A dependency name matching every input of its kind, used when the exact input is not known, e.g. for templates
+#: included using a name computed at render time.
+ANY = "*"
+
+
+class DependencyGraph(object):
+    """
+        The dependencies of the outputs of a build. Inputs are identified by a tuple of their kind (:data:`SOURCE`,
+        :data:`TEMPLATE` or :data:`COLLECTION`, though plugins may use their own kinds) and their name. Outputs depend
+        on the inputs recorded in their :attr:`~pysmith.FileInfo.dependencies`, and collections depend on the inputs
+        of their members, so a change to a single post affects every output that read a collection containing it.
+    """
+
+    __slots__ = ("_outputs", "_collections")
+
+    def __init__(self):
+        self._outputs = {}
+        self._collections = {}
+
+    @property
+    def outputs(self):
+        """
+            The names of the outputs in the graph.
+
+            :rtype: list(str)
+        """
+
+        return list(self._outputs)
+
+    @property
+    def inputs(self):
+        """
+            Every input of the outputs and collections in the graph.
+
+            :rtype: set(tuple(str, str))
+        """
+
+        inputs = set()
+        for output_inputs in self._outputs.values():
+            inputs.update(output_inputs)
+
+        for collection_inputs in self._collections.values():
+            inputs.update(collection_inputs)
+
+        return inputs
+
+    def add_output(self, output_name, inputs):
+        """
+            Records the inputs of an output.
+
+            :param str output_name: The name of the output, relative to the destination directory.
+            :param inputs: The inputs of the output.
+            :type inputs: collections.abc.Iterable(tuple(str, str))
+        """
+
+        self._outputs.setdefault(output_name, set()).update(inputs)
+
+    def add_collection(self, collection_name, inputs):
+        """
+            Records the inputs of a collection, i.e. the inputs of all of its members.
+
+            :param str collection_name: The name of the collection.
+            :param inputs: The inputs of the members of the collection.
+            :type inputs: collections.abc.Iterable(tuple(str, str))
+        """
+
+        self._collections.setdefault(collection_name, set()).update(inputs)
+
+    def get_inputs(self, output_name):
+        """
+            Retrieves the inputs of an output, including the inputs of the collections it read.
+
+            :param str output_name: The name of the output.
+            :returns: The inputs of the output.
+            :rtype: set(tuple(str, str))
+            :raises KeyError: If the output is not in the graph.
+        """
+
+        inputs = set(self._outputs[output_name])
+        for kind, name in list(inputs):
+            if kind == COLLECTION:
+                if name == ANY:
+                    for collection_inputs in self._collections.values():
+                        inputs.update(collection_inputs)
+                else:
+                    inputs.update(self._collections.get(name, ()))
+
+        return inputs
+
+    def affected_outputs(self, inputs, *, added_sources=()):
+        """
+            Finds the outputs that must be regenerated if the given inputs change.
+
+            :param inputs: The changed or removed inputs.
+            :type inputs: collections.abc.Iterable(tuple(str, str))
+            :param added_sources: The names of the source files that were added. Added files may become members of
+                                  any collection, so every output reading a collection is affected.
+            :type added_sources: collections.abc.Iterable(str)
+            :returns: The names of the affected outputs.
+            :rtype: set(str)
+        """
+
+        changed = set(inputs)
+        added_sources = list(added_sources)
+        changed.update((SOURCE, file_name) for file_name in added_sources)
+
+        for collection_name, collection_inputs in self._collections.items():
+            if added_sources or _is_affected(collection_inputs, changed):
+                changed.add((COLLECTION, collection_name))
+
+        return {output_name for output_name, output_inputs in self._outputs.items()
+                if _is_affected(output_inputs, changed)}
+
+    def to_dict(self):
+        """
+            Converts the graph to a dictionary that can be serialized to JSON.
+
+            :rtype: dict
+        """
+
+        return {
+            "outputs": {name: sorted(map(list, inputs)) for name, inputs in self._outputs.items()},
+            "collections": {name: sorted(map(list, inputs)) for name, inputs in self._collections.items()},
+        }
+
+    @staticmethod
+    def from_dict(data):
+        """
+            Creates a graph from a dictionary created by :meth:`to_dict`.
+
+            :param dict data: The dictionary.
+            :rtype: DependencyGraph
+        """
+
+        graph = DependencyGraph()
+        for name, inputs in data["outputs"].items():
+            graph.add_output(name, map(tuple, inputs))
+
+        for name, inputs in data["collections"].items():
+            graph.add_collection(name, map(tuple, inputs))
+
+        return graph
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}(outputs={!r}, collections={!r})".format(
+            type(self).__module__, type(self).__name__, self._outputs, self._collections)
+
+
+def stat_inputs(inputs):
+    """
+        Records the state of the inputs outside the source directory, i.e. the inputs other than :data:`SOURCE` whose
+        name is an absolute path to an existing file.
+
+        :param inputs: The inputs.
+        :type inputs: collections.abc.Iterable(tuple(str, str))
+        :returns: The :code:`size` and :code:`mtime` (in nanoseconds) of each file, keyed by its path.
+        :rtype: dict(str, dict)
+    """
+
+    states = {}
+    for kind, name in inputs:
+        if kind == SOURCE or not os.path.isabs(name) or name in states:
+            continue
+
+        try:
+            stats = os.stat(name)
+        except OSError:
+            continue
+
+        states[name] = {"size": stats.st_size, "mtime": stats.st_mtime_ns}
+
+    return states
+
+
+def find_changed_inputs(inputs, states):
+    """
+        Checks which inputs changed since their state was recorded using :func:`stat_inputs`.
+
+        :param inputs: The inputs.
+        :type inputs: collections.abc.Iterable(tuple(str, str))
+        :param states: The recorded states. Inputs without a recorded state are never considered changed.
+        :type states: dict(str, dict)
+        :returns: The changed or removed inputs, sorted.
+        :rtype: list(tuple(str, str))
+    """
+
+    changed = set()
+    for kind, name in inputs:
+        state = states.get(name)
+        if state is None:
+            continue
+
+        try:
+            stats = os.stat(name)
+        except OSError:
+            changed.add((kind, name))
+            continue
+
+        if state["size"] != stats.st_size or state["mtime"] != stats.st_mtime_ns:
+            changed.add((kind, name))
+
+    return sorted(changed)
+
+
+def _is_affected(inputs, changed):
+    if not inputs.isdisjoint(changed):
+        return True
+
+    return any((kind, ANY) in inputs for kind, _ in changed)
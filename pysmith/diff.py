@@ -0,0 +1,237 @@
+"""
+    Compares the outputs of a build with the destination directory without writing them, for the :code:`dry_run`
+    argument of :meth:`~pysmith.Pysmith.build`.
+"""
+
+import os
+import stat
+
+from .util import file_digest, scantree
+from .writer import UNCHANGED
+
+
+#: The status of an output that does not exist in the destination.
+ADDED = "added"
+#: The status of an output whose contents differ from the file in the destination.
+MODIFIED = "modified"
+#: The status of a file in the destination that is not an output of the build.
+REMOVED = "removed"
+
+
+class OutputChange(object):
+    """
+        The difference between an output of the build and the destination directory.
+
+        .. attribute:: file_name
+            :type: str
+
+            The name of the file, relative to the destination directory.
+
+        .. attribute:: status
+            :type: str
+
+            :data:`ADDED`, :data:`MODIFIED`, :data:`REMOVED` or :data:`~pysmith.writer.UNCHANGED`.
+
+        .. attribute:: old_size
+            :type: int or None
+
+            The size of the file in the destination, or None if it was added.
+
+        .. attribute:: new_size
+            :type: int or None
+
+            The size of the output, or None if it was removed.
+    """
+
+    __slots__ = ("file_name", "status", "old_size", "new_size")
+
+    def __init__(self, file_name, status, old_size, new_size):
+        self.file_name = file_name
+        self.status = status
+        self.old_size = old_size
+        self.new_size = new_size
+
+    @property
+    def size_delta(self):
+        """
+            The change in size of the file, in bytes.
+
+            :rtype: int
+        """
+
+        return (self.new_size or 0) - (self.old_size or 0)
+
+    def to_dict(self):
+        """
+            Converts the change to a dictionary that can be serialized as JSON.
+
+            :rtype: dict(str, object)
+        """
+
+        data = {key: getattr(self, key) for key in self.__slots__}
+        data["size_delta"] = self.size_delta
+        return data
+
+    def __repr__(self):  # pragma: no cover
+        self_type = type(self)
+        attrs = ", ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__)
+        return "{}.{}({})".format(self_type.__module__, self_type.__name__, attrs)
+
+
+class OutputDiff(object):
+    """
+        The differences between the outputs of a build and the destination directory, as computed by
+        :func:`diff_outputs`. The diff is true if anything would change.
+
+        .. attribute:: changes
+            :type: list(OutputChange)
+
+            The change of every output and removed file, sorted by file name.
+    """
+
+    __slots__ = ("changes",)
+
+    def __init__(self, changes=()):
+        self.changes = sorted(changes, key=lambda change: change.file_name)
+
+    @property
+    def added(self):
+        """
+            The names of the outputs that do not exist in the destination.
+
+            :rtype: list(str)
+        """
+
+        return self._get_file_names(ADDED)
+
+    @property
+    def modified(self):
+        """
+            The names of the outputs whose contents differ from the destination.
+
+            :rtype: list(str)
+        """
+
+        return self._get_file_names(MODIFIED)
+
+    @property
+    def removed(self):
+        """
+            The names of the files in the destination that are not outputs of the build.
+
+            :rtype: list(str)
+        """
+
+        return self._get_file_names(REMOVED)
+
+    @property
+    def unchanged(self):
+        """
+            The names of the outputs whose contents match the destination.
+
+            :rtype: list(str)
+        """
+
+        return self._get_file_names(UNCHANGED)
+
+    @property
+    def size_delta(self):
+        """
+            The change in the total size of the destination, in bytes.
+
+            :rtype: int
+        """
+
+        return sum(change.size_delta for change in self.changes)
+
+    def to_dict(self):
+        """
+            Converts the diff to a dictionary that can be serialized as JSON.
+
+            :rtype: dict(str, object)
+        """
+
+        return {
+            "size_delta": self.size_delta,
+            "changes": [change.to_dict() for change in self.changes],
+        }
+
+    def _get_file_names(self, status):
+        return [change.file_name for change in self.changes if change.status == status]
+
+    def __bool__(self):
+        return any(change.status != UNCHANGED for change in self.changes)
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}(changes={!r})".format(type(self).__module__, type(self).__name__, self.changes)
+
+
+def compare_output(dest, file_name, file_info, previous=None):
+    """
+        Compares an output with the file in the destination. Outputs of a different size are modified. Otherwise the
+        existing file is hashed, unless it is the source file itself (e.g. a hard link to it) or its size and
+        modification time match the state recorded when it was last written.
+
+        :param str dest: The path of the destination directory.
+        :param str file_name: The name of the output, relative to the destination directory.
+        :param file_info: The output.
+        :type file_info: ~pysmith.FileInfo
+        :param previous: The state of the output recorded by the previous build, as in
+                         :meth:`~pysmith.writer.OutputWriter.write`.
+        :type previous: dict or None
+        :rtype: OutputChange
+    """
+
+    size = file_info.size
+    try:
+        stats = os.stat(os.path.join(dest, file_name))
+    except FileNotFoundError:
+        return OutputChange(file_name, ADDED, None, size)
+
+    if not stat.S_ISREG(stats.st_mode):
+        return OutputChange(file_name, MODIFIED, None, size)
+
+    if stats.st_size != size:
+        return OutputChange(file_name, MODIFIED, stats.st_size, size)
+
+    if not file_info.modified and file_info.stats is not None and os.path.samestat(file_info.stats, stats):
+        return OutputChange(file_name, UNCHANGED, stats.st_size, size)
+
+    if previous is not None and previous["size"] == stats.st_size and previous["mtime"] == stats.st_mtime_ns:
+        existing_digest = previous["digest"]
+    else:
+        existing_digest = file_digest(os.path.join(dest, file_name))
+
+    status = UNCHANGED if existing_digest == file_info.digest else MODIFIED
+    return OutputChange(file_name, status, stats.st_size, size)
+
+
+def diff_outputs(dest, files, previous_outputs=None, executor=None):
+    """
+        Compares the outputs of a build with the destination directory (see :func:`compare_output`). Every file in the
+        destination that is not an output is reported as removed, whether or not the build would delete it.
+
+        :param str dest: The path of the destination directory.
+        :param files: The outputs of the build.
+        :type files: dict(str, ~pysmith.FileInfo)
+        :param previous_outputs: The state of the outputs recorded by the previous build, keyed by file name.
+        :type previous_outputs: dict(str, dict) or None
+        :param executor: A thread pool to compare the outputs on, or None to compare them on the calling thread.
+        :type executor: concurrent.futures.Executor or None
+        :rtype: OutputDiff
+    """
+
+    previous_outputs = previous_outputs or {}
+
+    def compare(item):
+        file_name, file_info = item
+        return compare_output(dest, file_name, file_info, previous_outputs.get(file_name))
+
+    items = list(files.items())
+    changes = list(map(compare, items) if executor is None else executor.map(compare, items))
+    if os.path.isdir(dest):
+        for file_name, entry in scantree(dest):
+            if file_name not in files:
+                changes.append(OutputChange(file_name, REMOVED, entry.stat().st_size, None))
+
+    return OutputDiff(changes)
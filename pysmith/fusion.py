@@ -0,0 +1,144 @@
+"""
+    Runs chains of per-file plugins file by file rather than plugin by plugin, for the :code:`fuse` option of
+    :class:`~pysmith.Pysmith`.
+"""
+
+import time
+
+from .parallel import load_stage, run_in_workers
+from .plugin_util import get_access, is_async_plugin, is_file_plugin
+from .schedule import combine_access
+
+
+# Chunks are kept small so the first files come back from the workers, and can be written, early in the stage.
+_MAX_CHUNK_SIZE = 64
+
+
+def is_fusable(plugin):
+    """
+        Checks whether a plugin can be fused with its neighbours. This is the case for plugins that implement the
+        per-file contract (see :func:`~pysmith.plugin_util.is_file_plugin`), can match a single file name using a
+        :code:`matches` method, do not set the :attr:`~pysmith.plugin_util.FilePlugin.barrier` attribute, and are not
+        async plugins (see :func:`~pysmith.plugin_util.is_async_plugin`).
+
+        :param plugin: The plugin to check.
+        :returns: bool
+    """
+
+    return (is_file_plugin(plugin) and callable(getattr(plugin, "matches", None)) and
+            not getattr(plugin, "barrier", False) and not is_async_plugin(plugin))
+
+
+def split_stages(plugins):
+    """
+        Splits a pipeline into stages. Consecutive fusable plugins are grouped into a single stage, and every other
+        plugin is a stage of its own.
+
+        :param plugins: The plugins of the pipeline, in order.
+        :returns: The stages, as tuples of the index of the first plugin in the pipeline, the plugins of the stage, and
+                  whether the stage is fused.
+        :rtype: list(tuple(int, list, bool))
+    """
+
+    stages = []
+    for index, plugin in enumerate(plugins):
+        fusable = is_fusable(plugin)
+        if fusable and stages and stages[-1][2]:
+            stages[-1][1].append(plugin)
+        else:
+            stages.append((index, [plugin], fusable))
+
+    return stages
+
+
+def process_file_chain(plugins, build_info, file_name, file_info):
+    """
+        Passes a single file through a chain of plugins. Each plugin is only applied if it matches the name of the file
+        at that point in the chain, so a file renamed by one plugin is matched by the next ones under its new name.
+
+        :param plugins: The fusable plugins of the chain.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param str file_name: The name of the file before the chain.
+        :param file_info: The file to process.
+        :type file_info: ~pysmith.FileInfo
+        :returns: The name of the file after the chain.
+        :rtype: str
+    """
+
+    for plugin in plugins:
+        if plugin.matches(file_name):
+            output_name = plugin.process_file(build_info, file_name, file_info)
+            if output_name is not None:
+                file_name = output_name
+
+    return file_name
+
+
+def run_file_chain(plugins, build_info, on_done=None, executor=None, jobs=None):
+    """
+        Runs a chain of fusable plugins over every file of the build, one file at a time. Each file is renamed once at
+        the end of the chain, and passed to :code:`on_done` as soon as it went through the chain, so it can be written
+        while the remaining files are still being processed.
+
+        If an executor is given, the files are processed in chunks on the process pool. The chunks in flight are
+        bounded, and their results are merged back in submission order. If the plugins or the build metadata cannot be
+        pickled, or the chain matches too few files to be worth sending to the workers, the chain is run sequentially
+        instead.
+
+        :param plugins: The fusable plugins of the chain.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param on_done: A function called with the output name and the :class:`~pysmith.FileInfo` of every file.
+        :param executor: The process pool to run the chain on, or None to run it in the calling process.
+        :type executor: concurrent.futures.ProcessPoolExecutor or None
+        :param jobs: The number of worker processes in the pool.
+        :type jobs: int or None
+        :returns: The CPU time spent in the worker processes, in seconds.
+    """
+
+    files = build_info.files.snapshot()
+    if executor is None:
+        return _run_sequential(plugins, build_info, files, on_done)
+
+    matched = []
+    for file_name, file_info in files:
+        # Files no plugin matches are left untouched by the chain, so they do not need to be sent to the workers.
+        if any(plugin.matches(file_name) for plugin in plugins):
+            matched.append((file_name, file_info))
+        else:
+            _finish_file(build_info, file_name, file_name, file_info, on_done)
+
+    def on_result(file_name, output_name, file_info):
+        _finish_file(build_info, file_name, output_name, file_info, on_done)
+
+    return run_in_workers(_process_chain_chunk, plugins, build_info, matched, executor, jobs, on_result,
+                          lambda: _run_sequential(plugins, build_info, matched, on_done),
+                          combine_access(map(get_access, plugins)), _MAX_CHUNK_SIZE)
+
+
+def _run_sequential(plugins, build_info, files, on_done):
+    for file_name, file_info in files:
+        output_name = process_file_chain(plugins, build_info, file_name, file_info)
+        _finish_file(build_info, file_name, output_name, file_info, on_done)
+
+    return 0.0
+
+
+def _finish_file(build_info, file_name, output_name, file_info, on_done):
+    if output_name != file_name:
+        build_info.rename_file(file_name, output_name)
+
+    if on_done is not None:
+        on_done(output_name, file_info)
+
+
+def _process_chain_chunk(stage, chunk):
+    start_cpu_time = time.process_time()
+    plugins, build_info = load_stage(stage)
+
+    results = []
+    for file_name, file_info in chunk:
+        results.append((process_file_chain(plugins, build_info, file_name, file_info), file_info))
+
+    return results, time.process_time() - start_cpu_time
@@ -0,0 +1,146 @@
+"""
+    Ignore rules deciding which files and directories of the source directory are skipped while scanning it, for the
+    :code:`ignore` and :code:`ignore_file` options of :class:`~pysmith.Pysmith`.
+"""
+
+import os
+import re
+
+
+class IgnoreRules(object):
+    """
+        A list of patterns using the syntax of :code:`.gitignore` files:
+
+        * A pattern without a slash, such as :code:`*.swp`, matches files and directories at any depth.
+        * A pattern containing a slash, such as :code:`/drafts` or :code:`assets/vendor`, matches paths relative to the
+          source directory.
+        * A trailing slash, as in :code:`cache/`, only matches directories.
+        * :code:`**` matches any number of directories, e.g. :code:`**/tmp` or :code:`docs/**/*.bak`.
+        * A leading :code:`!` re-includes paths excluded by an earlier pattern. The last matching pattern wins.
+        * Blank lines and lines starting with :code:`#` are skipped.
+
+        Ignored directories are never entered, so the files below them cannot be re-included.
+
+        :param patterns: The patterns.
+        :type patterns: collections.abc.Iterable(str)
+        :param ignore_file: The path of a file containing more patterns, one per line. They are applied after the
+                            patterns passed in directly.
+        :type ignore_file: str or None
+        :raises OSError: If the ignore file cannot be read.
+    """
+
+    __slots__ = ("_rules",)
+
+    def __init__(self, patterns=(), *, ignore_file=None):
+        patterns = list(patterns)
+        if ignore_file is not None:
+            with open(ignore_file, encoding="utf-8") as f:
+                patterns.extend(f.read().splitlines())
+
+        self._rules = [rule for rule in map(_parse_pattern, patterns) if rule is not None]
+
+    def is_ignored(self, file_name, is_dir=False):
+        """
+            Checks whether a path is ignored, either because it matches the rules or because one of its parent
+            directories does.
+
+            :param str file_name: The path, relative to the source directory.
+            :param bool is_dir: Whether the path is a directory.
+            :rtype: bool
+        """
+
+        parts = file_name.split(os.sep)
+        for index in range(1, len(parts)):
+            if self.matches(os.sep.join(parts[:index]), True):
+                return True
+
+        return self.matches(file_name, is_dir)
+
+    def matches(self, file_name, is_dir=False):
+        """
+            Checks whether a path matches the rules, without checking its parent directories. This is enough for
+            scanners that never enter ignored directories, and cheaper than :meth:`is_ignored`.
+
+            :param str file_name: The path, relative to the source directory.
+            :param bool is_dir: Whether the path is a directory.
+            :rtype: bool
+        """
+
+        if os.sep != "/":
+            file_name = file_name.replace(os.sep, "/")
+
+        for regex, negated, directory_only in reversed(self._rules):
+            if (is_dir or not directory_only) and regex.match(file_name):
+                return not negated
+
+        return False
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}(rules={!r})".format(type(self).__module__, type(self).__name__, self._rules)
+
+
+def _parse_pattern(pattern):
+    pattern = pattern.rstrip()
+    if not pattern or pattern.startswith("#"):
+        return None
+
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\"):
+        pattern = pattern[1:]
+
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+
+    anchored = "/" in pattern
+    prefix = "" if anchored else "(?:.*/)?"
+    return (re.compile(prefix + _translate(pattern.lstrip("/")) + r"\Z", re.DOTALL), negated, directory_only)
+
+
+def _translate(pattern):
+    parts = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        index += 1
+        if char == "*":
+            if pattern.startswith("*", index):
+                index += 1
+                starts_segment = index == 2 or pattern[index - 3] == "/"
+                if starts_segment and index == len(pattern):
+                    parts.append(".*")
+                    continue
+
+                if starts_segment and pattern.startswith("/", index):
+                    index += 1
+                    parts.append("(?:.*/)?")
+                    continue
+
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", index + 1 if pattern.startswith(("!", "]"), index) else index)
+            if end < 0:
+                parts.append(re.escape(char))
+                continue
+
+            contents = pattern[index:end].replace("\\", "\\\\")
+            index = end + 1
+            if contents.startswith("!"):
+                contents = "^" + contents[1:]
+
+            parts.append("[" + contents + "]")
+        elif char == "\\" and index < len(pattern):
+            parts.append(re.escape(pattern[index]))
+            index += 1
+        else:
+            parts.append(re.escape(char))
+
+    return "".join(parts)
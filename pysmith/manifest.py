@@ -0,0 +1,190 @@
+"""
+    The manifest records the inputs and outputs of a build so that the next build can determine which sources changed
+    and which outputs need to be rewritten.
+"""
+
+import json
+import os
+
+from .dependencies import DependencyGraph, find_changed_inputs, stat_inputs
+
+
+MANIFEST_VERSION = 3
+
+
+class ChangeSet(object):
+    """
+        The differences between the sources of two builds.
+
+        .. attribute:: added
+            :type: list(str)
+
+            The source files that did not exist in the previous build.
+
+        .. attribute:: changed
+            :type: list(str)
+
+            The source files whose contents changed since the previous build.
+
+        .. attribute:: removed
+            :type: list(str)
+
+            The source files that existed in the previous build but no longer exist.
+    """
+
+    __slots__ = ("added", "changed", "removed")
+
+    def __init__(self, added=None, changed=None, removed=None):
+        self.added = added or []
+        self.changed = changed or []
+        self.removed = removed or []
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):  # pragma: no cover
+        self_type = type(self)
+        attrs = ", ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__)
+        return "{}.{}({})".format(self_type.__module__, self_type.__name__, attrs)
+
+
+class Manifest(object):
+    """
+        The record of a single build.
+
+        :param str fingerprint: The fingerprint of the plugin configuration used for the build.
+        :param sources: The source entries, keyed by the file name relative to the source directory. Each entry is a
+                        dict with the :code:`size`, :code:`mtime` (in nanoseconds) and :code:`digest` of the source.
+        :type sources: dict(str, dict) or None
+        :param outputs: The digests of the output files, keyed by the file name relative to the destination directory.
+        :type outputs: dict(str, str) or None
+        :param output_stats: The state of the output files as they were left in the destination directory, keyed by the
+                             file name relative to the destination directory. Each entry is a dict with the :code:`size`
+                             and :code:`mtime` (in nanoseconds) of the output. Outputs are only recorded here when
+                             they are compared against the destination (see the :code:`skip_unchanged` option of
+                             :class:`~pysmith.Pysmith`).
+        :type output_stats: dict(str, dict) or None
+        :param dependencies: The dependency graph of the outputs.
+        :type dependencies: ~pysmith.dependencies.DependencyGraph or None
+        :param inputs: The state of the inputs outside the source directory that outputs depend on, such as templates,
+                       keyed by their absolute path. Each entry is a dict with the :code:`size` and :code:`mtime` (in
+                       nanoseconds) of the input.
+        :type inputs: dict(str, dict) or None
+    """
+
+    __slots__ = ("fingerprint", "sources", "outputs", "output_stats", "dependencies", "inputs")
+
+    def __init__(self, fingerprint=None, sources=None, outputs=None, output_stats=None, dependencies=None,
+                 inputs=None):
+        self.fingerprint = fingerprint
+        self.sources = sources or {}
+        self.outputs = outputs or {}
+        self.output_stats = output_stats or {}
+        self.dependencies = dependencies if dependencies is not None else DependencyGraph()
+        self.inputs = inputs or {}
+
+    @staticmethod
+    def load(path):
+        """
+            Loads a manifest from disk.
+
+            :param str path: The path of the manifest file.
+            :returns: The loaded manifest, or None if the file does not exist or was written by an incompatible
+                      version.
+        """
+
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+
+        return Manifest(data["fingerprint"], data["sources"], data["outputs"], data["output_stats"],
+                        DependencyGraph.from_dict(data["dependencies"]), data["inputs"])
+
+    def save(self, path):
+        """
+            Writes the manifest to disk. The file is replaced atomically so an interrupted build never leaves a partial
+            manifest behind.
+
+            :param str path: The path of the manifest file.
+        """
+
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "fingerprint": self.fingerprint,
+                "sources": self.sources,
+                "outputs": self.outputs,
+                "output_stats": self.output_stats,
+                "dependencies": self.dependencies.to_dict(),
+                "inputs": self.inputs,
+            }, f)
+
+        os.replace(tmp_path, path)
+
+    def update_sources(self, files, previous=None):
+        """
+            Records the given source files in this manifest and compares them to a previous manifest. Sources whose size
+            and modification time match the previous manifest are assumed to be unchanged and are not read, and their
+            :attr:`~pysmith.FileInfo.digest` is set to the recorded one. All other sources are hashed, so a file that
+            was touched without being modified is not reported as changed.
+
+            :param files: The loaded source files, keyed by the file name relative to the source directory.
+            :type files: dict(str, ~pysmith.FileInfo)
+            :param previous: The manifest of the previous build.
+            :type previous: Manifest or None
+            :returns: The changes since the previous build.
+            :rtype: ChangeSet
+        """
+
+        previous_sources = previous.sources if previous is not None else {}
+        changes = ChangeSet()
+
+        for file_name, file_info in files.items():
+            size = file_info.stats.st_size
+            mtime = file_info.stats.st_mtime_ns
+            entry = previous_sources.get(file_name)
+
+            if entry is not None and entry["size"] == size and entry["mtime"] == mtime:
+                digest = entry["digest"]
+                if file_info._digest is None and not file_info.modified:
+                    # The recorded digest identifies the contents from now on, so the file is never hashed again.
+                    file_info._digest = digest
+            else:
+                digest = file_info.digest
+                if entry is None:
+                    changes.added.append(file_name)
+                elif entry["digest"] != digest:
+                    changes.changed.append(file_name)
+
+            self.sources[file_name] = {"size": size, "mtime": mtime, "digest": digest}
+
+        changes.removed = [file_name for file_name in previous_sources if file_name not in files]
+        return changes
+
+    def update_inputs(self, dependencies):
+        """
+            Records the dependency graph of the build in this manifest, along with the state of the inputs outside the
+            source directory, i.e. the inputs whose name is an absolute path to an existing file.
+
+            :param dependencies: The dependency graph of the build.
+            :type dependencies: ~pysmith.dependencies.DependencyGraph
+        """
+
+        self.dependencies = dependencies
+        self.inputs = stat_inputs(dependencies.inputs)
+
+    def get_changed_inputs(self):
+        """
+            Checks which of the recorded inputs outside the source directory changed since they were recorded.
+
+            :returns: The dependencies on the changed inputs.
+            :rtype: list(tuple(str, str))
+        """
+
+        return find_changed_inputs(self.dependencies.inputs, self.inputs)
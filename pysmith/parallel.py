@@ -0,0 +1,209 @@
+"""
+    Runs per-file plugins (see :class:`~pysmith.plugin_util.FilePlugin`) on a process pool.
+"""
+
+import collections
+import contextlib
+import logging
+import math
+import os
+import pickle
+import tempfile
+import time
+import uuid
+
+from .plugin_util import get_access
+
+
+logger = logging.getLogger("pysmith")
+
+# Matching fewer files than this, a stage takes longer to send to the workers than to run in the calling process.
+_MIN_PARALLEL_FILES = 32
+
+# Each worker process keeps the most recently used stage, so the plugin, metadata and cache are only read and unpickled
+# once per process rather than once per chunk.
+_worker_stage = (None, None, None, None)
+
+
+def run_file_plugin(plugin, build_info, files, executor, jobs):
+    """
+        Runs a file plugin over its matching files on a process pool. The matching files are split into chunks that are
+        processed by the workers, and the results are merged back into the build info in the original file order, so the
+        result is the same as running :meth:`~pysmith.plugin_util.FilePlugin.build` sequentially. If the plugin or the
+        build metadata cannot be pickled, or the plugin matches too few files to be worth sending to the workers, the
+        plugin is run sequentially instead.
+
+        :param plugin: The plugin to run.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param files: The files matched by the plugin, as returned by its :code:`get_files` method.
+        :type files: list(tuple(str, ~pysmith.FileInfo))
+        :param executor: The process pool to run the plugin on.
+        :type executor: concurrent.futures.ProcessPoolExecutor
+        :param int jobs: The number of worker processes in the pool.
+        :returns: The CPU time spent in the worker processes, in seconds.
+    """
+
+    def on_result(file_name, output_name, file_info):
+        if output_name is not None:
+            build_info.rename_file(file_name, output_name)
+
+    return run_in_workers(_process_chunk, [plugin], build_info, files, executor, jobs, on_result,
+                          lambda: plugin.build(build_info), get_access(plugin))
+
+
+def run_in_workers(process_chunk, plugins, build_info, files, executor, jobs, on_result, run_sequential, access=None,
+                   max_chunk_size=None):
+    """
+        Processes files on a process pool. The files are split into chunks, which are passed to :code:`process_chunk`
+        in the workers along with the path of the stage saved by :func:`open_stage`. The chunks in flight are bounded,
+        and the processed files are merged back into the original :class:`~pysmith.FileInfo` objects in file order. If
+        there are too few files to be worth sending to the workers, or the stage cannot be pickled,
+        :code:`run_sequential` is called instead.
+
+        :param process_chunk: A picklable function processing a chunk in a worker, returning the output name and the
+                              processed file info of each file, and the CPU time it used.
+        :param plugins: The plugins of the stage.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param files: The files to process.
+        :type files: list(tuple(str, ~pysmith.FileInfo))
+        :param executor: The process pool to run the plugins on.
+        :type executor: concurrent.futures.ProcessPoolExecutor
+        :param int jobs: The number of worker processes in the pool.
+        :param on_result: A function called with the file name, the output name and the file info of every processed
+                          file, in file order.
+        :param run_sequential: A function running the stage in the calling process.
+        :param access: The access declaration of the stage, or None if it may use the metadata.
+        :type access: ~pysmith.plugin_util.Access or None
+        :param max_chunk_size: The maximum number of files in a chunk.
+        :type max_chunk_size: int or None
+        :returns: The CPU time spent in the worker processes, in seconds.
+    """
+
+    if len(files) < _MIN_PARALLEL_FILES:
+        run_sequential()
+        return 0.0
+
+    with open_stage(plugins, build_info, "+".join(type(plugin).__name__ for plugin in plugins), access) as stage:
+        if stage is None:
+            run_sequential()
+            return 0.0
+
+        chunk_size = math.ceil(len(files) / (jobs * 4))
+        if max_chunk_size is not None:
+            chunk_size = min(chunk_size, max_chunk_size)
+
+        pending = collections.deque()
+        cpu_time = 0.0
+        for start in range(0, len(files), chunk_size):
+            chunk = files[start:start + chunk_size]
+            pending.append((chunk, executor.submit(process_chunk, stage, chunk)))
+            if len(pending) > jobs * 2:
+                cpu_time += _merge_chunk(*pending.popleft(), on_result)
+
+        while pending:
+            cpu_time += _merge_chunk(*pending.popleft(), on_result)
+
+    return cpu_time
+
+
+def dump_stage(plugins, build_info, name, access=None):
+    """
+        Pickles the plugins of a stage along with the build metadata and cache, to be sent to the worker processes. The
+        metadata is left out if the access declaration of the stage shows it is not used.
+
+        :param plugins: The plugins to send.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param str name: The name of the stage, used in the warning logged if it cannot be pickled.
+        :param access: The access declaration of the stage, or None if it may use the metadata.
+        :type access: ~pysmith.plugin_util.Access or None
+        :returns: The pickled stage, or None if it cannot be pickled and should be run sequentially.
+        :rtype: bytes or None
+    """
+
+    uses_metadata = access is None or access.reads_metadata or access.writes_metadata
+    metadata = build_info.metadata if uses_metadata else {}
+    try:
+        return pickle.dumps((plugins, metadata, build_info.cache), pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        logger.warning("{} cannot be sent to worker processes, running it sequentially: {}".format(name, e))
+        return None
+
+
+@contextlib.contextmanager
+def open_stage(plugins, build_info, name, access=None):
+    """
+        Pickles a stage using :func:`dump_stage` and saves it to a temporary file for the duration of the stage. Only
+        the path of the file is sent with each chunk, and each worker process loads the stage from it once.
+
+        :param plugins: The plugins to send.
+        :param build_info: The information for the current build.
+        :type build_info: ~pysmith.BuildInfo
+        :param str name: The name of the stage, used in the warning logged if it cannot be pickled.
+        :param access: The access declaration of the stage, or None if it may use the metadata.
+        :type access: ~pysmith.plugin_util.Access or None
+        :returns: A context manager giving the path of the stage file, or None if the stage should be run sequentially.
+    """
+
+    stage = dump_stage(plugins, build_info, name, access)
+    if stage is None:
+        yield None
+        return
+
+    # The unique prefix keeps the path from being reused by a later stage while workers still hold this one.
+    fd, path = tempfile.mkstemp(prefix="pysmith-{}-".format(uuid.uuid4().hex), suffix=".stage")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(stage)
+
+        yield path
+    finally:
+        os.remove(path)
+
+
+def load_stage(path):
+    """
+        Loads a stage saved by :func:`open_stage` in a worker process. The most recently used stage is kept, so it is
+        only read and unpickled once per process rather than once per chunk.
+
+        :param str path: The path of the stage file.
+        :returns: The plugins of the stage and a build info holding the build metadata and cache.
+    """
+
+    global _worker_stage
+
+    from . import BuildInfo
+
+    if _worker_stage[0] != path:
+        with open(path, "rb") as f:
+            plugins, metadata, cache = pickle.load(f)
+
+        _worker_stage = (path, plugins, metadata, cache)
+
+    _, plugins, metadata, cache = _worker_stage
+    build_info = BuildInfo()
+    build_info.metadata = metadata
+    build_info.cache = cache
+    return plugins, build_info
+
+
+def _merge_chunk(chunk, future, on_result):
+    results, cpu_time = future.result()
+    for (file_name, file_info), (output_name, processed) in zip(chunk, results):
+        file_info._update_from(processed)
+        on_result(file_name, output_name, file_info)
+
+    return cpu_time
+
+
+def _process_chunk(stage, chunk):
+    start_cpu_time = time.process_time()
+    [plugin], build_info = load_stage(stage)
+
+    results = []
+    for file_name, file_info in chunk:
+        results.append((plugin.process_file(build_info, file_name, file_info), file_info))
+
+    return results, time.process_time() - start_cpu_time
@@ -1,3 +1,241 @@
+import asyncio
+import fnmatch
+import inspect
+
+
+class FilePlugin(object):
+    """
+        A base class for plugins that process each matching file independently of the others. Subclasses implement
+        :meth:`process_file`, and the default :meth:`build` calls it for every file matched by the match pattern,
+        renaming the file if a new name is returned.
+
+        Because the files are independent, Pysmith can run file plugins on a process pool (see the :code:`jobs` option
+        of :class:`~pysmith.Pysmith`). In that case the plugin and the build info :attr:`~pysmith.BuildInfo.metadata`
+        are pickled and sent to the worker processes, so :meth:`process_file` must only modify the file it is given.
+
+        File plugins can also be fused with their neighbours, so every file passes through the whole chain before the
+        next file is processed (see the :code:`fuse` option of :class:`~pysmith.Pysmith`). A plugin reading other files
+        than the one it is given, e.g. through a collection, should set :attr:`barrier` so all earlier plugins are done
+        with every file before it runs.
+
+        .. attribute:: barrier
+            :type: bool
+
+            Whether the plugin must not be fused with the plugins around it. This is False by default, and can be set
+            on the class or on an instance.
+
+        :param match_pattern: The pattern of files to process. If this is a string, it is treated as a glob pattern.
+                              Otherwise it should be a regular expression compiled using :func:`re.compile`.
+        :type match_pattern: str or re.Pattern
+    """
+
+    barrier = False
+
+    def __init__(self, match_pattern):
+        self._match_pattern = match_pattern
+
+    def build(self, build_info):
+        for file_name, file_info in self.get_files(build_info):
+            output_name = self.process_file(build_info, file_name, file_info)
+            if output_name is not None:
+                build_info.rename_file(file_name, output_name)
+
+    def get_files(self, build_info):
+        """
+            Retrieves the files this plugin should process.
+
+            :param build_info: The information for the current build.
+            :type build_info: ~pysmith.BuildInfo
+            :returns: The matching file names and :class:`~pysmith.FileInfo` objects.
+        """
+
+        if isinstance(self._match_pattern, str):
+            return build_info.get_files_by_pattern(self._match_pattern)
+
+        return build_info.get_files_by_regex(self._match_pattern)
+
+    def matches(self, file_name):
+        """
+            Checks whether a file name is matched by the match pattern, using the same rules as :meth:`get_files`.
+
+            :param str file_name: The file name to check.
+            :returns: bool
+        """
+
+        if isinstance(self._match_pattern, str):
+            return fnmatch.fnmatch(file_name, self._match_pattern)
+
+        return self._match_pattern.search(file_name) is not None
+
+    def get_access(self):
+        """
+            Declares the files and metadata this plugin uses (see :class:`Access`). File plugins can rename files to
+            arbitrary names, so the default implementation returns None, and subclasses that know which names they
+            produce override it.
+
+            :returns: The access declaration, or None if the plugin may use any file.
+            :rtype: Access or None
+        """
+
+        return None
+
+    def process_file(self, build_info, file_name, file_info):  # pragma: no cover
+        """
+            Processes a single file.
+
+            :param build_info: The information for the current build.
+            :type build_info: ~pysmith.BuildInfo
+            :param str file_name: The current name of the file.
+            :param file_info: The file to process.
+            :type file_info: ~pysmith.FileInfo
+            :returns: The new name for the file, or None if the file should not be renamed.
+        """
+
+        raise NotImplementedError("process_file is not implemented")
+
+
+class AsyncFilePlugin(FilePlugin):
+    """
+        A base class for file plugins whose processing of a file is a coroutine, such as plugins waiting on a rendering
+        subprocess or on network I/O. Subclasses implement :meth:`process_file_async` rather than
+        :meth:`~FilePlugin.process_file`.
+
+        When the build is run using :meth:`~pysmith.Pysmith.build_async`, the matching files are processed concurrently
+        on the event loop, up to the :code:`concurrency` of the build at a time. Otherwise each file is processed using
+        :func:`asyncio.run`, so the plugin still works in synchronous builds. Async plugins are never fused with their
+        neighbours or run on the process pool.
+
+        :param match_pattern: The pattern of files to process. If this is a string, it is treated as a glob pattern.
+                              Otherwise it should be a regular expression compiled using :func:`re.compile`.
+        :type match_pattern: str or re.Pattern
+    """
+
+    def process_file(self, build_info, file_name, file_info):
+        return asyncio.run(self.process_file_async(build_info, file_name, file_info))
+
+    async def process_file_async(self, build_info, file_name, file_info):  # pragma: no cover
+        """
+            Processes a single file.
+
+            :param build_info: The information for the current build.
+            :type build_info: ~pysmith.BuildInfo
+            :param str file_name: The current name of the file.
+            :param file_info: The file to process.
+            :type file_info: ~pysmith.FileInfo
+            :returns: The new name for the file, or None if the file should not be renamed.
+        """
+
+        raise NotImplementedError("process_file_async is not implemented")
+
+
+def is_file_plugin(plugin):
+    """
+        Checks whether a plugin implements the per-file contract, i.e. it defines both :meth:`FilePlugin.get_files` and
+        :meth:`FilePlugin.process_file`. Plugins do not need to inherit from :class:`FilePlugin` to implement it.
+
+        :param plugin: The plugin to check.
+        :returns: bool
+    """
+
+    return callable(getattr(plugin, "get_files", None)) and callable(getattr(plugin, "process_file", None))
+
+
+def is_async_plugin(plugin):
+    """
+        Checks whether a plugin implements the async contract, i.e. it defines a :code:`build_async` coroutine function,
+        or both :meth:`FilePlugin.get_files` and a :meth:`AsyncFilePlugin.process_file_async` coroutine function.
+
+        :param plugin: The plugin to check.
+        :returns: bool
+    """
+
+    if inspect.iscoroutinefunction(getattr(plugin, "build_async", None)):
+        return True
+
+    return (callable(getattr(plugin, "get_files", None)) and
+            inspect.iscoroutinefunction(getattr(plugin, "process_file_async", None)))
+
+
+class Access(object):
+    """
+        Declares which files and metadata a plugin uses, so Pysmith can run it concurrently with plugins using other
+        files (see the :code:`plugin_workers` option of :class:`~pysmith.Pysmith`). Plugins declare their access by
+        defining a :code:`get_access` method returning an instance of this class. Plugins without a declaration are
+        assumed to use every file and the metadata, so they never run concurrently with other plugins.
+
+        While running concurrently, plugins must only look files up through
+        :meth:`~pysmith.BuildInfo.get_files_by_pattern`, :meth:`~pysmith.BuildInfo.get_files_by_regex` and
+        :meth:`~pysmith.BuildInfo.rename_file`. Plugins that declare neither reading nor writing the build metadata are
+        given an empty :attr:`~pysmith.BuildInfo.metadata` dictionary.
+
+        .. attribute:: files
+            :type: list(str or re.Pattern)
+
+            The patterns of the files the plugin reads, modifies or renames, as glob patterns or regular expressions
+            compiled using :func:`re.compile`.
+
+        .. attribute:: creates
+            :type: list(str or re.Pattern)
+
+            The patterns of the names the plugin may give to files, by renaming them or adding new files.
+
+        .. attribute:: reads_metadata
+            :type: bool
+
+            Whether the plugin reads the build :attr:`~pysmith.BuildInfo.metadata`. The metadata may refer to any
+            file, e.g. through collections, so such plugins never run concurrently with other plugins.
+
+        .. attribute:: writes_metadata
+            :type: bool
+
+            Whether the plugin adds to the build :attr:`~pysmith.BuildInfo.metadata`. Such plugins do not run
+            concurrently with other plugins using the metadata.
+    """
+
+    __slots__ = ("files", "creates", "reads_metadata", "writes_metadata")
+
+    def __init__(self, *, files=(), creates=(), reads_metadata=False, writes_metadata=False):
+        self.files = list(files)
+        self.creates = list(creates)
+        self.reads_metadata = reads_metadata
+        self.writes_metadata = writes_metadata
+
+    def __repr__(self):  # pragma: no cover
+        self_type = type(self)
+        attrs = ", ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__)
+        return "{}.{}({})".format(self_type.__module__, self_type.__name__, attrs)
+
+
+def get_access(plugin):
+    """
+        Retrieves the access declaration of a plugin.
+
+        :param plugin: The plugin.
+        :returns: The result of the plugin's :code:`get_access` method, or None if it does not define one.
+        :rtype: Access or None
+    """
+
+    method = getattr(plugin, "get_access", None)
+    return method() if callable(method) else None
+
+
+class _MetadataSelector(object):
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self, file_info):
+        return file_info.metadata[self.key]
+
+    def __getstate__(self):
+        return self.key
+
+    def __setstate__(self, state):
+        self.key = state
+
+
 def lambda_or_metadata_selector(selector):
     """
         Ensures that the given selector is a function. If a str is provided, it will be converted into a function that
@@ -9,7 +247,7 @@ def lambda_or_metadata_selector(selector):
     """
 
     if isinstance(selector, str):
-        return lambda f: f.metadata[selector]
+        return _MetadataSelector(selector)
     elif callable(selector):
         return selector
 
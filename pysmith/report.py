@@ -0,0 +1,171 @@
+"""
+    Reports describing where the time of a build was spent.
+"""
+
+import contextlib
+import json
+import time
+
+
+class PhaseReport(object):
+    """
+        The measurements of a single phase of the build: loading the files, executing one plugin, or writing the
+        outputs.
+
+        .. attribute:: name
+            :type: str
+
+            The name of the phase. Plugin phases are named after the plugin's type.
+
+        .. attribute:: wall_time
+            :type: float
+
+            The elapsed time of the phase, in seconds.
+
+        .. attribute:: cpu_time
+            :type: float
+
+            The CPU time used by the phase, in seconds. This is the CPU time of the thread running the phase, so
+            phases running concurrently do not count each other's time, plus the time spent in worker processes.
+
+        .. attribute:: files
+            :type: int or None
+
+            The number of files handled by the phase. For per-file plugins this is the number of matched files. It is
+            None for plugins that do not implement the per-file contract.
+
+        .. attribute:: bytes_in
+            :type: int
+
+            The size of the files handled by the phase before it ran. For plugins this is only measured when the
+            report is written to a file or the plugins are profiled, and is 0 otherwise.
+
+        .. attribute:: bytes_out
+            :type: int
+
+            The size of the files handled by the phase after it ran. For plugins this is only measured when the
+            report is written to a file or the plugins are profiled, and is 0 otherwise.
+
+        .. attribute:: renames
+            :type: int
+
+            The number of files renamed by the phase.
+    """
+
+    __slots__ = ("name", "wall_time", "cpu_time", "files", "bytes_in", "bytes_out", "renames")
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.files = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.renames = 0
+
+    @contextlib.contextmanager
+    def measure(self):
+        """
+            A context manager that adds the wall time spent in its body, and the CPU time the calling thread spent in
+            it, to the phase.
+        """
+
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.thread_time()
+        try:
+            yield self
+        finally:
+            self.wall_time += time.perf_counter() - start_wall_time
+            self.cpu_time += time.thread_time() - start_cpu_time
+
+    def to_dict(self):
+        """
+            Converts the phase to a dictionary that can be serialized as JSON.
+
+            :rtype: dict(str, object)
+        """
+
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):  # pragma: no cover
+        self_type = type(self)
+        attrs = ", ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__)
+        return "{}.{}({})".format(self_type.__module__, self_type.__name__, attrs)
+
+
+class BuildReport(object):
+    """
+        The report of a build, as returned by :meth:`~pysmith.Pysmith.build`.
+
+        .. attribute:: phases
+            :type: list(PhaseReport)
+
+            The phases of the build, in the order they ran.
+
+        .. attribute:: wall_time
+            :type: float
+
+            The elapsed time of the whole build, in seconds.
+
+        .. attribute:: outputs
+            :type: dict(str, str)
+
+            The outcome of each output file handled by the build, keyed by the file name relative to the destination
+            directory: :data:`~pysmith.writer.WRITTEN`, :data:`~pysmith.writer.UNCHANGED` or
+            :data:`~pysmith.writer.DELETED`. It is empty for dry runs, which do not write anything.
+
+        .. attribute:: diff
+            :type: ~pysmith.diff.OutputDiff or None
+
+            For a dry run (see the :code:`dry_run` argument of :meth:`~pysmith.Pysmith.build`), the differences between
+            the outputs and the destination directory. It is None for other builds.
+    """
+
+    __slots__ = ("phases", "wall_time", "outputs", "diff")
+
+    def __init__(self):
+        self.phases = []
+        self.wall_time = 0.0
+        self.outputs = {}
+        self.diff = None
+
+    def add_phase(self, name):
+        """
+            Adds a new phase to the report.
+
+            :param str name: The name of the phase.
+            :rtype: PhaseReport
+        """
+
+        phase = PhaseReport(name)
+        self.phases.append(phase)
+        return phase
+
+    def to_dict(self):
+        """
+            Converts the report to a dictionary that can be serialized as JSON.
+
+            :rtype: dict(str, object)
+        """
+
+        return {
+            "wall_time": self.wall_time,
+            "phases": [phase.to_dict() for phase in self.phases],
+            "outputs": self.outputs,
+            "diff": self.diff.to_dict() if self.diff is not None else None,
+        }
+
+    def write_json(self, path):
+        """
+            Writes the report to a JSON file.
+
+            :param str path: The path of the file to write.
+        """
+
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def __repr__(self):  # pragma: no cover
+        self_type = type(self)
+        attrs = ", ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__)
+        return "{}.{}({})".format(self_type.__module__, self_type.__name__, attrs)
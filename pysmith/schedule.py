@@ -0,0 +1,147 @@
+"""
+    Schedules the stages of a pipeline on threads, for the :code:`plugin_workers` option of :class:`~pysmith.Pysmith`.
+    Stages run concurrently when their :class:`~pysmith.plugin_util.Access` declarations show that they use different
+    files, and in pipeline order otherwise.
+"""
+
+import collections
+import concurrent.futures
+import fnmatch
+
+from .plugin_util import Access
+from .store import may_overlap
+
+
+def combine_access(accesses):
+    """
+        Combines the access declarations of the plugins of a fused stage.
+
+        :param accesses: The declarations of the plugins, as returned by :func:`~pysmith.plugin_util.get_access`.
+        :returns: A declaration covering every plugin, or None if any plugin has no declaration.
+        :rtype: ~pysmith.plugin_util.Access or None
+    """
+
+    accesses = list(accesses)
+    if any(access is None for access in accesses):
+        return None
+
+    return Access(
+        files=[pattern for access in accesses for pattern in access.files],
+        creates=[pattern for access in accesses for pattern in access.creates],
+        reads_metadata=any(access.reads_metadata for access in accesses),
+        writes_metadata=any(access.writes_metadata for access in accesses),
+    )
+
+
+def get_dependencies(accesses, file_names):
+    """
+        Computes the stages each stage must wait for. A stage depends on every earlier stage it conflicts with, i.e.
+        both stages use a common file, one of them creates names the other one uses, or they both use the build
+        metadata. The existing files are compared by name, so patterns that could overlap in theory, but do not match
+        any common file, do not create a dependency. Files created by earlier stages are compared by pattern, using
+        :func:`~pysmith.store.may_overlap`.
+
+        :param accesses: The access declarations of the stages, in pipeline order. None means the stage may use every
+                         file.
+        :param file_names: The names of the files before the pipeline runs.
+        :returns: The indexes of the stages each stage depends on.
+        :rtype: list(set(int))
+    """
+
+    file_names = list(file_names)
+    used = [_match_files(access, file_names) if access is not None else None for access in accesses]
+
+    dependencies = []
+    created = []
+    for index, access in enumerate(accesses):
+        dependencies.append({
+            previous for previous in range(index)
+            if _conflicts(accesses[previous], used[previous], access, used[index], created)
+        })
+        if access is not None:
+            created.extend(access.creates)
+
+    return dependencies
+
+
+def run_graph(tasks, dependencies, workers):
+    """
+        Runs tasks on a thread pool, starting each task once the tasks it depends on are finished. Ready tasks are
+        started in order. If a task raises an exception, no further tasks are started, and the exception of the
+        earliest failed task is raised once the running tasks are finished.
+
+        :param tasks: The tasks to run, as functions without arguments.
+        :param dependencies: The indexes of the tasks each task depends on, as returned by :func:`get_dependencies`.
+        :type dependencies: list(set(int))
+        :param int workers: The number of threads.
+    """
+
+    remaining = [set(task_dependencies) for task_dependencies in dependencies]
+    dependents = collections.defaultdict(list)
+    for index, task_dependencies in enumerate(dependencies):
+        for dependency in task_dependencies:
+            dependents[dependency].append(index)
+
+    errors = {}
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        running = {
+            executor.submit(tasks[index]): index for index, task_dependencies in enumerate(remaining)
+            if not task_dependencies
+        }
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            ready = []
+            for future in done:
+                index = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    errors[index] = error
+                    continue
+
+                for dependent in dependents[index]:
+                    remaining[dependent].discard(index)
+                    if not remaining[dependent]:
+                        ready.append(dependent)
+
+            if not errors:
+                for index in sorted(ready):
+                    running[executor.submit(tasks[index])] = index
+
+    if errors:
+        raise errors[min(errors)]
+
+
+def _match_files(access, file_names):
+    used = set()
+    for pattern in access.files:
+        if isinstance(pattern, str):
+            used.update(fnmatch.filter(file_names, pattern))
+        else:
+            used.update(file_name for file_name in file_names if pattern.search(file_name))
+
+    return used
+
+
+def _conflicts(previous, previous_used, access, used, created):
+    if previous is None or access is None:
+        return True
+
+    if previous.reads_metadata or access.reads_metadata:
+        return True
+
+    if previous.writes_metadata and access.writes_metadata:
+        return True
+
+    if not previous_used.isdisjoint(used):
+        return True
+
+    # Files created by one stage may be used by the other one, depending on which runs first.
+    if _may_overlap(previous.creates, access.files + access.creates) or _may_overlap(access.creates, previous.files):
+        return True
+
+    # Files created by earlier stages do not exist yet, so they are not part of the used files.
+    return any(_may_overlap([pattern], previous.files) and _may_overlap([pattern], access.files) for pattern in created)
+
+
+def _may_overlap(patterns1, patterns2):
+    return any(may_overlap(pattern1, pattern2) for pattern1 in patterns1 for pattern2 in patterns2)
@@ -0,0 +1,193 @@
+"""
+    A development server serving the outputs of a build from memory, for :meth:`~pysmith.Pysmith.serve`.
+"""
+
+import email.utils
+import http.server
+import logging
+import mimetypes
+import os
+import posixpath
+import time
+import urllib.parse
+
+
+logger = logging.getLogger("pysmith")
+
+_INDEX = "index.html"
+_NOT_FOUND = "404.html"
+
+
+class _Resource(object):
+
+    __slots__ = ("file_info", "etag", "last_modified", "content_type")
+
+    def __init__(self, file_info, etag, last_modified, content_type):
+        self.file_info = file_info
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+
+    def __repr__(self):  # pragma: no cover
+        self_type = type(self)
+        attrs = ", ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__)
+        return "{}.{}({})".format(self_type.__module__, self_type.__name__, attrs)
+
+
+class SiteContents(object):
+    """
+        The outputs of the most recent build, as served by the :class:`DevServer`. Each update replaces the outputs as
+        a whole, so requests never see a mix of two builds.
+    """
+
+    def __init__(self):
+        self._resources = {}
+
+    def update(self, files, digests):
+        """
+            Replaces the served outputs.
+
+            :param files: The output files.
+            :type files: dict(str, ~pysmith.FileInfo)
+            :param digests: The content digests of the output files, used as their ETags.
+            :type digests: dict(str, str)
+        """
+
+        now = time.time()
+        previous = self._resources
+        resources = {}
+        for file_name, file_info in files.items():
+            url_path = file_name.replace(os.sep, "/")
+            etag = "\"{}\"".format(digests[file_name])
+
+            # Outputs keep their modification time for as long as their contents stay the same.
+            resource = previous.get(url_path)
+            last_modified = resource.last_modified if resource is not None and resource.etag == etag else now
+
+            content_type = mimetypes.guess_type(url_path)[0] or "application/octet-stream"
+            resources[url_path] = _Resource(file_info, etag, last_modified, content_type)
+
+        self._resources = resources
+
+    def resolve(self, path):
+        """
+            Finds the output for a request path. A path ending with a slash is mapped to the :code:`index.html` file in
+            that directory, the same way :class:`~pysmith.contrib.web.permalink.Permalink` names its outputs.
+
+            :param str path: The decoded request path, without the query string.
+            :returns: A tuple of the output, or None if there is no output for the path, and the path to redirect to, or
+                      None if no redirect is needed.
+        """
+
+        resources = self._resources
+        url_path = posixpath.normpath(path).lstrip("/")
+        if url_path == ".":
+            url_path = ""
+
+        if path.endswith("/") or url_path == "":
+            return resources.get(posixpath.join(url_path, _INDEX)), None
+
+        resource = resources.get(url_path)
+        if resource is None and posixpath.join(url_path, _INDEX) in resources:
+            return None, "/" + url_path + "/"
+
+        return resource, None
+
+    def not_found(self):
+        """
+            Finds the output to serve for missing paths.
+
+            :returns: The :code:`404.html` output, or None if the site does not have one.
+        """
+
+        return self._resources.get(_NOT_FOUND)
+
+
+class DevServer(http.server.ThreadingHTTPServer):
+    """
+        A development HTTP server serving a :class:`SiteContents` object. Responses carry an ETag derived from the
+        content digest and a Last-Modified time that only changes when the contents do, and conditional requests are
+        answered with :code:`304 Not Modified`. Responses are marked as requiring revalidation, so browsers reuse
+        unchanged assets without missing changes.
+
+        :param server_address: The host and port to listen on.
+        :type server_address: tuple(str, int)
+        :param SiteContents site: The outputs to serve.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, site):
+        super().__init__(server_address, _RequestHandler)
+        self.site = site
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+
+    server_version = "Pysmith"
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def log_message(self, format, *args):
+        logger.debug("{} - {}".format(self.address_string(), format % args))
+
+    def _respond(self, send_body):
+        site = self.server.site
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        resource, redirect = site.resolve(path)
+
+        if redirect is not None:
+            self.send_response(301)
+            self.send_header("Location", redirect)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        status = 200
+        if resource is None:
+            status = 404
+            resource = site.not_found()
+            if resource is None:
+                self.send_error(404)
+                return
+
+        if status == 200 and self._is_not_modified(resource):
+            self.send_response(304)
+            self._send_cache_headers(resource)
+            self.end_headers()
+            return
+
+        body = resource.file_info.get_buffer()
+        self.send_response(status)
+        self._send_cache_headers(resource)
+        self.send_header("Content-Type", resource.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _is_not_modified(self, resource):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            etags = [etag.strip() for etag in if_none_match.split(",")]
+            return "*" in etags or resource.etag in etags or "W/" + resource.etag in etags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+            return int(resource.last_modified) <= since
+
+        return False
+
+    def _send_cache_headers(self, resource):
+        self.send_header("ETag", resource.etag)
+        self.send_header("Last-Modified", email.utils.formatdate(resource.last_modified, usegmt=True))
+        self.send_header("Cache-Control", "no-cache")
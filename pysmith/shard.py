@@ -0,0 +1,169 @@
+"""
+    Splits the per-file work of a build across several processes or machines, for
+    :meth:`~pysmith.Pysmith.build_shard` and :meth:`~pysmith.Pysmith.merge_shards`. Each shard runs the per-file plugins
+    at the start of the pipeline on its share of the source files and saves the result to a local file, and a merge
+    step loads every shard result and runs the rest of the pipeline.
+"""
+
+import hashlib
+import os
+import pickle
+import zlib
+
+from .plugin_util import is_file_plugin
+from .util import config_fingerprint, write_compressed
+
+
+SHARD_VERSION = 1
+
+
+def get_shard(file_name, shards):
+    """
+        Computes the shard a source file belongs to. The shard only depends on the file name, with forward slashes as
+        separators, so every process and every system assigns a file to the same shard.
+
+        :param str file_name: The file name, relative to the source directory.
+        :param int shards: The number of shards.
+        :returns: The index of the shard, from 0 to :code:`shards - 1`.
+        :rtype: int
+    """
+
+    if os.sep != "/":
+        file_name = file_name.replace(os.sep, "/")
+
+    digest = hashlib.blake2b(file_name.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def get_shard_stop(plugins):
+    """
+        Finds where the sharded part of a pipeline ends. Shards run the per-file plugins (see
+        :func:`~pysmith.plugin_util.is_file_plugin`) at the start of the pipeline, up to the first plugin that is not a
+        per-file plugin or that sets :attr:`~pysmith.plugin_util.FilePlugin.barrier`.
+
+        :param plugins: The plugins of the pipeline, in order.
+        :returns: The index of the first plugin run by the merge step.
+        :rtype: int
+    """
+
+    for index, plugin in enumerate(plugins):
+        if not is_file_plugin(plugin) or getattr(plugin, "barrier", False):
+            return index
+
+    return len(plugins)
+
+
+def get_listing_digest(files):
+    """
+        Computes a digest of the names and contents of the source files. Unlike
+        :func:`~pysmith.checkpoint.get_sources_digest`, modification times are left out, so separate checkouts of the
+        same sources have the same digest, while a file edited without changing its size changes it. The files must
+        not have been modified by a plugin yet.
+
+        :param files: The files loaded from the source directory.
+        :type files: dict(str, ~pysmith.FileInfo)
+        :returns: The hex digest.
+        :rtype: str
+    """
+
+    hasher = hashlib.blake2b(digest_size=20)
+    for file_name in sorted(files):
+        hasher.update("{}\0{}\0".format(file_name.replace(os.sep, "/"), files[file_name].digest).encode(
+            "utf-8", "surrogateescape"))
+
+    return hasher.hexdigest()
+
+
+def get_shard_key(fingerprints, sources_digest):
+    """
+        Computes the key identifying the results of a sharded build. Shard results can only be merged by a build with
+        the same key, i.e. the same source files and the same configuration for every plugin run by the shards.
+
+        :param fingerprints: The configuration fingerprints of the plugins run by the shards, in order.
+        :type fingerprints: list(str)
+        :param str sources_digest: The digest of the source files, as returned by :func:`get_listing_digest`.
+        :rtype: str
+    """
+
+    return config_fingerprint((list(fingerprints), sources_digest))
+
+
+def save_shard(path, key, shard, shards, files, metadata):
+    """
+        Saves the result of a shard. Files whose contents were not modified are saved without their contents, which
+        are reloaded from the source directory when merging.
+
+        :param str path: The path of the shard result file.
+        :param str key: The key of the sharded build, as returned by :func:`get_shard_key`.
+        :param int shard: The index of the shard.
+        :param int shards: The number of shards.
+        :param files: The name of the source file each file was loaded from, its output name and its
+                      :class:`~pysmith.FileInfo`, in order. The source name is None for files created by a plugin.
+        :type files: list(tuple(str or None, str, ~pysmith.FileInfo))
+        :param dict metadata: The build metadata.
+        :returns: The size of the shard result file in bytes.
+        :rtype: int
+        :raises pickle.PicklingError: If the files or the metadata cannot be pickled.
+    """
+
+    state = pickle.dumps((files, metadata), pickle.HIGHEST_PROTOCOL)
+    return write_compressed(path, (SHARD_VERSION, key, shard, shards), state)
+
+
+def load_shards(paths, key, sources):
+    """
+        Loads and combines the results of every shard of a build, saved using :func:`save_shard`. The files are
+        returned in the order of the source files they were loaded from, even if they were renamed, so the order does
+        not depend on the number of shards. Files created by a plugin follow the files loaded from the sources. Files
+        whose contents were not modified refer to the source files of the merging build, so the shards may have been
+        run on another machine.
+
+        :param paths: The paths of the shard result files, in any order.
+        :type paths: list(str)
+        :param str key: The key the shard results must have been saved with.
+        :param sources: The files loaded from the source directory by the merging build.
+        :type sources: dict(str, ~pysmith.FileInfo)
+        :returns: The files and the combined build metadata. The metadata of later shards takes precedence.
+        :rtype: tuple(list(tuple(str, ~pysmith.FileInfo)), dict)
+        :raises ValueError: If a shard result is missing, duplicated, or was saved by another build.
+    """
+
+    results = {}
+    shards = None
+    for path in paths:
+        with open(path, "rb") as f:
+            version, shard_key, shard, shard_count = pickle.load(f)
+            if version != SHARD_VERSION or shard_key != key:
+                raise ValueError("The shard result {} is from a different build".format(path))
+
+            if shards is not None and shard_count != shards:
+                raise ValueError("The shard result {} splits the sources into {} shards rather than {}".format(
+                    path, shard_count, shards))
+
+            if shard in results:
+                raise ValueError("The shard result {} duplicates shard {}".format(path, shard))
+
+            shards = shard_count
+            results[shard] = pickle.loads(zlib.decompress(f.read()))
+
+    missing = sorted(set(range(shards or 0)) - set(results))
+    if not results or missing:
+        raise ValueError("Missing the results of shards {}".format(missing or [0]))
+
+    order = {file_name: index for index, file_name in enumerate(sources)}
+    entries = []
+    metadata = {}
+    for shard in range(shards):
+        shard_files, shard_metadata = results[shard]
+        metadata.update(shard_metadata)
+        for position, (source_name, file_name, file_info) in enumerate(shard_files):
+            source = sources.get(source_name)
+            if source is not None and not file_info.modified:
+                file_info.path = source.path
+                file_info.stats = source.stats
+
+            # Created files are sorted after every source file, by shard and in the order they were created in.
+            entries.append((order.get(source_name, len(order)), shard, position, file_name, file_info))
+
+    entries.sort(key=lambda entry: entry[:3])
+    return [(file_name, file_info) for _, _, _, file_name, file_info in entries], metadata
@@ -0,0 +1,233 @@
+"""
+    The indexed mapping used to hold the files of a build.
+"""
+
+import collections.abc
+import fnmatch
+import functools
+import os
+import re
+import threading
+
+
+_WILDCARD_CHARS = "*?["
+
+# The index relies on file names being compared case-sensitively, which is what fnmatch does everywhere except on
+# Windows. There the index is bypassed and every file name is checked against the pattern.
+_CAN_INDEX = os.path.normcase("A") == "A"
+
+
+class FileStore(collections.abc.MutableMapping):
+    """
+        A mapping of file names to :class:`~pysmith.FileInfo` objects that keeps an index of the file names by extension
+        and by directory. The index is used to answer glob queries in time proportional to the number of candidate
+        files rather than the total number of files. The store behaves like a dict, including its ordering. Adding,
+        removing, renaming and matching files is thread-safe, so plugins working on different files can share a store.
+
+        :param files: The dictionary to store the files in. It is used directly rather than copied, so it always
+                      reflects the contents of the store.
+        :type files: dict(str, ~pysmith.FileInfo) or None
+    """
+
+    def __init__(self, files=None):
+        self._files = {} if files is None else files
+        self._positions = {}
+        self._next_position = 0
+        self._by_extension = {}
+        self._by_directory = {}
+        self._lock = threading.RLock()
+
+        for file_name in self._files:
+            self._add_to_index(file_name)
+
+    def __getitem__(self, file_name):
+        return self._files[file_name]
+
+    def __setitem__(self, file_name, file_info):
+        with self._lock:
+            if file_name not in self._files:
+                self._add_to_index(file_name)
+
+            self._files[file_name] = file_info
+
+    def __delitem__(self, file_name):
+        with self._lock:
+            del self._files[file_name]
+            self._remove_from_index(file_name)
+
+    def __contains__(self, file_name):
+        return file_name in self._files
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __repr__(self):  # pragma: no cover
+        return "{}.{}({!r})".format(type(self).__module__, type(self).__name__, self._files)
+
+    def clear(self):
+        """
+            Removes every file from the store, in time proportional to the number of files.
+        """
+
+        with self._lock:
+            self._files.clear()
+            self._positions.clear()
+            self._next_position = 0
+            self._by_extension.clear()
+            self._by_directory.clear()
+
+    def rename(self, file_name, new_file_name):
+        """
+            Moves a file to a new name, replacing any file with that name. The file is moved to the end of the store.
+
+            :param str file_name: The existing name of the file.
+            :param str new_file_name: The new name for the file.
+            :raises KeyError: If there is no file with the existing name.
+        """
+
+        with self._lock:
+            file_info = self._files[file_name]
+            del self[file_name]
+            self[new_file_name] = file_info
+
+    def snapshot(self):
+        """
+            Lists the files in the store at a single point in time, even while other threads modify the store.
+
+            :returns: The file names and :class:`~pysmith.FileInfo` objects, in the order of the store.
+            :rtype: list(tuple(str, ~pysmith.FileInfo))
+        """
+
+        with self._lock:
+            return list(self._files.items())
+
+    def match(self, match_pattern):
+        """
+            Finds the file names matching a glob pattern, using the same rules as :func:`fnmatch.filter`.
+
+            :param str match_pattern: The glob pattern.
+            :returns: The matching file names, in the order of the store.
+            :rtype: list(str)
+        """
+
+        with self._lock:
+            return self._match(match_pattern)
+
+    def _match(self, match_pattern):
+        regex, literal, extension, directory = _compile_pattern(match_pattern)
+
+        if literal is not None:
+            return [literal] if literal in self._files else []
+
+        candidates = None
+        if extension is not None:
+            candidates = self._by_extension.get(extension, {})
+
+        if directory is not None:
+            directory_prefix = directory + os.sep
+            directories = [
+                names for name, names in self._by_directory.items()
+                if name == directory or name.startswith(directory_prefix)
+            ]
+            directory_size = sum(len(names) for names in directories)
+            if candidates is None or directory_size < len(candidates):
+                candidates = [name for names in directories for name in names]
+                candidates.sort(key=self._positions.__getitem__)
+
+        if candidates is None:
+            candidates = self._files
+
+        normcase = os.path.normcase
+        return [file_name for file_name in candidates if regex.match(normcase(file_name))]
+
+    def _add_to_index(self, file_name):
+        self._positions[file_name] = self._next_position
+        self._next_position += 1
+        self._by_extension.setdefault(_get_extension(file_name), {})[file_name] = None
+        self._by_directory.setdefault(os.path.dirname(file_name), {})[file_name] = None
+
+    def _remove_from_index(self, file_name):
+        del self._positions[file_name]
+        _discard(self._by_extension, _get_extension(file_name), file_name)
+        _discard(self._by_directory, os.path.dirname(file_name), file_name)
+
+
+def may_overlap(pattern1, pattern2):
+    """
+        Checks whether two patterns may match the same file name. This is conservative: it only returns False when the
+        patterns provably match different files, e.g. because they require different extensions or different
+        directories, and always returns True if either pattern is a regular expression.
+
+        :param pattern1: A glob pattern, or a regular expression compiled using :func:`re.compile`.
+        :type pattern1: str or re.Pattern
+        :param pattern2: Another glob pattern or regular expression.
+        :type pattern2: str or re.Pattern
+        :returns: bool
+    """
+
+    if not isinstance(pattern1, str) or not isinstance(pattern2, str):
+        return True
+
+    regex1, literal1, extension1, directory1 = _compile_pattern(pattern1)
+    regex2, literal2, extension2, directory2 = _compile_pattern(pattern2)
+    if literal1 is not None:
+        return regex2.match(literal1) is not None
+
+    if literal2 is not None:
+        return regex1.match(literal2) is not None
+
+    if extension1 is not None and extension2 is not None and extension1 != extension2:
+        return False
+
+    if directory1 is not None and directory2 is not None:
+        return _is_within(directory1, directory2) or _is_within(directory2, directory1)
+
+    return True
+
+
+def _is_within(directory, parent):
+    return directory == parent or directory.startswith(parent + os.sep)
+
+
+def _discard(index, key, file_name):
+    names = index[key]
+    del names[file_name]
+    if not names:
+        del index[key]
+
+
+def _get_extension(file_name):
+    base_name = file_name[file_name.rfind(os.sep) + 1:]
+    index = base_name.rfind(".")
+    return base_name[index:] if index >= 0 else ""
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_pattern(match_pattern):
+    pattern = os.path.normcase(match_pattern)
+    regex = re.compile(fnmatch.translate(pattern))
+    if not _CAN_INDEX:
+        return regex, None, None, None
+
+    first_wildcard = min((i for i in map(pattern.find, _WILDCARD_CHARS) if i >= 0), default=-1)
+    if first_wildcard < 0:
+        return regex, pattern, None, None
+
+    # The literal text after the last wildcard must end every matching name. If its last path component contains a dot,
+    # every matching name has the same extension.
+    suffix = pattern[max(map(pattern.rfind, "*?]")) + 1:]
+    extension = None
+    if "." in suffix[suffix.rfind(os.sep) + 1:]:
+        extension = _get_extension(suffix)
+
+    # The literal text before the first wildcard must start every matching name. If it contains a directory, every
+    # matching name is in that directory or one of its subdirectories.
+    prefix = pattern[:first_wildcard]
+    directory = None
+    if os.sep in prefix:
+        directory = prefix[:prefix.rfind(os.sep)]
+
+    return regex, None, extension, directory
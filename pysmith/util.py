@@ -1,10 +1,448 @@
+import errno
+import hashlib
 import os
+import pickle
+import re
+import shutil
+import tempfile
+import types
+import zlib
 
 
-def scantree(path, parent=""):
+# The ioctl request used to clone a file on Linux file systems that support copy-on-write (btrfs, xfs, ...).
+_FICLONE = 0x40049409
+
+# From <fcntl.h> and <linux/fs.h>, for renameat2.
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+# Windows opens files in text mode unless asked otherwise.
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+# Linux returns at most 0x7ffff000 bytes from a single read, and macOS rejects requests above INT_MAX.
+_MAX_READ_SIZE = 1024 * 1024 * 1024
+
+# Saved build states are mostly text, which compresses well even at the fastest level.
+_COMPRESSION_LEVEL = 1
+
+# The errors raised by the kernel copy and clone calls when the operation is not supported for the given files.
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF,
+                       errno.ENOTSOCK}
+
+# The errors raised by link when the file cannot be hard linked, e.g. across file systems or on file systems without
+# hard links.
+_LINK_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP}
+
+
+def scantree(path, parent="", ignore=None, sort=False):
+    """
+        Lists the files in a directory tree, depth first. The tree is walked iteratively, so deep trees do not run into
+        the recursion limit, and each directory is listed in full and closed before its subdirectories are entered.
+        Whether an entry is a directory is taken from the listing where the file system provides it, and the stat
+        results of the files are left to be fetched (and cached) by their :class:`os.DirEntry` objects.
+
+        :param str path: The directory to scan.
+        :param str parent: The path of the directory relative to the root of the scan, prepended to the file names.
+        :param ignore: The rules for the files and directories to skip. Ignored directories are not entered.
+        :type ignore: ~pysmith.ignore.IgnoreRules or None
+        :param bool sort: Whether to list the entries of each directory sorted by name, rather than in the order the
+                          file system returns them in, so the order of the files is the same on every system.
+        :returns: The paths of the files relative to the root of the scan, and their :class:`os.DirEntry` objects.
+    """
+
+    stack = [(iter(_list_entries(path, parent, ignore, sort)), _get_prefix(parent))]
+    while stack:
+        entries, prefix = stack[-1]
+        for entry in entries:
+            file_name = prefix + entry.name
+            if entry.is_dir():
+                stack.append((iter(_list_entries(entry.path, file_name, ignore, sort)), file_name + os.sep))
+                break
+
+            yield (file_name, entry)
+        else:
+            stack.pop()
+
+
+def scantree_parallel(path, executor, ignore=None, sort=False):
+    """
+        Equivalent to :func:`scantree`, but directories are listed and files are stat'd on the given executor. All
+        subdirectories of a directory are submitted as soon as it is listed, so their latency overlaps, while entries
+        are still yielded in the same order as :func:`scantree`. The stat results are cached on the yielded entries.
+
+        :param str path: The directory to scan.
+        :param executor: The executor to run the file system calls on.
+        :type executor: concurrent.futures.Executor
+        :param ignore: The rules for the files and directories to skip. Ignored files are not stat'd, and ignored
+                       directories are not entered.
+        :type ignore: ~pysmith.ignore.IgnoreRules or None
+        :param bool sort: See :func:`scantree`.
+    """
+
+    stack = [_walk_listing(executor, executor.submit(_list_directory, path, "", ignore, sort), "", ignore, sort)]
+    while stack:
+        entries, prefix, subdirectories = stack[-1]
+        for entry in entries:
+            file_name = prefix + entry.name
+            if entry.name in subdirectories:
+                stack.append(_walk_listing(executor, subdirectories[entry.name], file_name, ignore, sort))
+                break
+
+            yield (file_name, entry)
+        else:
+            stack.pop()
+
+
+def _get_prefix(parent):
+    return parent + os.sep if parent else ""
+
+
+def _list_entries(path, parent, ignore, sort):
     with os.scandir(path) as it:
-        for entry in it:
-            if (entry.is_dir()):
-                yield from scantree(entry.path, os.path.join(parent, entry.name))
-            else:
-                yield (os.path.join(parent, entry.name), entry)
+        if ignore:
+            prefix = _get_prefix(parent)
+            entries = [entry for entry in it if not ignore.matches(prefix + entry.name, entry.is_dir())]
+        else:
+            entries = list(it)
+
+    if sort:
+        entries.sort(key=lambda entry: entry.name)
+
+    return entries
+
+
+def _list_directory(path, parent, ignore, sort):
+    entries = _list_entries(path, parent, ignore, sort)
+    for entry in entries:
+        if not entry.is_dir():
+            entry.stat()
+
+    return entries
+
+
+def _walk_listing(executor, future, parent, ignore, sort):
+    entries = future.result()
+    prefix = _get_prefix(parent)
+    subdirectories = {
+        entry.name: executor.submit(_list_directory, entry.path, prefix + entry.name, ignore, sort)
+        for entry in entries if entry.is_dir()
+    }
+    return iter(entries), prefix, subdirectories
+
+
+def read_file(path, size=None):
+    """
+        Reads the contents of a file using as few system calls as possible. When the size of the file is known, the
+        file is opened, read in one call followed by the call finding the end of the file, and closed, rather than
+        stat'd again to size the buffer. The size is only a hint: the file is always read up to its end, even if it
+        changed since it was stat'd or the file system returns fewer bytes than requested.
+
+        :param str path: The path of the file.
+        :param size: The expected size of the file in bytes, or None if it is not known.
+        :type size: int or None
+        :returns: The contents of the file.
+        :rtype: bytes
+    """
+
+    fd = os.open(path, os.O_RDONLY | _O_BINARY)
+    try:
+        if size is None:
+            size = os.fstat(fd).st_size
+
+        # Only an empty read marks the end of the file, since large files and network or FUSE file systems can return
+        # fewer bytes than requested before it.
+        remaining = size
+        chunks = []
+        while True:
+            request = remaining if remaining > 0 else _READ_CHUNK_SIZE
+            chunk = os.read(fd, min(request, _MAX_READ_SIZE))
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            remaining -= len(chunk)
+
+        if len(chunks) == 1:
+            return chunks[0]
+
+        return b"".join(chunks)
+    finally:
+        os.close(fd)
+
+
+def remove_file(path):
+    """
+        Removes a file if it exists.
+
+        :param str path: The path of the file.
+        :returns: True if the file was removed, or False if it did not exist.
+    """
+
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+def copy_file(src_path, dest_path, link_mode=None):
+    """
+        Copies a file without reading its contents into Python. Any existing file at the destination is replaced.
+
+        :param str src_path: The path of the file to copy.
+        :param str dest_path: The path to copy the file to.
+        :param link_mode: If this is :code:`"hardlink"`, a hard link is created instead of a copy, unless the file
+                          cannot be linked, e.g. because the destination is on another file system. If this is
+                          :code:`"reflink"`, the file is cloned if the file system supports it. Otherwise the data is
+                          copied by the kernel.
+        :type link_mode: str or None
+        :returns: The size of the copied file.
+    """
+
+    remove_file(dest_path)
+    if link_mode == "hardlink":
+        try:
+            os.link(src_path, dest_path)
+            return os.stat(dest_path).st_size
+        except OSError as e:
+            if e.errno not in _LINK_UNSUPPORTED_ERRNOS:
+                raise
+
+    with open(src_path, "rb") as fsrc, open(dest_path, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        if link_mode == "reflink" and _clone_file(fsrc, fdst):
+            return size
+
+        for copy in _KERNEL_COPIES:
+            if _kernel_copy(fsrc, fdst, copy, size):
+                return size
+
+            fdst.seek(0)
+            fdst.truncate()
+
+        fsrc.seek(0)
+        shutil.copyfileobj(fsrc, fdst)
+        return size
+
+
+def _clone_file(fsrc, fdst):
+    try:
+        import fcntl
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except ImportError:
+        return False
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+
+        return False
+
+    return True
+
+
+def _kernel_copy(fsrc, fdst, copy, size):
+    offset = 0
+    try:
+        while offset < size:
+            count = copy(fsrc.fileno(), fdst.fileno(), offset, size - offset)
+            if count == 0:
+                break
+
+            offset += count
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+
+        return False
+
+    return True
+
+
+def _copy_file_range(in_fd, out_fd, offset, count):
+    return os.copy_file_range(in_fd, out_fd, count, offset, offset)
+
+
+def _sendfile(in_fd, out_fd, offset, count):
+    return os.sendfile(out_fd, in_fd, offset, count)
+
+
+_KERNEL_COPIES = tuple(copy for name, copy in (
+    ("copy_file_range", _copy_file_range),
+    ("sendfile", _sendfile),
+) if hasattr(os, name))
+
+
+def exchange_paths(path1, path2):
+    """
+        Atomically swaps two paths, using :code:`renameat2` with :code:`RENAME_EXCHANGE` on Linux. Both paths must exist
+        and be on the same file system.
+
+        :param str path1: The first path.
+        :param str path2: The second path.
+        :returns: True if the paths were swapped, or False if atomic exchange is not supported.
+    """
+
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        renameat2 = libc.renameat2
+    except (ImportError, OSError, AttributeError):
+        return False
+
+    renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+    if renameat2(_AT_FDCWD, os.fsencode(path1), _AT_FDCWD, os.fsencode(path2), _RENAME_EXCHANGE) == 0:
+        return True
+
+    error = ctypes.get_errno()
+    if error in _UNSUPPORTED_ERRNOS:
+        return False
+
+    raise OSError(error, os.strerror(error), path1, None, path2)
+
+
+def write_compressed(path, header, state):
+    """
+        Atomically writes a pickled header followed by a compressed state to a file, creating its directory if needed.
+        The header can be read using :func:`pickle.load` without reading the rest of the file, which is then
+        decompressed using :func:`zlib.decompress`.
+
+        :param str path: The path of the file.
+        :param header: The header, which must be picklable.
+        :param bytes state: The state to compress.
+        :returns: The size of the file in bytes.
+        :rtype: int
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            f.write(zlib.compress(state, _COMPRESSION_LEVEL))
+            size = f.tell()
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return size
+
+
+def content_digest(contents):
+    """
+        Computes the digest used to identify file contents across builds.
+
+        :param bytes contents: The contents to hash.
+        :returns: The hex digest of the contents.
+    """
+
+    return hashlib.blake2b(contents, digest_size=20).hexdigest()
+
+
+def file_digest(path):
+    """
+        Computes the same digest as :func:`content_digest` for the contents of a file, without reading the whole file
+        into memory.
+
+        :param str path: The path of the file to hash.
+        :returns: The hex digest of the file contents.
+    """
+
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def config_fingerprint(obj):
+    """
+        Computes a stable digest of an object's configuration, typically a plugin or a list of plugins. The digest is
+        built from the types and attribute values of the object graph, so it stays the same across processes as long as
+        the configuration does. If an object defines :code:`__getstate__`, the returned state is used in place of its
+        attributes.
+
+        :param obj: The object to fingerprint.
+        :returns: The hex digest of the configuration.
+    """
+
+    hasher = hashlib.blake2b(digest_size=20)
+    _feed_fingerprint(hasher, obj, set())
+    return hasher.hexdigest()
+
+
+_SCALAR_TYPES = (type(None), bool, int, float, complex, str, bytes)
+_CALLABLE_TYPES = (types.FunctionType, types.BuiltinFunctionType, types.MethodType, type, types.ModuleType)
+_DEFAULT_GETSTATE = getattr(object, "__getstate__", None)
+
+
+def _feed_fingerprint(hasher, obj, seen):
+    obj_type = type(obj)
+    hasher.update("{}.{}:".format(obj_type.__module__, obj_type.__qualname__).encode())
+
+    if isinstance(obj, _SCALAR_TYPES):
+        hasher.update(repr(obj).encode())
+    elif isinstance(obj, re.Pattern):
+        hasher.update(repr((obj.pattern, obj.flags)).encode())
+    elif isinstance(obj, _CALLABLE_TYPES):
+        _feed_callable(hasher, obj, seen)
+    elif id(obj) in seen:
+        hasher.update(b"<cycle>")
+    else:
+        seen.add(id(obj))
+        try:
+            _feed_container(hasher, obj, seen)
+        finally:
+            seen.discard(id(obj))
+
+    hasher.update(b";")
+
+
+def _feed_callable(hasher, obj, seen):
+    if isinstance(obj, types.MethodType):
+        _feed_fingerprint(hasher, obj.__self__, seen)
+        obj = obj.__func__
+
+    hasher.update("{}.{}".format(getattr(obj, "__module__", None), getattr(obj, "__qualname__", None)).encode())
+
+    code = getattr(obj, "__code__", None)
+    if code is not None:
+        hasher.update(code.co_code)
+        for const in code.co_consts:
+            if isinstance(const, _SCALAR_TYPES):
+                hasher.update(repr(const).encode())
+
+
+def _feed_container(hasher, obj, seen):
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            _feed_fingerprint(hasher, item, seen)
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            _feed_fingerprint(hasher, key, seen)
+            _feed_fingerprint(hasher, obj[key], seen)
+    elif isinstance(obj, (set, frozenset)):
+        for item in sorted(obj, key=repr):
+            _feed_fingerprint(hasher, item, seen)
+    elif getattr(type(obj), "__getstate__", None) not in (None, _DEFAULT_GETSTATE):
+        _feed_fingerprint(hasher, obj.__getstate__(), seen)
+    else:
+        _feed_fingerprint(hasher, _get_attributes(obj), seen)
+
+
+def _get_attributes(obj):
+    attributes = dict(getattr(obj, "__dict__", {}))
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, "__slots__", ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if hasattr(obj, slot):
+                attributes[slot] = getattr(obj, slot)
+
+    return attributes
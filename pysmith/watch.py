@@ -0,0 +1,260 @@
+"""
+    Watches the source directory for changes, for :meth:`~pysmith.Pysmith.watch`.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+from .util import scantree
+
+
+logger = logging.getLogger("pysmith")
+
+# From <sys/inotify.h>.
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE |
+               _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+#: Returned among the changed paths when the watcher lost track of the changes, e.g. because events were dropped. The
+#: whole source directory should be rescanned.
+RESCAN = None
+
+
+def create_watcher(path, *, polling=False, poll_interval=1.0, ignore=None):
+    """
+        Creates the best available watcher for a directory. This is an :class:`InotifyWatcher` on Linux, and a
+        :class:`PollingWatcher` elsewhere or if inotify cannot be used.
+
+        :param str path: The directory to watch.
+        :param bool polling: Whether to always use a :class:`PollingWatcher`.
+        :param float poll_interval: The interval between scans of a :class:`PollingWatcher`, in seconds.
+        :param ignore: The rules for the files and directories whose changes are not reported.
+        :type ignore: ~pysmith.ignore.IgnoreRules or None
+    """
+
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path, ignore=ignore)
+        except OSError as e:
+            logger.warning("Unable to use inotify, falling back to polling: {}".format(e))
+
+    return PollingWatcher(path, interval=poll_interval, ignore=ignore)
+
+
+class InotifyWatcher(object):
+    """
+        Watches a directory tree using the Linux inotify API. Every directory in the tree is watched, including
+        directories created while watching, except for ignored directories.
+
+        :param str path: The directory to watch.
+        :param ignore: The rules for the files and directories whose changes are not reported.
+        :type ignore: ~pysmith.ignore.IgnoreRules or None
+    """
+
+    def __init__(self, path, *, ignore=None):
+        self._path = path
+        self._ignore = ignore
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            raise _last_os_error()
+
+        self._directories = {}
+        try:
+            self._add_tree("")
+        except BaseException:
+            self.close()
+            raise
+
+    def wait(self, timeout):
+        """
+            Waits for changes in the directory tree.
+
+            :param timeout: The maximum time to wait, in seconds, or None to wait until a change is detected.
+            :type timeout: float or None
+            :returns: The paths of the changed files and directories, relative to the watched directory. This contains
+                      :data:`RESCAN` if the changes could not be tracked. It is empty if the timeout expired.
+            :rtype: set(str)
+        """
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changes = set()
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                changes.add(RESCAN)
+                continue
+
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+
+            if mask & _IN_IGNORED:
+                del self._directories[wd]
+                continue
+
+            changed_path = os.path.join(directory, name) if name else directory
+            if self._ignore and name and self._ignore.matches(changed_path, bool(mask & _IN_ISDIR)):
+                continue
+
+            changes.add(changed_path)
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                # Files may have been created in the directory before it was watched, so it is reported as changed.
+                self._add_tree(changed_path)
+
+        return changes
+
+    def close(self):
+        """
+            Stops watching the directory tree.
+        """
+
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add_tree(self, directory):
+        self._add_watch(directory)
+        try:
+            with os.scandir(os.path.join(self._path, directory)) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        for entry in entries:
+            subdirectory = os.path.join(directory, entry.name)
+            if entry.is_dir() and not (self._ignore and self._ignore.matches(subdirectory, True)):
+                self._add_tree(subdirectory)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(os.path.join(self._path, directory)), _WATCH_MASK)
+        if wd < 0:
+            error = _last_os_error()
+            if error.errno in (errno.ENOENT, errno.ENOTDIR):
+                return
+
+            raise error
+
+        self._directories[wd] = directory
+
+
+class PollingWatcher(object):
+    """
+        Watches a directory tree by periodically scanning it and comparing the size and modification time of the files.
+
+        :param str path: The directory to watch.
+        :param float interval: The interval between scans, in seconds.
+        :param ignore: The rules for the files and directories that are not scanned.
+        :type ignore: ~pysmith.ignore.IgnoreRules or None
+    """
+
+    def __init__(self, path, *, interval=1.0, ignore=None):
+        self._path = path
+        self._interval = interval
+        self._ignore = ignore
+        self._snapshot = self._scan()
+
+    def wait(self, timeout):
+        """
+            Waits for changes in the directory tree. This has the same interface as :meth:`InotifyWatcher.wait`.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changes = self._poll()
+            if changes:
+                return changes
+
+            delay = self._interval
+            if deadline is not None:
+                delay = min(delay, deadline - time.monotonic())
+                if delay <= 0:
+                    return changes
+
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _poll(self):
+        snapshot = self._scan()
+        changes = {
+            file_name for file_name, state in snapshot.items() if self._snapshot.get(file_name) != state
+        }
+        changes.update(file_name for file_name in self._snapshot if file_name not in snapshot)
+        self._snapshot = snapshot
+        return changes
+
+    def _scan(self):
+        snapshot = {}
+        try:
+            for file_name, entry in scantree(self._path, ignore=self._ignore):
+                try:
+                    stats = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                snapshot[file_name] = (stats.st_size, stats.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+
+        return snapshot
+
+
+def _load_libc():
+    library = ctypes.util.find_library("c")
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError(errno.ENOSYS, "inotify is not available")
+
+    libc.inotify_init1.argtypes = (ctypes.c_int,)
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    return libc
+
+
+def _last_os_error():
+    error = ctypes.get_errno()
+    return OSError(error, os.strerror(error))
@@ -0,0 +1,311 @@
+"""
+    The output writer handles writing the processed files to the destination directory.
+"""
+
+import concurrent.futures
+import os
+import shutil
+import stat
+import threading
+
+from .util import copy_file, file_digest, remove_file, scantree
+
+
+#: The supported values for the :code:`link_mode` option of :class:`OutputWriter`.
+LINK_MODES = (None, "hardlink", "reflink")
+
+#: The outcome of an output that was written to the destination.
+WRITTEN = "written"
+#: The outcome of an output whose contents in the destination were already up to date.
+UNCHANGED = "unchanged"
+#: The outcome of an output that was deleted from the destination.
+DELETED = "deleted"
+
+
+class OutputWriter(object):
+    """
+        Writes files to the destination directory. Each destination directory is created at most once, and the files
+        themselves can be written concurrently on a bounded thread pool. Directories are always created on the calling
+        thread, so errors about conflicting paths are raised from :meth:`write`. Errors raised while writing a file are
+        raised from :meth:`close`.
+
+        The writer can be used as a context manager, in which case :meth:`close` is called on exit.
+
+        :param str dest: The path to the destination directory.
+        :param workers: The number of threads used to write the files. If this is None, files are written on the calling
+                        thread.
+        :type workers: int or None
+        :param link_mode: How unmodified files are copied, as described by :func:`~pysmith.util.copy_file`.
+        :type link_mode: str or None
+        :param bool skip_unchanged: Whether to compare each file with the existing output before writing it. Outputs
+                                    with a different size are written right away. Otherwise the existing output is
+                                    hashed, unless its size and modification time match the state recorded when it was
+                                    last written (see :meth:`write`), and it is only written if the digests differ.
+        :param previous_dest: A directory holding the outputs of the previous build, when writing a new tree next to
+                              it. The outputs are compared with the files in this directory instead, and unchanged
+                              files are hard linked from it rather than written. This implies :code:`skip_unchanged`.
+        :type previous_dest: str or None
+
+        .. attribute:: outcomes
+            :type: dict(str, str)
+
+            The outcome of each file handled so far, keyed by the file name: :data:`WRITTEN`, :data:`UNCHANGED` or
+            :data:`DELETED`.
+
+        .. attribute:: outputs
+            :type: dict(str, dict)
+
+            When :code:`skip_unchanged` is set, the state of each output in the destination after it was written or
+            found to be unchanged, keyed by the file name. Each entry is a dict with the :code:`digest`, :code:`size`
+            and :code:`mtime` (in nanoseconds) of the output, which can be passed back to :meth:`write` in a later
+            build.
+
+        .. attribute:: files_written
+            :type: int
+
+            The number of files written so far.
+
+        .. attribute:: bytes_written
+            :type: int
+
+            The total size of the files written so far.
+
+        .. attribute:: files_unchanged
+            :type: int
+
+            The number of files that were already up to date so far.
+
+        .. attribute:: files_deleted
+            :type: int
+
+            The number of files deleted so far.
+    """
+
+    def __init__(self, dest, *, workers=None, link_mode=None, skip_unchanged=False, previous_dest=None):
+        if link_mode not in LINK_MODES:
+            raise ValueError("Unknown link mode \"{}\"".format(link_mode))
+
+        self._dest = dest
+        self._link_mode = link_mode
+        self._skip_unchanged = skip_unchanged or previous_dest is not None
+        self._previous_dest = previous_dest
+        self._directories = set()
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._executor = None
+        self._slots = None
+        if workers is not None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(workers)
+            self._slots = threading.BoundedSemaphore(workers * 2)
+
+        self.outcomes = {}
+        self.outputs = {}
+        self.files_written = 0
+        self.bytes_written = 0
+        self.files_unchanged = 0
+        self.files_deleted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._executor is not None:
+            self._executor.shutdown()
+
+    def write(self, file_name, file_info, previous=None, *, release=False):
+        """
+            Writes a file to the destination. If the file's contents were never modified, the file is copied from its
+            source path instead.
+
+            :param str file_name: The path of the file relative to the destination directory.
+            :param file_info: The file to write.
+            :type file_info: ~pysmith.FileInfo
+            :param previous: The state of the output recorded in :attr:`outputs` by a previous build. It is only used
+                             when :code:`skip_unchanged` is set, to avoid hashing outputs that were not touched since.
+            :type previous: dict or None
+            :param bool release: Whether to drop the contents of the file from memory once it is written. The file then
+                                 refers to the written output, which its contents are reloaded from if needed.
+        """
+
+        path = os.path.join(self._dest, file_name)
+        self._make_parent_directory(path)
+
+        if self._executor is None:
+            self._write(file_name, path, file_info, previous, release)
+            return
+
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._write, file_name, path, file_info, previous, release)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._futures.add(future)
+
+        future.add_done_callback(self._write_done)
+
+    def keep(self, file_name):
+        """
+            Records that an output is already up to date without checking the destination.
+
+            :param str file_name: The path of the file relative to the destination directory.
+        """
+
+        with self._lock:
+            self.outcomes[file_name] = UNCHANGED
+            self.files_unchanged += 1
+
+    def delete(self, file_name):
+        """
+            Deletes a file from the destination, along with any parent directories left empty.
+
+            :param str file_name: The path of the file relative to the destination directory.
+        """
+
+        path = os.path.join(self._dest, file_name)
+        if not remove_file(path):
+            return
+
+        with self._lock:
+            self.outcomes[file_name] = DELETED
+            self.files_deleted += 1
+
+        dest = os.path.normpath(self._dest)
+        dirname = os.path.dirname(os.path.normpath(path))
+        while dirname != dest:
+            try:
+                os.rmdir(dirname)
+            except OSError:
+                break
+
+            self._directories.discard(dirname)
+            dirname = os.path.dirname(dirname)
+
+    def prune(self, file_names):
+        """
+            Deletes every file in the destination that is not in the given file names, along with any directories left
+            empty.
+
+            :param file_names: The names of the files to keep, relative to the destination directory.
+            :type file_names: collections.abc.Container
+        """
+
+        for file_name, _ in list(scantree(self._dest)):
+            if file_name not in file_names:
+                self.delete(file_name)
+
+    def close(self):
+        """
+            Waits for all pending writes to finish.
+
+            :raises Exception: The first error raised while writing a file.
+        """
+
+        if self._executor is None:
+            return
+
+        try:
+            with self._lock:
+                futures = list(self._futures)
+
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        finally:
+            self._executor.shutdown()
+
+    def _write_done(self, future):
+        with self._lock:
+            if future.exception() is None:
+                self._futures.discard(future)
+
+        self._slots.release()
+
+    def _write(self, file_name, path, file_info, previous, release):
+        self._write_output(file_name, path, file_info, previous)
+        if release:
+            file_info._release(path)
+
+    def _write_output(self, file_name, path, file_info, previous):
+        digest = None
+        if self._skip_unchanged:
+            digest = file_info.digest
+            existing_path = path if self._previous_dest is None else os.path.join(self._previous_dest, file_name)
+            stats = self._get_unchanged_stats(existing_path, file_info, digest, previous)
+            if stats is not None:
+                if existing_path != path:
+                    self._reuse_file(existing_path, path)
+
+                with self._lock:
+                    self.outcomes[file_name] = UNCHANGED
+                    self.outputs[file_name] = {"digest": digest, "size": stats.st_size, "mtime": stats.st_mtime_ns}
+                    self.files_unchanged += 1
+
+                return
+
+        if file_info.modified:
+            size = self._write_contents(path, file_info.contents)
+        else:
+            size = copy_file(file_info.path, path, link_mode=self._link_mode)
+
+        with self._lock:
+            self.outcomes[file_name] = WRITTEN
+            self.files_written += 1
+            self.bytes_written += size
+
+        if digest is not None:
+            stats = os.stat(path)
+            with self._lock:
+                self.outputs[file_name] = {"digest": digest, "size": stats.st_size, "mtime": stats.st_mtime_ns}
+
+    def _reuse_file(self, existing_path, path):
+        try:
+            os.link(existing_path, path)
+        except OSError:
+            copy_file(existing_path, path)
+            shutil.copystat(existing_path, path)
+
+    def _get_unchanged_stats(self, path, file_info, digest, previous):
+        try:
+            stats = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        if not stat.S_ISREG(stats.st_mode) or stats.st_size != file_info.size:
+            return None
+
+        if previous is not None and previous["size"] == stats.st_size and previous["mtime"] == stats.st_mtime_ns:
+            existing_digest = previous["digest"]
+        else:
+            existing_digest = file_digest(path)
+
+        return stats if existing_digest == digest else None
+
+    def _write_contents(self, path, contents):
+        # The existing output may be a hard link to a source file, so it is replaced rather than truncated.
+        remove_file(path)
+        with open(path, "wb") as f:
+            f.write(contents)
+
+        return len(contents)
+
+    def _make_parent_directory(self, path):
+        dirname = os.path.dirname(os.path.normpath(path))
+        if dirname in self._directories:
+            return
+
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        elif not os.path.isdir(dirname):
+            raise NotADirectoryError("\"{}\" is not a directory".format(dirname))
+
+        dest = os.path.normpath(self._dest)
+        while dirname not in self._directories:
+            self._directories.add(dirname)
+            if dirname == dest:
+                break
+
+            dirname = os.path.dirname(dirname)
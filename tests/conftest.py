@@ -0,0 +1 @@
+from .util import executor  # noqa: F401
@@ -1,7 +1,8 @@
 import pytest
 
 from pysmith import BuildInfo
-from pysmith.contrib.core.collection import COLLECTIONS_KEY, Collection
+from pysmith.contrib.core.collection import COLLECTIONS_KEY, Collection, track_collections
+from pysmith.dependencies import ANY, COLLECTION, SOURCE
 from tests.util import MockFileInfo
 
 
@@ -66,3 +67,47 @@ def test_build(reverse):
             ordered_file_2,
             ordered_file_3,
         ]
+
+
+def test_get_access():
+    access = Collection(collection_name="posts", match_pattern="posts/*", order_by="date").get_access()
+
+    assert access.files == ["posts/*"]
+    assert access.writes_metadata
+    assert not access.reads_metadata
+
+
+def test_build_records_dependencies():
+    post_file = MockFileInfo("contents1", metadata={"order": 1})
+    post_file.add_dependency(SOURCE, "post.md")
+    build_info = BuildInfo({"post.md": post_file, "x.js": MockFileInfo("contents2")})
+
+    Collection(collection_name="posts", match_pattern="*.md", order_by="order").build(build_info)
+
+    assert build_info.dependencies.affected_outputs([(SOURCE, "post.md")]) == set()
+    build_info.dependencies.add_output("index.html", [(COLLECTION, "posts")])
+    assert build_info.dependencies.affected_outputs([(SOURCE, "post.md")]) == {"index.html"}
+    assert build_info.dependencies.affected_outputs([(SOURCE, "x.js")]) == set()
+
+
+def test_track_collections():
+    posts = [MockFileInfo("contents")]
+    metadata = {"key": "value", COLLECTIONS_KEY: {"posts": posts, "pages": []}}
+    file_info = MockFileInfo("contents")
+
+    tracked = track_collections(metadata, file_info)
+    assert tracked == metadata
+    assert file_info.dependencies == set()
+
+    assert tracked[COLLECTIONS_KEY]["posts"] is posts
+    assert tracked[COLLECTIONS_KEY].get("missing") is None
+    assert file_info.dependencies == {(COLLECTION, "posts"), (COLLECTION, "missing")}
+
+    list(tracked[COLLECTIONS_KEY].values())
+    assert (COLLECTION, ANY) in file_info.dependencies
+    assert type(metadata[COLLECTIONS_KEY]) is dict
+
+
+def test_track_collections_no_collections():
+    metadata = {"key": "value"}
+    assert track_collections(metadata, MockFileInfo("contents")) is metadata
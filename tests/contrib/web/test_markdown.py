@@ -48,3 +48,11 @@ def test_extras(mock_markdown2):
     assert files == {
         "test.md": MockFileInfo(b"parsedContents"),
     }
+
+
+def test_get_access():
+    access = Markdown(match_pattern="*.markdown").get_access()
+
+    assert access.files == ["*.markdown"]
+    assert access.creates == []
+    assert not access.reads_metadata
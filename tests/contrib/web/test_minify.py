@@ -22,12 +22,12 @@ def test_valid_files(mock_jsmin):
         "test2.js": MockFileInfo(b"contents2"),
     }
 
-    mock_jsmin.side_effect = (b"parsedContents1", b"parsedContents2")
+    mock_jsmin.side_effect = ("parsedContents1", "parsedContents2")
 
     minify = Minify()
     minify.build(BuildInfo(files))
 
-    mock_jsmin.assert_has_calls((call(b"contents1"), call(b"contents2")))
+    mock_jsmin.assert_has_calls((call("contents1"), call("contents2")))
     assert files == {
         "test1.js": MockFileInfo(b"parsedContents1"),
         "test2.js": MockFileInfo(b"parsedContents2"),
@@ -5,6 +5,7 @@ from unittest.mock import call
 import pytest
 
 from pysmith import BuildInfo
+from pysmith.cache import PluginCache
 from tests.util import MockFileInfo, create_patch
 
 sys.modules["sass"] = unittest.mock.Mock()
@@ -18,7 +19,7 @@ def mock_compile(monkeypatch):
 
 def test_valid_files_no_rename(mock_compile):
     files = {
-        "test1.scss": MockFileInfo("contents1"),
+        "test1.scss": MockFileInfo(b"contents1"),
     }
 
     mock_compile.return_value = "parsedContents1"
@@ -34,8 +35,8 @@ def test_valid_files_no_rename(mock_compile):
 
 def test_valid_files_rename(mock_compile):
     files = {
-        "test1.scss": MockFileInfo("contents1"),
-        "test2.sass": MockFileInfo("contents2"),
+        "test1.scss": MockFileInfo(b"contents1"),
+        "test2.sass": MockFileInfo(b"contents2"),
     }
 
     mock_compile.side_effect = ("parsedContents1", "parsedContents2")
@@ -52,7 +53,7 @@ def test_valid_files_rename(mock_compile):
 
 def test_compile_args(mock_compile):
     files = {
-        "test1.scss": MockFileInfo("contents1"),
+        "test1.scss": MockFileInfo(b"contents1"),
     }
 
     mock_compile.return_value = "parsedContents1"
@@ -64,3 +65,36 @@ def test_compile_args(mock_compile):
     assert files == {
         "test1.css": MockFileInfo(b"parsedContents1"),
     }
+
+
+def test_cache(mock_compile, tmp_path):
+    mock_compile.return_value = "parsed"
+    sass = Sass()
+
+    for _ in range(2):
+        build_info = BuildInfo({
+            "plain.scss": MockFileInfo(b"a { b: c; }"),
+            "imports.scss": MockFileInfo(b"@import 'other';"),
+        })
+        build_info.cache = PluginCache(str(tmp_path))
+        sass.build(build_info)
+
+        assert build_info.files == {
+            "plain.css": MockFileInfo(b"parsed"),
+            "imports.css": MockFileInfo(b"parsed"),
+        }
+
+    mock_compile.assert_has_calls((
+        call(string="a { b: c; }"),
+        call(string="@import 'other';"),
+        call(string="@import 'other';"),
+    ))
+    assert mock_compile.call_count == 3
+
+
+def test_get_access():
+    access = Sass(output_extension=".min.css").get_access()
+
+    assert access.files[0].pattern == r".*\.(sass|scss)"
+    assert access.creates == ["*.min.css"]
+    assert not access.reads_metadata
@@ -1,10 +1,19 @@
+import os
 import sys
 import unittest.mock
 from unittest.mock import call
 
 import pytest
 
+try:
+    # The real module is kept for the tests using a real loader, since the module is mocked below.
+    import jinja2 as real_jinja2
+except ImportError:  # pragma: no cover
+    real_jinja2 = None
+
 from pysmith import BuildInfo
+from pysmith.contrib.core.collection import COLLECTIONS_KEY
+from pysmith.dependencies import ANY, COLLECTION, TEMPLATE, stat_inputs
 from tests.util import MockFileInfo, create_patch
 
 sys.modules["jinja2"] = unittest.mock.Mock()
@@ -22,6 +31,14 @@ sys.modules["jinja2"].runtime.Macro = MockMacro
 def mock_environment_constructor(monkeypatch):
     mock = create_patch(monkeypatch, "jinja2.Environment")
     mock.return_value.globals = {}
+    mock.return_value.loader.get_source.side_effect = lambda env, name: ("source", "/templates/" + name, None)
+    return mock
+
+
+@pytest.fixture
+def mock_find_referenced_templates(monkeypatch):
+    mock = create_patch(monkeypatch, "pysmith.contrib.web.template.meta.find_referenced_templates")
+    mock.return_value = []
     return mock
 
 
@@ -64,6 +81,26 @@ class TestBaseTemplate(object):
             "global2": macro2,
         }
 
+    def test_getstate_and_setstate(self, mock_environment_constructor):
+        template = LayoutTemplate(match_pattern="*.md", layout_selector="key", environment_args={"key": "value"})
+        state = template.__getstate__()
+
+        assert state == {
+            "match_pattern": "*.md",
+            "globals": None,
+            "global_include": None,
+            "environment_args": {"key": "value"},
+            "layout_selector": "key",
+            "output_extension": ".html",
+        }
+
+        restored = LayoutTemplate.__new__(LayoutTemplate)
+        restored.__setstate__(state)
+
+        assert restored._match_pattern == "*.md"
+        assert restored._output_extension == ".html"
+        assert mock_environment_constructor.call_count == 2
+
     def test_build_with_some_renames(self, mock_environment_constructor):
         mock_process_file = unittest.mock.Mock()
         mock_process_file.side_effect = [None, "renamed.md"]
@@ -92,10 +129,12 @@ class TestBaseTemplate(object):
 
 class TestContentTemplate(object):
 
-    def test_process_file(self, mock_environment_constructor):
+    def test_process_file(self, mock_environment_constructor, mock_find_referenced_templates):
+        mock_parse = mock_environment_constructor.return_value.parse
         mock_from_string = mock_environment_constructor.return_value.from_string
         mock_template = mock_from_string.return_value
         mock_template.render.return_value = "rendered"
+        mock_find_referenced_templates.side_effect = [["macros.html", None], []]
 
         build_info = BuildInfo()
         build_info.metadata["key"] = "value"
@@ -103,11 +142,13 @@ class TestContentTemplate(object):
         template = ContentTemplate()
         template.process_file(build_info, "name", file_info)
 
-        mock_from_string.assert_called_once_with("original")
+        mock_parse.assert_has_calls((call("original"), call("source")))
+        mock_from_string.assert_called_once_with(mock_parse.return_value)
         mock_template.render.assert_called_once_with(site={
             "key": "value",
         })
         assert file_info == MockFileInfo(b"rendered")
+        assert file_info.dependencies == {(TEMPLATE, "/templates/macros.html"), (TEMPLATE, ANY)}
 
 
 class TestLayoutTemplate(object):
@@ -122,7 +163,7 @@ class TestLayoutTemplate(object):
     def process_file_variants(self, request):
         return request.param
 
-    def test_process_file(self, mock_environment_constructor, process_file_variants):
+    def test_process_file(self, mock_environment_constructor, mock_find_referenced_templates, process_file_variants):
         output_extension, input_name, expected_output_name = process_file_variants
 
         file_info = MockFileInfo(b"contents", metadata={"layout": "test"})
@@ -140,6 +181,72 @@ class TestLayoutTemplate(object):
             contents="contents", page={"layout": "test"}, site={"key": "value"})
         assert output_name == expected_output_name
         assert file_info == MockFileInfo(b"rendered", metadata={"layout": "test"})
+        assert file_info.dependencies == {(TEMPLATE, "/templates/test")}
+
+    def test_process_file_dependencies(self, mock_environment_constructor, mock_find_referenced_templates):
+        mock_environment_constructor.return_value.get_template.return_value.module.__dict__ = {}
+        references = {"layout": ["base", "nav"], "base": ["nav"], "nav": [], "globals": []}
+        mock_environment_constructor.return_value.parse.side_effect = lambda source: source
+        mock_environment_constructor.return_value.loader.get_source.side_effect = \
+            lambda env, name: (name, "/templates/" + name, None)
+        mock_find_referenced_templates.side_effect = lambda source: references[source]
+
+        template = LayoutTemplate(global_include="globals")
+        file_info_1 = MockFileInfo(b"contents", metadata={"layout": "layout"})
+        file_info_2 = MockFileInfo(b"contents", metadata={"layout": "layout"})
+        template.process_file(BuildInfo(), "test1.html", file_info_1)
+        template.process_file(BuildInfo(), "test2.html", file_info_2)
+
+        expected = {(TEMPLATE, "/templates/" + name) for name in ("layout", "base", "nav", "globals")}
+        assert file_info_1.dependencies == expected
+        assert file_info_2.dependencies == expected
+        assert mock_find_referenced_templates.call_count == 4
+
+    def test_process_file_dependencies_outdated(self, mock_environment_constructor, mock_find_referenced_templates):
+        uptodate = unittest.mock.Mock(return_value=True)
+        mock_environment_constructor.return_value.loader.get_source.side_effect = None
+        mock_environment_constructor.return_value.loader.get_source.return_value = ("source", "/t/layout", uptodate)
+
+        template = LayoutTemplate()
+        template.process_file(BuildInfo(), "test.html", MockFileInfo(b"contents", metadata={"layout": "layout"}))
+        template.process_file(BuildInfo(), "test.html", MockFileInfo(b"contents", metadata={"layout": "layout"}))
+        assert mock_find_referenced_templates.call_count == 1
+
+        uptodate.return_value = False
+        template.process_file(BuildInfo(), "test.html", MockFileInfo(b"contents", metadata={"layout": "layout"}))
+        assert mock_find_referenced_templates.call_count == 2
+
+    @pytest.mark.skipif(real_jinja2 is None, reason="jinja2 is not installed")
+    def test_process_file_dependencies_relative_loader(self, mock_environment_constructor,
+                                                       mock_find_referenced_templates, tmp_path, monkeypatch):
+        (tmp_path / "layouts").mkdir()
+        (tmp_path / "layouts" / "page.html").write_text("{{ contents }}")
+        monkeypatch.chdir(tmp_path)
+        mock_environment_constructor.return_value.loader = real_jinja2.FileSystemLoader("layouts")
+
+        file_info = MockFileInfo(b"contents", metadata={"layout": "page.html"})
+        LayoutTemplate().process_file(BuildInfo(), "test.html", file_info)
+
+        path = os.path.join(os.getcwd(), "layouts", "page.html")
+        assert file_info.dependencies == {(TEMPLATE, path)}
+        assert list(stat_inputs(file_info.dependencies)) == [path]
+
+    def test_process_file_collections(self, mock_environment_constructor, mock_find_referenced_templates):
+        mock_template = mock_environment_constructor.return_value.get_template.return_value
+
+        def render(contents, page, site):
+            site[COLLECTIONS_KEY]["posts"]
+            return "rendered"
+
+        mock_template.render.side_effect = render
+
+        build_info = BuildInfo()
+        build_info.metadata[COLLECTIONS_KEY] = {"posts": []}
+        file_info = MockFileInfo(b"contents", metadata={"layout": "test"})
+        LayoutTemplate().process_file(build_info, "test.html", file_info)
+
+        assert (COLLECTION, "posts") in file_info.dependencies
+        assert build_info.metadata[COLLECTIONS_KEY] == {"posts": []}
 
     def test_exception_getting_layout(self, mock_environment_constructor):
         mock_get_template = mock_environment_constructor.return_value.get_template
@@ -151,3 +258,10 @@ class TestLayoutTemplate(object):
 
         assert output_name is None
         mock_get_template.assert_not_called()
+
+    def test_get_access(self, mock_environment_constructor):
+        access = LayoutTemplate(match_pattern="*.md", output_extension=".htm").get_access()
+
+        assert access.files == ["*.md"]
+        assert access.creates == ["*.htm"]
+        assert access.reads_metadata
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import pytest
+
+from pysmith import BuildInfo
+from pysmith.aio import CoroutineRunner, run_plugin_async
+from pysmith.plugin_util import AsyncFilePlugin
+from .util import MockFileInfo
+
+
+class SlowUpperPlugin(AsyncFilePlugin):
+
+    def __init__(self, match_pattern):
+        super().__init__(match_pattern)
+        self.running = 0
+        self.max_running = 0
+
+    async def process_file_async(self, build_info, file_name, file_info):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+
+        if file_info.contents == b"error":
+            raise ValueError("error")
+
+        file_info.contents = file_info.contents.upper()
+        return "renamed_" + file_name
+
+
+class MetadataPlugin(object):
+
+    async def build_async(self, build_info):
+        await asyncio.sleep(0)
+        build_info.metadata["thread"] = threading.get_ident()
+
+
+def create_build_info():
+    return BuildInfo(files={name: MockFileInfo(name.encode()) for name in ("a.md", "b.md", "c.txt", "d.md", "e.md")})
+
+
+def test_run_plugin_async_files():
+    build_info = create_build_info()
+    plugin = SlowUpperPlugin("*.md")
+
+    asyncio.run(run_plugin_async(plugin, build_info, 2))
+
+    assert plugin.max_running == 2
+    assert list(build_info.files) == ["c.txt", "renamed_a.md", "renamed_b.md", "renamed_d.md", "renamed_e.md"]
+    assert build_info.files["renamed_d.md"].contents == b"D.MD"
+
+
+def test_run_plugin_async_error():
+    build_info = create_build_info()
+    build_info.files["b.md"].contents = b"error"
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_plugin_async(SlowUpperPlugin("*.md"), build_info, 2))
+
+    assert "b.md" in build_info.files
+
+
+def test_run_plugin_async_build():
+    build_info = create_build_info()
+
+    asyncio.run(run_plugin_async(MetadataPlugin(), build_info))
+
+    assert build_info.metadata["thread"] == threading.get_ident()
+
+
+def test_runner_without_loop():
+    build_info = create_build_info()
+
+    CoroutineRunner(1).run(SlowUpperPlugin("*.txt"), build_info)
+
+    assert build_info.files["renamed_c.txt"].contents == b"C.TXT"
+
+
+def test_runner_with_loop():
+    build_info = create_build_info()
+
+    async def run():
+        runner = CoroutineRunner(loop=asyncio.get_running_loop())
+        await asyncio.get_running_loop().run_in_executor(None, runner.run, MetadataPlugin(), build_info)
+        return threading.get_ident()
+
+    assert asyncio.run(run()) == build_info.metadata["thread"]
+
+
+def test_runner_invalid_concurrency():
+    with pytest.raises(ValueError):
+        CoroutineRunner(0)
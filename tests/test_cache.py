@@ -0,0 +1,127 @@
+import os
+import pickle
+import unittest.mock
+
+from pysmith import FileInfo
+from pysmith.cache import NullCache, PluginCache
+
+
+class Plugin(object):
+
+    def __init__(self, option):
+        self.option = option
+
+
+def create_file_info(contents):
+    return FileInfo("name", "path", None, contents)
+
+
+def get_entries(path):
+    return sorted(
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(str(path))
+        for name in names
+    )
+
+
+def test_get_or_compute(tmp_path):
+    cache = PluginCache(str(tmp_path))
+    compute = unittest.mock.Mock(return_value={"value": 1})
+
+    assert cache.get_or_compute(Plugin(1), create_file_info(b"contents"), compute) == {"value": 1}
+    assert cache.get_or_compute(Plugin(1), create_file_info(b"contents"), compute) == {"value": 1}
+    assert compute.call_count == 1
+    assert len(get_entries(tmp_path)) == 1
+
+
+def test_get_or_compute_key(tmp_path):
+    cache = PluginCache(str(tmp_path))
+    plugin = Plugin(1)
+    cache.get_or_compute(plugin, create_file_info(b"contents"), lambda: 0)
+
+    compute = unittest.mock.Mock(return_value=1)
+    cache.get_or_compute(plugin, create_file_info(b"other"), compute)
+    cache.get_or_compute(Plugin(2), create_file_info(b"contents"), compute)
+    cache.get_or_compute(plugin, create_file_info(b"contents"), compute, "input")
+    cache.get_or_compute(plugin, create_file_info(b"contents"), compute, b"input", "")
+
+    assert compute.call_count == 4
+    assert len(get_entries(tmp_path)) == 5
+
+
+def test_get_or_compute_does_not_cache_errors(tmp_path):
+    cache = PluginCache(str(tmp_path))
+
+    def compute():
+        raise ValueError("error")
+
+    for _ in range(2):
+        try:
+            cache.get_or_compute(Plugin(1), create_file_info(b"contents"), compute)
+        except ValueError:
+            pass
+
+    assert get_entries(tmp_path) == []
+
+
+def test_get_or_compute_corrupt_entry(tmp_path):
+    cache = PluginCache(str(tmp_path))
+    cache.get_or_compute(Plugin(1), create_file_info(b"contents"), lambda: 1)
+    [entry] = get_entries(tmp_path)
+    with open(entry, "wb") as f:
+        f.write(b"corrupt")
+
+    assert cache.get_or_compute(Plugin(1), create_file_info(b"contents"), lambda: 2) == 2
+    assert cache.get_or_compute(Plugin(1), create_file_info(b"contents"), lambda: 3) == 2
+
+
+def test_prune(tmp_path):
+    cache = PluginCache(str(tmp_path), max_size=2500)
+    file_info = create_file_info(b"contents")
+    plugins = [Plugin(i) for i in range(3)]
+    paths = [cache._get_entry_path(cache._get_key(plugin, file_info, ())) for plugin in plugins]
+    for i, plugin in enumerate(plugins):
+        cache.get_or_compute(plugin, file_info, lambda: b"x" * 1000)
+        os.utime(paths[i], ns=(i * 10 ** 9, i * 10 ** 9))
+
+    # A hit marks the oldest entry as the most recently used.
+    cache.get_or_compute(plugins[0], file_info, lambda: None)
+
+    assert cache.prune() == 1
+    assert get_entries(tmp_path) == sorted((paths[0], paths[2]))
+    assert cache.prune() == 0
+
+
+def test_prune_missing_directory(tmp_path):
+    assert PluginCache(str(tmp_path / "missing"), max_size=0).prune() == 0
+
+
+def test_clear(tmp_path):
+    cache = PluginCache(str(tmp_path / "cache"))
+    cache.get_or_compute(Plugin(1), create_file_info(b"contents"), lambda: 1)
+
+    cache.clear()
+    cache.clear()
+
+    assert not (tmp_path / "cache").exists()
+
+
+def test_pickle(tmp_path):
+    cache = PluginCache(str(tmp_path), max_size=10)
+    cache.get_or_compute(Plugin(1), create_file_info(b"contents"), lambda: 1)
+
+    copy = pickle.loads(pickle.dumps(cache))
+
+    assert copy._max_size == 10
+    assert copy.get_or_compute(Plugin(1), create_file_info(b"contents"), lambda: 2) == 1
+
+
+def test_null_cache():
+    cache = NullCache()
+    compute = unittest.mock.Mock(return_value=1)
+
+    assert cache.get_or_compute(Plugin(1), None, compute) == 1
+    assert cache.get_or_compute(Plugin(1), None, compute) == 1
+    assert compute.call_count == 2
+    assert cache.prune() == 0
+    cache.clear()
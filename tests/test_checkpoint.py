@@ -0,0 +1,88 @@
+import os
+
+from pysmith import FileInfo
+from pysmith.checkpoint import get_checkpoint_key, get_sources_digest, load_checkpoint, save_checkpoint
+from pysmith.dependencies import SOURCE, TEMPLATE, DependencyGraph
+
+from .util import create_file_info
+
+
+def test_get_sources_digest(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"a")
+    digest = get_sources_digest({"a.md": create_file_info(str(path))})
+
+    assert get_sources_digest({"a.md": create_file_info(str(path))}) == digest
+    assert get_sources_digest({"b.md": create_file_info(str(path))}) != digest
+
+    os.utime(str(path), ns=(0, 0))
+    assert get_sources_digest({"a.md": create_file_info(str(path))}) != digest
+
+
+def test_get_checkpoint_key():
+    key = get_checkpoint_key(["f1", "f2"], "sources")
+
+    assert get_checkpoint_key(["f1", "f2"], "sources") == key
+    assert get_checkpoint_key(["f1", "f3"], "sources") != key
+    assert get_checkpoint_key(["f1", "f2"], "other") != key
+
+
+def test_save_and_load(tmp_path):
+    src = tmp_path / "a.md"
+    src.write_bytes(b"source")
+    modified = create_file_info(str(src), b"modified")
+    modified.add_dependency(SOURCE, "a.md")
+    unmodified = create_file_info(str(src))
+    metadata = {"collections": {"all": [modified, unmodified]}}
+    dependencies = DependencyGraph()
+    dependencies.add_collection("all", [(SOURCE, "a.md")])
+    path = str(tmp_path / "checkpoints" / "00-Plugin.checkpoint")
+
+    size = save_checkpoint(path, "key", [("a.html", modified), ("b.md", unmodified)], metadata, dependencies)
+    assert size == os.path.getsize(path)
+
+    files, loaded_metadata, loaded_dependencies = load_checkpoint(path, "key")
+    assert [file_name for file_name, _ in files] == ["a.html", "b.md"]
+    assert files[0][1].contents == b"modified"
+    assert files[0][1].dependencies == {(SOURCE, "a.md")}
+    assert files[1][1].contents == b"source"
+    assert not files[1][1].modified
+    assert loaded_metadata["collections"]["all"][0] is files[0][1]
+    assert loaded_dependencies.to_dict() == dependencies.to_dict()
+    assert os.listdir(str(tmp_path / "checkpoints")) == ["00-Plugin.checkpoint"]
+
+
+def test_load_other_key(tmp_path):
+    path = str(tmp_path / "checkpoint")
+    save_checkpoint(path, "key", [], {}, DependencyGraph())
+
+    assert load_checkpoint(path, "other") is None
+
+
+def test_load_missing_or_invalid(tmp_path):
+    path = tmp_path / "checkpoint"
+    assert load_checkpoint(str(path), "key") is None
+
+    path.write_bytes(b"invalid")
+    assert load_checkpoint(str(path), "key") is None
+
+
+def test_load_changed_input(tmp_path):
+    template = tmp_path / "layout.html"
+    template.write_bytes(b"layout")
+    file_info = FileInfo("a.md", "a.md", None, b"contents")
+    file_info.add_dependency(TEMPLATE, str(template))
+    path = str(tmp_path / "checkpoint")
+    save_checkpoint(path, "key", [("a.html", file_info)], {}, DependencyGraph())
+
+    assert load_checkpoint(path, "key") is not None
+
+    template.write_bytes(b"changed layout")
+    assert load_checkpoint(path, "key") is None
+
+
+def test_save_unpicklable_metadata(tmp_path):
+    path = tmp_path / "checkpoint"
+
+    assert save_checkpoint(str(path), "key", [], {"selector": lambda f: f}, DependencyGraph()) is None
+    assert not path.exists()
@@ -0,0 +1,60 @@
+import pytest
+
+from pysmith.dependencies import ANY, COLLECTION, SOURCE, TEMPLATE, DependencyGraph
+
+
+@pytest.fixture
+def graph():
+    graph = DependencyGraph()
+    graph.add_collection("posts", [(SOURCE, "post1.md"), (TEMPLATE, "/t/post.html")])
+    graph.add_collection("posts", [(SOURCE, "post2.md")])
+    graph.add_collection("pages", [(SOURCE, "about.md")])
+    graph.add_output("post1.html", [(SOURCE, "post1.md"), (TEMPLATE, "/t/post.html")])
+    graph.add_output("post2.html", [(SOURCE, "post2.md"), (TEMPLATE, "/t/post.html")])
+    graph.add_output("index.html", [(SOURCE, "index.md"), (COLLECTION, "posts")])
+    graph.add_output("sitemap.html", [(SOURCE, "sitemap.md"), (COLLECTION, ANY)])
+    graph.add_output("dynamic.html", [(SOURCE, "dynamic.md"), (TEMPLATE, ANY)])
+    return graph
+
+
+def test_outputs_and_inputs(graph):
+    assert sorted(graph.outputs) == ["dynamic.html", "index.html", "post1.html", "post2.html", "sitemap.html"]
+    assert (SOURCE, "about.md") in graph.inputs
+    assert (COLLECTION, "posts") in graph.inputs
+
+
+def test_get_inputs(graph):
+    assert graph.get_inputs("index.html") == {
+        (SOURCE, "index.md"), (COLLECTION, "posts"), (SOURCE, "post1.md"), (SOURCE, "post2.md"),
+        (TEMPLATE, "/t/post.html"),
+    }
+    assert (SOURCE, "about.md") in graph.get_inputs("sitemap.html")
+
+    with pytest.raises(KeyError):
+        graph.get_inputs("missing.html")
+
+
+@pytest.mark.parametrize("inputs,expected", (
+    ([(SOURCE, "post1.md")], {"post1.html", "index.html", "sitemap.html"}),
+    ([(SOURCE, "about.md")], {"sitemap.html"}),
+    ([(SOURCE, "index.md")], {"index.html"}),
+    ([(TEMPLATE, "/t/post.html")], {"post1.html", "post2.html", "index.html", "sitemap.html", "dynamic.html"}),
+    ([(TEMPLATE, "/t/other.html")], {"dynamic.html"}),
+    ([], set()),
+), ids=("post", "page", "single", "template", "unknown_template", "none"))
+def test_affected_outputs(graph, inputs, expected):
+    assert graph.affected_outputs(inputs) == expected
+
+
+def test_affected_outputs_added_sources(graph):
+    assert graph.affected_outputs([], added_sources=["post3.md"]) == {"index.html", "sitemap.html"}
+
+
+def test_to_dict_and_from_dict(graph):
+    data = graph.to_dict()
+    restored = DependencyGraph.from_dict(data)
+
+    assert restored.to_dict() == data
+    assert data["outputs"]["index.html"] == [[COLLECTION, "posts"], [SOURCE, "index.md"]]
+    for output_name in graph.outputs:
+        assert restored.get_inputs(output_name) == graph.get_inputs(output_name)
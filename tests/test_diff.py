@@ -0,0 +1,87 @@
+import concurrent.futures
+import os
+
+from pysmith import FileInfo
+from pysmith.diff import ADDED, MODIFIED, REMOVED, OutputChange, OutputDiff, compare_output, diff_outputs
+from pysmith.util import content_digest
+from pysmith.writer import UNCHANGED
+
+
+def create_dest(tmp_path, files):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    for file_name, contents in files.items():
+        path = dest.joinpath(file_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(contents)
+
+    return dest
+
+
+def test_compare_output(tmp_path):
+    dest = create_dest(tmp_path, {"same.html": b"same", "size.html": b"size", "contents.html": b"contents"})
+
+    def compare(file_name, contents):
+        change = compare_output(str(dest), file_name, FileInfo(file_name, file_name, None, contents))
+        return change.status, change.old_size, change.new_size
+
+    assert compare("same.html", b"same") == (UNCHANGED, 4, 4)
+    assert compare("size.html", b"larger") == (MODIFIED, 4, 6)
+    assert compare("contents.html", b"CONTENTS") == (MODIFIED, 8, 8)
+    assert compare("new.html", b"new") == (ADDED, None, 3)
+
+
+def test_compare_output_previous_state(tmp_path, monkeypatch):
+    dest = create_dest(tmp_path, {"a.html": b"a"})
+    stats = os.stat(str(dest / "a.html"))
+    file_info = FileInfo("a.html", "a.html", None, b"b")
+    monkeypatch.setattr("pysmith.diff.file_digest", None)
+
+    # The recorded state is trusted as long as the size and modification time match.
+    previous = {"digest": content_digest(b"b"), "size": stats.st_size, "mtime": stats.st_mtime_ns}
+    assert compare_output(str(dest), "a.html", file_info, previous).status == UNCHANGED
+
+
+def test_compare_output_same_file(tmp_path, monkeypatch):
+    dest = create_dest(tmp_path, {"a.html": b"a"})
+    path = str(dest / "a.html")
+    monkeypatch.setattr("pysmith.diff.file_digest", None)
+
+    assert compare_output(str(dest), "a.html", FileInfo("a.html", path, os.stat(path))).status == UNCHANGED
+
+
+def test_diff_outputs(tmp_path):
+    dest = create_dest(tmp_path, {"a.html": b"a", os.path.join("old", "b.html"): b"bb"})
+    files = {"a.html": FileInfo("a.html", "a.html", None, b"A"), "c.html": FileInfo("c.html", "c.html", None, b"c")}
+
+    diff = diff_outputs(str(dest), files)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        assert diff_outputs(str(dest), files, executor=executor).to_dict() == diff.to_dict()
+
+    assert diff.added == ["c.html"]
+    assert diff.modified == ["a.html"]
+    assert diff.removed == [os.path.join("old", "b.html")]
+    assert diff.unchanged == []
+    assert diff.size_delta == -1
+    assert diff
+
+
+def test_diff_outputs_missing_destination(tmp_path):
+    diff = diff_outputs(str(tmp_path / "dest"), {"a.html": FileInfo("a.html", "a.html", None, b"a")})
+
+    assert diff.added == ["a.html"]
+
+
+def test_output_diff():
+    diff = OutputDiff([
+        OutputChange("b.html", UNCHANGED, 2, 2),
+        OutputChange("a.html", REMOVED, 5, None),
+    ])
+
+    assert [change.file_name for change in diff.changes] == ["a.html", "b.html"]
+    assert diff.changes[0].size_delta == -5
+    assert diff.size_delta == -5
+    assert diff
+    assert not OutputDiff([OutputChange("b.html", UNCHANGED, 2, 2)])
+    assert diff.to_dict()["changes"][1] == {
+        "file_name": "b.html", "status": "unchanged", "old_size": 2, "new_size": 2, "size_delta": 0}
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from pysmith import BuildInfo, FileInfo
+from pysmith.contrib.core.collection import Collection
+from pysmith.fusion import is_fusable, process_file_chain, run_file_chain, split_stages
+from pysmith.plugin_util import AsyncFilePlugin, FilePlugin
+
+from .util import UnpicklablePlugin, UpperPlugin, create_build_info
+
+
+class RenamePlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        if file_name.startswith("rename"):
+            return os.path.splitext(file_name)[0] + ".html"
+
+        return None
+
+
+class WrapPlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = b"<" + file_info.contents + b">"
+
+
+class BarrierPlugin(WrapPlugin):
+
+    barrier = True
+
+
+def create_plugins(upper_type=UpperPlugin):
+    return [upper_type("*.md"), RenamePlugin("*.md"), WrapPlugin("*.html")]
+
+
+def test_is_fusable():
+    assert is_fusable(UpperPlugin("*"))
+    assert not is_fusable(BarrierPlugin("*"))
+    assert not is_fusable(Collection(collection_name="c", match_pattern="*", order_by="key"))
+    assert not is_fusable(AsyncFilePlugin("*"))
+
+    barrier = UpperPlugin("*")
+    barrier.barrier = True
+    assert not is_fusable(barrier)
+
+
+def test_split_stages():
+    upper, rename, wrap, barrier = UpperPlugin("*"), RenamePlugin("*"), WrapPlugin("*"), BarrierPlugin("*")
+    collection = Collection(collection_name="c", match_pattern="*", order_by="key")
+
+    assert split_stages([upper, rename, collection, wrap, barrier, upper, rename]) == [
+        (0, [upper, rename], True),
+        (2, [collection], False),
+        (3, [wrap], True),
+        (4, [barrier], False),
+        (5, [upper, rename], True),
+    ]
+    assert split_stages([]) == []
+
+
+def test_process_file_chain():
+    build_info = create_build_info(0)
+    file_info = FileInfo("name", "path", None, b"a")
+
+    assert process_file_chain(create_plugins(), build_info, "rename.md", file_info) == "renamed_rename.html"
+    assert file_info.contents == b"<A!>"
+
+    file_info = FileInfo("name", "path", None, b"a")
+    assert process_file_chain(create_plugins(), build_info, "file.md", file_info) == "file.md"
+    assert file_info.contents == b"A!"
+
+
+@pytest.mark.parametrize("parallel", (False, True), ids=("sequential", "parallel"))
+@pytest.mark.parametrize("upper_type", (UpperPlugin, UnpicklablePlugin))
+def test_run_file_chain(executor, parallel, upper_type):
+    build_info = create_build_info(200)
+    expected = create_build_info(200)
+    for plugin in create_plugins():
+        plugin.build(expected)
+
+    done = []
+    file_infos = set(map(id, build_info.files.values()))
+    cpu_time = run_file_chain(create_plugins(upper_type), build_info, lambda *args: done.append(args),
+                              executor if parallel else None, 2)
+
+    assert sorted(build_info.files) == sorted(expected.files)
+    for file_name, file_info in build_info.files.items():
+        assert file_info.contents == expected.files[file_name].contents
+
+    assert set(map(id, build_info.files.values())) == file_infos
+    assert sorted(done, key=lambda args: args[0]) == sorted(build_info.files.items())
+    assert cpu_time >= 0
+
+    in_workers = parallel and upper_type is UpperPlugin
+    assert (build_info.files["file1.md"].metadata["pid"] != os.getpid()) == in_workers
+
+
+def test_run_file_chain_few_files(executor):
+    build_info = create_build_info(20)
+    assert run_file_chain(create_plugins(), build_info, None, executor, 2) == 0.0
+
+    assert build_info.files["renamed_rename0.html"].contents == b"<C0!>"
+    assert build_info.files["file1.md"].metadata["pid"] == os.getpid()
+
+
+def test_run_file_chain_no_files(executor):
+    build_info = BuildInfo()
+    assert run_file_chain(create_plugins(), build_info, None, executor, 2) == 0.0
+    assert build_info.files == {}
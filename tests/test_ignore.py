@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from pysmith.ignore import IgnoreRules
+
+
+@pytest.mark.parametrize("patterns,file_name,is_dir,expected", (
+    (["*.swp"], "notes.swp", False, True),
+    (["*.swp"], "dir/notes.swp", False, True),
+    (["*.swp"], "notes.swp.txt", False, False),
+    (["cache/"], "cache", True, True),
+    (["cache/"], "cache", False, False),
+    (["cache/"], "dir/cache", True, True),
+    (["/drafts"], "drafts", True, True),
+    (["/drafts"], "dir/drafts", True, False),
+    (["assets/vendor"], "assets/vendor", True, True),
+    (["assets/vendor"], "dir/assets/vendor", True, False),
+    (["**/tmp"], "tmp", True, True),
+    (["**/tmp"], "a/b/tmp", True, True),
+    (["docs/**/*.bak"], "docs/a.bak", False, True),
+    (["docs/**/*.bak"], "docs/a/b/c.bak", False, True),
+    (["docs/**/*.bak"], "other/a.bak", False, False),
+    (["build/**"], "build/a/b", False, True),
+    (["build/**"], "build", True, False),
+    (["a*b"], "a/b", False, False),
+    (["file?.txt"], "file1.txt", False, True),
+    (["file[0-9].txt"], "filea.txt", False, False),
+    (["file[!0-9].txt"], "filea.txt", False, True),
+    (["*.log", "!keep.log"], "keep.log", False, False),
+    (["*.log", "!keep.log"], "other.log", False, True),
+    (["!keep.log", "*.log"], "keep.log", False, True),
+    (["\\!important"], "!important", False, True),
+    (["\\#hash"], "#hash", False, True),
+    (["# comment", "", "   "], "# comment", False, False),
+))
+def test_is_ignored(patterns, file_name, is_dir, expected):
+    rules = IgnoreRules(patterns)
+
+    assert rules.is_ignored(os.path.join(*file_name.split("/")), is_dir) == expected
+
+
+def test_is_ignored_parent_directory():
+    rules = IgnoreRules(["node_modules/", "!*.js"])
+
+    assert rules.is_ignored(os.path.join("node_modules", "pkg", "index.js"))
+    assert not rules.is_ignored(os.path.join("src", "index.js"))
+
+
+def test_matches():
+    rules = IgnoreRules(["node_modules/", "!*.js"])
+
+    assert rules.matches("node_modules", True)
+    assert not rules.matches("node_modules")
+    assert not rules.matches(os.path.join("node_modules", "pkg", "index.js"))
+    assert not rules.matches(os.path.join("node_modules", "pkg"), True)
+
+
+def test_ignore_file(tmp_path):
+    ignore_file = tmp_path / ".pysmithignore"
+    ignore_file.write_text("# Editor files\n*.swp\n!keep.swp\n")
+    rules = IgnoreRules(["*.tmp", "keep.swp"], ignore_file=str(ignore_file))
+
+    assert rules.is_ignored("a.tmp")
+    assert rules.is_ignored("a.swp")
+    assert not rules.is_ignored("keep.swp")
+
+
+def test_missing_ignore_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        IgnoreRules(ignore_file=str(tmp_path / "missing"))
+
+
+def test_bool():
+    assert not IgnoreRules()
+    assert not IgnoreRules(["# comment"])
+    assert IgnoreRules(["*.swp"])
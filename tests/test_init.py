@@ -1,11 +1,27 @@
+import asyncio
+import json
+import mmap
 import os
+import pickle
 import re
+import socket
+import threading
+import time
 import unittest.mock
+import urllib.error
+import urllib.request
 from unittest.mock import call
 
 import pytest
 
 from pysmith import BuildInfo, FileInfo, Pysmith
+from pysmith.cache import NullCache
+from pysmith.contrib.core.collection import Collection
+from pysmith.dependencies import SOURCE, TEMPLATE
+from pysmith.plugin_util import Access, AsyncFilePlugin, FilePlugin
+from pysmith.store import FileStore
+from pysmith.util import content_digest, scantree
+from pysmith.writer import UNCHANGED
 from .util import MockFileInfo, create_patch
 
 
@@ -24,26 +40,101 @@ def mock_file_info_from_entry(monkeypatch):
     return create_patch(monkeypatch, "pysmith.FileInfo._from_entry")
 
 
-@pytest.fixture
-def mock_exists(monkeypatch):
-    return create_patch(monkeypatch, "os.path.exists")
+class UpperPlugin(object):
 
+    def __init__(self, match_pattern="*"):
+        self.match_pattern = match_pattern
+        self.calls = 0
 
-@pytest.fixture
-def mock_makedirs(monkeypatch):
-    return create_patch(monkeypatch, "os.makedirs")
+    def build(self, build_info):
+        self.calls += 1
+        for _, file_info in build_info.get_files_by_pattern(self.match_pattern):
+            file_info.contents = file_info.contents.upper()
 
 
-@pytest.fixture
-def mock_isdir(monkeypatch):
-    return create_patch(monkeypatch, "os.path.isdir")
+class UpperFilePlugin(FilePlugin):
 
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = file_info.contents.upper()
 
-@pytest.fixture
-def mock_open(monkeypatch):
-    mock = unittest.mock.mock_open()
-    monkeypatch.patch("__builtin__.open", mock)
-    return mock
+
+class CachedUpperFilePlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = build_info.cache.get_or_compute(self, file_info, lambda: file_info.contents.upper())
+
+
+class CountingFilePlugin(FilePlugin):
+
+    def __init__(self, match_pattern):
+        super().__init__(match_pattern)
+        self.processed = []
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = build_info.cache.get_or_compute(
+            self, file_info, lambda: self._process(file_name, file_info))
+
+    def _process(self, file_name, file_info):
+        if file_info.contents == b"error":
+            raise ValueError("error")
+
+        self.processed.append(file_name)
+        return file_info.contents.upper()
+
+
+class RenameFilePlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = file_info.contents * 2
+        return "renamed_" + file_name
+
+
+class AsyncRenameFilePlugin(AsyncFilePlugin):
+
+    async def process_file_async(self, build_info, file_name, file_info):
+        await asyncio.sleep(0)
+        file_info.contents = file_info.contents * 2
+        return "renamed_" + file_name
+
+
+class AsyncMetadataPlugin(object):
+
+    async def build_async(self, build_info):
+        await asyncio.sleep(0)
+        build_info.metadata["files"] = sorted(build_info.files)
+
+
+class TemplateFilePlugin(object):
+
+    def __init__(self, template):
+        self.template = template
+        self.calls = 0
+
+    def build(self, build_info):
+        self.calls += 1
+        with open(self.template, "rb") as f:
+            template = f.read()
+
+        for _, file_info in build_info.files.items():
+            file_info.contents = template + file_info.contents
+            file_info.add_dependency(TEMPLATE, self.template)
+
+
+class DeclaredFilePlugin(FilePlugin):
+
+    def __init__(self, match_pattern, barrier=None):
+        super().__init__(match_pattern)
+        self._barrier = barrier
+
+    def get_access(self):
+        return Access(files=[self._match_pattern])
+
+    def process_file(self, build_info, file_name, file_info):
+        # Both declared plugins must be running at the same time to get past the barrier.
+        if self._barrier is not None:
+            self._barrier.wait()
+        file_info.contents = file_info.contents.upper()
+        file_info.metadata["thread"] = threading.get_ident()
 
 
 class TestBuildInfo(object):
@@ -62,6 +153,18 @@ class TestBuildInfo(object):
             ("file2.css", "file2"),
         ]
 
+    def test_get_files_by_pattern_after_rename(self):
+        build_info = BuildInfo(files={
+            "file1.md": "file1",
+            "file2.md": "file2",
+            "file3.md": "file3",
+        })
+
+        build_info.rename_file("file1.md", "file1.html")
+
+        assert list(build_info.get_files_by_pattern("*.html")) == [("file1.html", "file1")]
+        assert list(build_info.get_files_by_pattern("*.md")) == [("file2.md", "file2"), ("file3.md", "file3")]
+
     def test_get_files_by_regex(self):
         build_info = BuildInfo(files={
             "file1.html": "file1",
@@ -75,6 +178,18 @@ class TestBuildInfo(object):
             ("file3.js", "file3"),
         ]
 
+    def test_get_files_by_regex_while_renaming(self):
+        build_info = BuildInfo(files={
+            "file1.md": "file1",
+            "file2.md": "file2",
+        })
+
+        regex = re.compile(r"\.md$")
+        for file_name, _ in build_info.get_files_by_regex(regex):
+            build_info.rename_file(file_name, file_name + ".md")
+
+        assert list(build_info.files) == ["file1.md.md", "file2.md.md"]
+
     def test_rename_file_invalid_name(self):
         build_info = BuildInfo(files={
             "file1.txt": "contents",
@@ -111,7 +226,6 @@ class TestFileInfo(object):
 
     def test_from_entry(self):
         mock_open = unittest.mock.mock_open()
-        mock_open.return_value.read.return_value = b"contents"
         entry = unittest.mock.Mock()
         entry.name = "name"
         entry.path = "path"
@@ -124,7 +238,196 @@ class TestFileInfo(object):
         assert info.path == "path"
         assert info.stats == "stats"
         assert info.metadata == {}
+        assert info._contents is None
+        mock_open.assert_not_called()
+
+    def test_contents_loaded_lazily(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(b"contents")
+        info = FileInfo("file", str(path), path.stat())
+
+        assert info.contents == b"contents"
+        path.write_bytes(b"changed")
+        assert info.contents == b"contents"
+
+    def test_get_buffer_small_file(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(b"contents")
+        info = FileInfo("file", str(path), path.stat())
+
+        assert info.get_buffer() == b"contents"
         assert info._contents == b"contents"
+        assert info._mmap is None
+
+    def test_get_buffer_large_file(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("pysmith.MMAP_THRESHOLD", 4)
+        path = tmp_path / "file"
+        path.write_bytes(b"contents")
+        info = FileInfo("file", str(path), path.stat())
+
+        buffer = info.get_buffer()
+
+        assert isinstance(buffer, mmap.mmap)
+        assert buffer[:] == b"contents"
+        assert info._contents is None
+        assert info.get_buffer() is buffer
+
+        info.contents = b"new contents"
+        assert info.get_buffer() == b"new contents"
+        assert info._mmap is None
+
+    def test_get_buffer_loaded_contents(self):
+        info = FileInfo("name", "path", "stats", b"contents")
+        assert info.get_buffer() == b"contents"
+
+    def test_modified(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(b"contents")
+
+        assert FileInfo("name", "path", "stats", b"contents").modified
+
+        info = FileInfo("file", str(path), path.stat())
+        assert info.contents == b"contents"
+        assert not info.modified
+
+        info.contents = b"contents"
+        assert info.modified
+
+    def test_digest(self, tmp_path, monkeypatch):
+        path = tmp_path / "file"
+        path.write_bytes(b"contents")
+        info = FileInfo("file", str(path), path.stat())
+        info.contents
+        mock_content_digest = create_patch(monkeypatch, "pysmith.content_digest")
+        mock_content_digest.side_effect = content_digest
+
+        assert info.digest == content_digest(b"contents")
+        assert info.digest == content_digest(b"contents")
+        assert mock_content_digest.call_count == 1
+
+        info.contents = b"modified"
+        assert info.digest == content_digest(b"modified")
+        assert mock_content_digest.call_count == 2
+
+    def test_digest_unloaded_file(self, tmp_path, monkeypatch):
+        path = tmp_path / "file"
+        path.write_bytes(b"x" * 2 * 1024 * 1024)
+        info = FileInfo("file", str(path), path.stat())
+        mock_mmap = create_patch(monkeypatch, "mmap.mmap")
+
+        assert info.digest == content_digest(b"x" * 2 * 1024 * 1024)
+        assert info._contents is None
+        assert info._mmap is None
+        mock_mmap.assert_not_called()
+
+    def test_text(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes("contents \u00e9".encode())
+        info = FileInfo("file", str(path), path.stat())
+
+        assert info.text == "contents \u00e9"
+        assert info.text is info.text
+        assert not info.modified
+
+        info.text = "new \u00e9"
+        assert info.modified
+        assert info._contents is None
+        assert info.size == 6
+        assert info.contents == "new \u00e9".encode()
+        assert info.get_buffer() is info.contents
+
+        info.contents = b"bytes"
+        assert info._text is None
+        assert info.text == "bytes"
+
+    def test_text_not_encoded(self):
+        info = FileInfo("name", "path", None, b"contents")
+        info.text = "ascii"
+
+        assert info.size == 5
+        assert info._contents is None
+
+        with pytest.raises(ValueError):
+            info.text = b"bytes"
+
+    def test_pickle_text(self):
+        info = FileInfo("name", "path", None)
+        info.text = "text"
+
+        restored = pickle.loads(pickle.dumps(info))
+        assert restored.modified
+        assert restored._contents is None
+        assert restored.text == "text"
+
+        other = FileInfo("name", "path", None, b"contents")
+        other._update_from(restored)
+        assert other.contents == b"text"
+
+    def test_pickle(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(b"contents")
+        info = FileInfo("file", str(path), path.stat())
+        info.metadata["key"] = "value"
+        info.add_dependency(SOURCE, "file")
+        info.digest
+
+        unmodified = pickle.loads(pickle.dumps(info))
+        info.contents = b"modified"
+        modified = pickle.loads(pickle.dumps(info))
+
+        assert (unmodified.name, unmodified.path, unmodified.stats) == ("file", str(path), path.stat())
+        assert unmodified.metadata == {"key": "value"}
+        assert unmodified._contents is None
+        assert not unmodified.modified
+        assert unmodified.contents == b"contents"
+        assert modified.contents == b"modified"
+        assert modified.modified
+        assert modified.dependencies == {(SOURCE, "file")}
+        assert unmodified._digest == content_digest(b"contents")
+        assert modified._digest is None
+
+    def test_update_from(self):
+        info = FileInfo("name", "path", "stats")
+        other = FileInfo("name", "path", "stats", b"contents")
+        other.metadata["key"] = "value"
+        other.add_dependency(TEMPLATE, "template")
+
+        info._update_from(other)
+
+        assert info.contents == b"contents"
+        assert info.modified
+        assert info.metadata == {"key": "value"}
+        assert info.dependencies == {(TEMPLATE, "template")}
+        assert info.digest == content_digest(b"contents")
+
+        unmodified = FileInfo("name", "path", "stats")
+        other = FileInfo("name", "path", "stats")
+        other._digest = "digest"
+        unmodified._update_from(other)
+        assert unmodified.digest == "digest"
+
+    def test_release(self, tmp_path):
+        src = tmp_path / "src"
+        src.write_bytes(b"source")
+        output = tmp_path / "output"
+        output.write_bytes(b"modified")
+
+        unmodified = FileInfo("src", str(src), src.stat())
+        unmodified.contents
+        unmodified._release(str(output))
+
+        assert unmodified._contents is None
+        assert unmodified.path == str(src)
+        assert unmodified.contents == b"source"
+
+        modified = FileInfo("src", str(src), src.stat(), b"modified")
+        modified._release(str(output))
+
+        assert modified._contents is None
+        assert not modified.modified
+        assert modified.path == str(output)
+        assert modified.size == 8
+        assert modified.contents == b"modified"
 
     def test_contents_setter_non_bytes_passed(self):
         info = FileInfo("name", "path", "stats", b"contents")
@@ -146,6 +449,14 @@ class TestPysmith(object):
         assert pysmith._dest == "dest"
         assert pysmith._plugins == []
 
+    def test_constructor_invalid_link_mode(self):
+        with pytest.raises(ValueError):
+            Pysmith(src="src", dest="dest", link_mode="symlink")
+
+    def test_use_checkpoint_without_directory(self):
+        with pytest.raises(ValueError):
+            Pysmith(src="src", dest="dest").use(UpperPlugin(), checkpoint=True)
+
     def test_use(self):
         pysmith = Pysmith(src="src", dest="dest")
         mock_plugin = unittest.mock.Mock()
@@ -154,6 +465,13 @@ class TestPysmith(object):
 
         assert pysmith._plugins == [mock_plugin]
 
+    def test_use_async_plugin(self):
+        pysmith = Pysmith(src="src", dest="dest")
+        plugin = AsyncMetadataPlugin()
+
+        assert pysmith.use(plugin) is pysmith
+        assert pysmith._plugins == [plugin]
+
     def test_use_build_not_callable(self):
         pysmith = Pysmith(src="src", dest="dest")
         mock_plugin = unittest.mock.Mock()
@@ -170,20 +488,24 @@ class TestPysmith(object):
         mock_rmtree.assert_called_once_with(pysmith._dest, onerror=pysmith._handle_clean_error)
 
     def test_build(self, monkeypatch):
-        mock_plugin1 = unittest.mock.Mock()
-        mock_plugin2 = unittest.mock.Mock()
+        mock_plugin1 = unittest.mock.Mock(spec=["build"])
+        mock_plugin2 = unittest.mock.Mock(spec=["build"])
         mock_build_info_constructor = create_patch(monkeypatch, "pysmith.BuildInfo")
         mock_build_info = mock_build_info_constructor.return_value
+        mock_build_info._rename_count = 0
         mock_files = {
             "f1": MockFileInfo("value1"),
             "f2": MockFileInfo("value2"),
         }
+        mock_build_info.files = FileStore(mock_files)
 
         pysmith = Pysmith(src="src", dest="dest")
         pysmith.use(mock_plugin1).use(mock_plugin2)
         pysmith._load_files = unittest.mock.Mock()
         pysmith._load_files.return_value = mock_files
-        pysmith._write_file = unittest.mock.Mock()
+        mock_writer_constructor = unittest.mock.MagicMock()
+        monkeypatch.setattr("pysmith.OutputWriter", mock_writer_constructor)
+        mock_writer = mock_writer_constructor.return_value
 
         pysmith.build()
 
@@ -191,11 +513,728 @@ class TestPysmith(object):
         mock_build_info_constructor.assert_called_once_with(pysmith._load_files.return_value)
         mock_plugin1.build.assert_called_once_with(mock_build_info)
         mock_plugin2.build.assert_called_once_with(mock_build_info)
-        pysmith._write_file.assert_has_calls((
-            call("f1", "value1"),
-            call("f2", "value2"),
+        mock_writer_constructor.assert_called_once_with("dest", workers=None, link_mode=None, skip_unchanged=False)
+        mock_writer.write.assert_has_calls((
+            call("f1", MockFileInfo("value1"), None, release=False),
+            call("f2", MockFileInfo("value2"), None, release=False),
         ))
 
+    def test_build_incremental(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        manifest = str(tmp_path / "manifest.json")
+        (src / "dir").mkdir(parents=True)
+        (src / "dir" / "a.txt").write_bytes(b"a")
+        (src / "b.txt").write_bytes(b"b")
+        (src / "c.txt").write_bytes(b"c")
+
+        plugin = UpperPlugin()
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(plugin)
+        pysmith.build()
+
+        assert plugin.calls == 1
+        assert (dest / "dir" / "a.txt").read_bytes() == b"A"
+        assert (dest / "b.txt").read_bytes() == b"B"
+
+        pysmith.build()
+        assert plugin.calls == 1
+
+        (src / "dir" / "a.txt").unlink()
+        (src / "b.txt").write_bytes(b"bb")
+        os.utime(str(dest / "c.txt"), ns=(0, 0))
+        pysmith.build()
+
+        assert plugin.calls == 2
+        assert not (dest / "dir").exists()
+        assert (dest / "b.txt").read_bytes() == b"BB"
+        assert os.stat(str(dest / "c.txt")).st_mtime_ns == 0
+
+    def test_build_dependencies(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        template = tmp_path / "template.html"
+        manifest = str(tmp_path / "manifest.json")
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+        template.write_bytes(b"1")
+
+        plugin = TemplateFilePlugin(str(template))
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(plugin)
+        assert pysmith.dependencies is None
+
+        pysmith.build()
+        assert pysmith.dependencies.get_inputs("a.txt") == {(SOURCE, "a.txt"), (TEMPLATE, str(template))}
+        assert Pysmith(src=str(src), dest=str(dest), manifest=manifest).dependencies.to_dict() == \
+            pysmith.dependencies.to_dict()
+
+        pysmith.build()
+        assert plugin.calls == 1
+
+        template.write_bytes(b"22")
+        pysmith.build()
+
+        assert plugin.calls == 2
+        assert (dest / "a.txt").read_bytes() == b"22a"
+        assert pysmith.dependencies.affected_outputs([(TEMPLATE, str(template))]) == {"a.txt"}
+
+    @pytest.mark.parametrize("fuse", (False, True))
+    def test_build_checkpoint(self, tmp_path, fuse):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        checkpoint_dir = tmp_path / "checkpoints"
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+        (src / "b.md").write_bytes(b"b")
+
+        def create_pysmith(suffix):
+            upper = UpperPlugin("*.txt")
+            pysmith = Pysmith(src=str(src), dest=str(dest), checkpoint_dir=str(checkpoint_dir), fuse=fuse,
+                              prune=True)
+            pysmith.use(upper, checkpoint=True).use(RenameFilePlugin("*.txt"), checkpoint=True)
+            pysmith.use(Collection(collection_name="all", match_pattern="*", order_by=lambda f: f.contents))
+            pysmith.use(RenameFilePlugin(suffix))
+            return pysmith, upper
+
+        pysmith, upper = create_pysmith("*.md")
+        report = pysmith.build()
+        assert upper.calls == 1
+        assert [phase.name for phase in report.phases if phase.name in ("resume", "checkpoint")] == [
+            "resume", "checkpoint", "checkpoint"]
+        assert sorted(os.listdir(str(checkpoint_dir))) == [
+            "00-UpperPlugin.checkpoint", "01-RenameFilePlugin.checkpoint"]
+
+        pysmith, upper = create_pysmith("*.txt")
+        report = pysmith.build()
+        assert upper.calls == 0
+        assert report.phases[1].name == "resume"
+        assert report.phases[1].files == 2
+        assert [phase.name for phase in report.phases[2:-1]] == ["Collection", "RenameFilePlugin"]
+        assert sorted(os.listdir(str(dest))) == ["b.md", "renamed_renamed_a.txt"]
+        assert (dest / "renamed_renamed_a.txt").read_bytes() == b"AAAA"
+        assert (dest / "b.md").read_bytes() == b"b"
+
+        (src / "a.txt").write_bytes(b"aa")
+        pysmith, upper = create_pysmith("*.txt")
+        pysmith.build()
+        assert upper.calls == 1
+        assert (dest / "renamed_renamed_a.txt").read_bytes() == b"AAAAAAAA"
+
+    def test_build_sharded(self, tmp_path):
+        src = tmp_path / "src"
+        src.mkdir()
+        for name in ("a", "b", "c", "d", "e"):
+            (src / "{}.txt".format(name)).write_bytes(name.encode())
+        (src / "f.md").write_bytes(b"f")
+
+        def create_pysmith(dest):
+            pysmith = Pysmith(src=str(src), dest=str(dest))
+            pysmith.use(UpperFilePlugin("*.txt")).use(RenameFilePlugin("*.txt"))
+            pysmith.use(Collection(collection_name="all", match_pattern="*", order_by=lambda f: f.contents))
+            return pysmith.use(UpperPlugin("*.md"))
+
+        shard_paths = [str(tmp_path / "shards" / "{}.shard".format(shard)) for shard in range(3)]
+        for shard, path in enumerate(shard_paths):
+            report = create_pysmith(tmp_path / "dest").build_shard(shard, 3, path)
+            assert [phase.name for phase in report.phases] == ["load", "UpperFilePlugin", "RenameFilePlugin", "shard"]
+
+        assert not (tmp_path / "dest").exists()
+        with pytest.raises(ValueError):
+            create_pysmith(tmp_path / "dest").merge_shards(shard_paths[1:])
+
+        report = create_pysmith(tmp_path / "dest").merge_shards(reversed(shard_paths))
+        assert [phase.name for phase in report.phases] == ["load", "merge", "Collection", "UpperPlugin", "write"]
+        assert report.phases[1].files == 6
+
+        create_pysmith(tmp_path / "expected").build()
+        expected = sorted(os.listdir(str(tmp_path / "expected")))
+        assert sorted(os.listdir(str(tmp_path / "dest"))) == expected
+        for file_name in expected:
+            assert (tmp_path / "dest" / file_name).read_bytes() == (tmp_path / "expected" / file_name).read_bytes()
+
+        # Sources edited since the shards ran are detected even if their size did not change.
+        (src / "a.txt").write_bytes(b"z")
+        with pytest.raises(ValueError):
+            create_pysmith(tmp_path / "dest").merge_shards(shard_paths)
+
+    @pytest.mark.parametrize("skip_unchanged", (False, True))
+    def test_build_dry_run(self, tmp_path, skip_unchanged):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        manifest = tmp_path / "manifest.json"
+        src.mkdir()
+        for name in ("a", "b", "c"):
+            (src / "{}.txt".format(name)).write_bytes(name.encode())
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=str(manifest), skip_unchanged=skip_unchanged)
+        pysmith.use(UpperFilePlugin("*.txt"))
+
+        report = pysmith.build(dry_run=True)
+        assert report.diff.added == ["a.txt", "b.txt", "c.txt"]
+        assert report.diff.size_delta == 3
+        assert not dest.exists()
+        assert not manifest.exists()
+
+        pysmith.build()
+        manifest_contents = manifest.read_bytes()
+        (src / "b.txt").write_bytes(b"bbb")
+        (src / "c.txt").unlink()
+        (src / "d.txt").write_bytes(b"d")
+        (dest / "extra.txt").write_bytes(b"extra")
+
+        report = pysmith.build(dry_run=True)
+        assert report.phases[-1].name == "diff"
+        assert report.outputs == {}
+        assert report.diff.added == ["d.txt"]
+        assert report.diff.modified == ["b.txt"]
+        assert report.diff.removed == ["c.txt", "extra.txt"]
+        assert report.diff.unchanged == ["a.txt"]
+        assert report.diff.size_delta == 1 + 2 - 1 - 5
+        assert (dest / "b.txt").read_bytes() == b"B"
+        assert (dest / "c.txt").exists()
+        assert not (dest / "d.txt").exists()
+        assert manifest.read_bytes() == manifest_contents
+
+    @pytest.mark.parametrize("plugin_workers", (None, 2))
+    def test_build_async(self, tmp_path, plugin_workers):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        for name in ("a.txt", "b.txt", "c.md"):
+            (src / name).write_bytes(name.encode())
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), fuse=True, plugin_workers=plugin_workers)
+        pysmith.use(UpperFilePlugin("*.txt")).use(AsyncRenameFilePlugin("*.txt")).use(AsyncMetadataPlugin())
+        runner = pysmith._runner
+
+        report = asyncio.run(pysmith.build_async(concurrency=2))
+        assert [phase.name for phase in report.phases[1:]] == [
+            "UpperFilePlugin", "AsyncRenameFilePlugin", "AsyncMetadataPlugin", "write"]
+        assert pysmith._runner is runner
+        assert sorted(os.listdir(str(dest))) == ["c.md", "renamed_a.txt", "renamed_b.txt"]
+        assert (dest / "renamed_a.txt").read_bytes() == b"A.TXTA.TXT"
+
+        # Synchronous builds run the coroutines using asyncio.run.
+        pysmith.clean().build()
+        assert sorted(os.listdir(str(dest))) == ["c.md", "renamed_a.txt", "renamed_b.txt"]
+
+    def test_build_shard_invalid_index(self, tmp_path):
+        pysmith = Pysmith(src=str(tmp_path), dest=str(tmp_path / "dest"))
+
+        with pytest.raises(ValueError):
+            pysmith.build_shard(2, 2, str(tmp_path / "2.shard"))
+
+    @pytest.mark.parametrize("incremental", (False, True))
+    def test_build_skip_unchanged(self, tmp_path, incremental):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        for name in ("a", "b", "c", "d"):
+            (src / "{}.txt".format(name)).write_bytes(name.encode())
+
+        manifest = str(tmp_path / "manifest.json") if incremental else None
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=manifest, skip_unchanged=True).use(UpperPlugin())
+        report = pysmith.build()
+
+        assert report.outputs == {"a.txt": "written", "b.txt": "written", "c.txt": "written", "d.txt": "written"}
+        for path in dest.iterdir():
+            os.utime(str(path), ns=(0, 0))
+
+        (src / "b.txt").write_bytes(b"bb")
+        (src / "d.txt").unlink()
+        (dest / "c.txt").write_bytes(b"X")
+        os.utime(str(dest / "c.txt"), ns=(0, 0))
+        report = pysmith.build()
+
+        expected = {"a.txt": "unchanged", "b.txt": "written", "c.txt": "written"}
+        if incremental:
+            expected["d.txt"] = "deleted"
+
+        assert report.outputs == expected
+        assert os.stat(str(dest / "a.txt")).st_mtime_ns == 0
+        assert (dest / "b.txt").read_bytes() == b"BB"
+        assert (dest / "c.txt").read_bytes() == b"C"
+        assert (dest / "d.txt").exists() != incremental
+
+        if incremental:
+            assert pysmith.build().outputs == {"a.txt": "unchanged", "b.txt": "unchanged", "c.txt": "unchanged"}
+
+    @pytest.mark.parametrize("incremental", (False, True))
+    def test_build_prune(self, tmp_path, incremental):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        (src / "dir").mkdir(parents=True)
+        (src / "dir" / "a.txt").write_bytes(b"a")
+        (src / "b.txt").write_bytes(b"b")
+        (dest / "other").mkdir(parents=True)
+        (dest / "other" / "stranger.txt").write_bytes(b"stranger")
+
+        manifest = str(tmp_path / "manifest.json") if incremental else None
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=manifest, prune=True).use(UpperPlugin())
+        pysmith.build()
+
+        assert not (dest / "other").exists()
+
+        (src / "dir" / "a.txt").unlink()
+        (src / "dir" / "c.txt").write_bytes(b"c")
+        report = pysmith.build()
+
+        assert sorted(os.listdir(str(dest))) == ["b.txt", "dir"]
+        assert os.listdir(str(dest / "dir")) == ["c.txt"]
+        assert report.outputs[os.path.join("dir", "a.txt")] == "deleted"
+
+    @pytest.mark.parametrize("mode", ("full", "manifest", "skip_unchanged", "atomic"))
+    @pytest.mark.parametrize("jobs", (None, 2))
+    def test_build_fuse(self, tmp_path, mode, jobs):
+        src = tmp_path / "src"
+        (src / "dir").mkdir(parents=True)
+        for name in ("a.md", "b.md", os.path.join("dir", "c.md"), "d.txt"):
+            (src / name).write_bytes(name.encode())
+
+        def create_pysmith(dest, fuse):
+            options = {
+                "full": {},
+                "manifest": {"manifest": str(tmp_path / (dest + ".json"))},
+                "skip_unchanged": {"skip_unchanged": True},
+                "atomic": {"atomic": True},
+            }[mode]
+            pysmith = Pysmith(src=str(src), dest=str(tmp_path / dest), jobs=jobs, fuse=fuse, **options)
+            pysmith.use(UpperFilePlugin("*.md")).use(RenameFilePlugin("*.md"))
+            pysmith.use(Collection(collection_name="all", match_pattern="*", order_by=lambda f: f.size))
+            pysmith.use(UpperFilePlugin("*.txt")).use(RenameFilePlugin("*.txt"))
+            return pysmith
+
+        def read_tree(dest):
+            path = tmp_path / dest
+            return {file_name: (path / file_name).read_bytes() for file_name, _ in scantree(str(path))}
+
+        create_pysmith("expected", False).build()
+        pysmith = create_pysmith("dest", True)
+        report = pysmith.build()
+
+        assert read_tree("dest") == read_tree("expected")
+        assert [phase.name for phase in report.phases if phase.name not in ("load", "manifest")] == [
+            "UpperFilePlugin+RenameFilePlugin", "Collection", "UpperFilePlugin+RenameFilePlugin", "write",
+        ]
+        assert set(report.outputs.values()) == {"written"}
+
+        (src / "b.md").unlink()
+        (src / "e.md").write_bytes(b"e")
+        create_pysmith("expected", False).build()
+        pysmith.build()
+
+        assert read_tree("dest") == read_tree("expected")
+
+    def test_build_fuse_releases_streamed_outputs(self, tmp_path, monkeypatch):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+        (src / "b.txt").write_bytes(b"b")
+
+        files = {}
+        load_files = Pysmith._load_files
+        monkeypatch.setattr(Pysmith, "_load_files", lambda self: files.update(load_files(self)) or files)
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), fuse=True).use(RenameFilePlugin("*.md"))
+        report = pysmith.build()
+
+        assert report.phases[-2].name == "RenameFilePlugin"
+        assert (dest / "renamed_a.md").read_bytes() == b"aa"
+        released = files["renamed_a.md"]
+        assert released._contents is None
+        assert released.path == str(dest / "renamed_a.md")
+        assert released.contents == b"aa"
+        assert files["b.txt"].path == str(src / "b.txt")
+
+    @pytest.mark.parametrize("fuse", (False, True))
+    def test_build_plugin_workers(self, tmp_path, fuse):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+        (src / "b.js").write_bytes(b"b")
+        (src / "c.txt").write_bytes(b"c")
+
+        pysmith = Pysmith(src=str(src), dest=str(tmp_path / "dest"), plugin_workers=2, fuse=fuse)
+        pysmith.use(DeclaredFilePlugin("*.md")).use(DeclaredFilePlugin("*.js"))
+        pysmith.use(RenameFilePlugin("*.md"))
+        report = pysmith.build()
+
+        assert [phase.name for phase in report.phases[1:-1]] == (
+            ["DeclaredFilePlugin+DeclaredFilePlugin+RenameFilePlugin"] if fuse else
+            ["DeclaredFilePlugin", "DeclaredFilePlugin", "RenameFilePlugin"])
+        assert (tmp_path / "dest" / "renamed_a.md").read_bytes() == b"AA"
+        assert (tmp_path / "dest" / "b.js").read_bytes() == b"B"
+        assert (tmp_path / "dest" / "c.txt").read_bytes() == b"c"
+
+    def test_build_plugin_workers_concurrent(self, tmp_path):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+        (src / "b.js").write_bytes(b"b")
+
+        files = {}
+        load_files = Pysmith._load_files
+        barrier = threading.Barrier(2, timeout=10)
+        pysmith = Pysmith(src=str(src), dest=str(tmp_path / "dest"), plugin_workers=2)
+        pysmith._load_files = lambda: files.update(load_files(pysmith)) or files
+        pysmith.use(DeclaredFilePlugin("*.md", barrier)).use(DeclaredFilePlugin("*.js", barrier))
+        pysmith.build()
+
+        assert files["a.md"].metadata["thread"] != files["b.js"].metadata["thread"]
+
+    @pytest.mark.parametrize("exchange", (True, False))
+    @pytest.mark.parametrize("incremental", (False, True))
+    def test_build_atomic(self, tmp_path, monkeypatch, incremental, exchange):
+        if not exchange:
+            monkeypatch.setattr("pysmith.exchange_paths", lambda path1, path2: False)
+
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+        (src / "b.txt").write_bytes(b"b")
+        (src / "c.txt").write_bytes(b"c")
+
+        manifest = str(tmp_path / "manifest.json") if incremental else None
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=manifest, atomic=True).use(UpperPlugin())
+        report = pysmith.build()
+
+        assert report.outputs == {"a.txt": "written", "b.txt": "written", "c.txt": "written"}
+        assert (dest / "a.txt").read_bytes() == b"A"
+        os.chmod(str(dest), 0o750)
+        (dest / "stranger.txt").write_bytes(b"stranger")
+        inode = os.stat(str(dest / "a.txt")).st_ino
+
+        (src / "b.txt").write_bytes(b"bb")
+        (src / "c.txt").unlink()
+        report = pysmith.build()
+
+        assert report.outputs == {"a.txt": "unchanged", "b.txt": "written", "c.txt": "deleted",
+                                  "stranger.txt": "deleted"}
+        assert sorted(os.listdir(str(dest))) == ["a.txt", "b.txt"]
+        assert os.stat(str(dest / "a.txt")).st_ino == inode
+        assert (dest / "b.txt").read_bytes() == b"BB"
+        assert os.stat(str(dest)).st_mode & 0o777 == 0o750
+        assert sorted(os.listdir(str(tmp_path))) == sorted(["src", "dest"] + (["manifest.json"] if incremental else []))
+
+    def test_build_atomic_error(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), atomic=True)
+        pysmith.build()
+
+        class MissingSourcePlugin(object):
+
+            def build(self, build_info):
+                build_info.files["missing.txt"] = FileInfo("missing.txt", str(src / "missing.txt"), os.stat(str(src)))
+
+        pysmith.use(MissingSourcePlugin())
+        with pytest.raises(FileNotFoundError):
+            pysmith.build()
+
+        assert os.listdir(str(dest)) == ["a.txt"]
+        assert sorted(os.listdir(str(tmp_path))) == ["dest", "src"]
+
+    @pytest.mark.parametrize("exchange", (False, True), ids=("rename", "exchange"))
+    def test_build_atomic_symlinked_destination(self, tmp_path, monkeypatch, exchange):
+        if not exchange:
+            monkeypatch.setattr("pysmith.exchange_paths", lambda path1, path2: False)
+
+        src = tmp_path / "src"
+        site = tmp_path / "site"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        site.mkdir()
+        os.symlink(str(site), str(dest))
+        (src / "a.txt").write_bytes(b"a")
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), atomic=True).use(UpperPlugin())
+        pysmith.build()
+        (src / "a.txt").write_bytes(b"aa")
+        pysmith.build()
+
+        assert os.path.islink(str(dest))
+        assert (site / "a.txt").read_bytes() == b"AA"
+        assert sorted(os.listdir(str(tmp_path))) == ["dest", "site", "src"]
+
+    def test_build_incremental_configuration_changed(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        manifest = str(tmp_path / "manifest.json")
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+
+        Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(UpperPlugin()).build()
+
+        plugin = UpperPlugin(match_pattern="*.md")
+        Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(plugin).build()
+
+        assert plugin.calls == 1
+        assert (dest / "a.txt").read_bytes() == b"a"
+
+    def test_build_configuration_changed_deletes_removed_sources(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        manifest = str(tmp_path / "manifest.json")
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+        (src / "b.txt").write_bytes(b"b")
+
+        Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(UpperPlugin()).build()
+        assert (dest / "b.txt").exists()
+
+        (src / "b.txt").unlink()
+        Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(UpperPlugin("*.md")).build()
+
+        assert sorted(os.listdir(str(dest))) == ["a.txt"]
+
+    @pytest.mark.parametrize("fuse", (False, True), ids=("staged", "fused"))
+    def test_build_restores_outputs_changed_outside(self, tmp_path, fuse):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        manifest = str(tmp_path / "manifest.json")
+        src.mkdir()
+        for name in ("a.md", "b.md", "c.md"):
+            (src / name).write_bytes(name.encode())
+
+        Pysmith(src=str(src), dest=str(dest), manifest=manifest, fuse=fuse).use(UpperFilePlugin("*.md")).build()
+        (dest / "a.md").unlink()
+        (dest / "b.md").write_bytes(b"edited")
+        (src / "c.md").write_bytes(b"new")
+        report = Pysmith(src=str(src), dest=str(dest), manifest=manifest, fuse=fuse).use(
+            UpperFilePlugin("*.md")).build()
+
+        assert (dest / "a.md").read_bytes() == b"A.MD"
+        assert (dest / "b.md").read_bytes() == b"B.MD"
+        assert (dest / "c.md").read_bytes() == b"NEW"
+        assert report.outputs["a.md"] != UNCHANGED
+
+    def test_manifest_enables_cache(self, tmp_path):
+        manifest = str(tmp_path / "manifest.json")
+
+        assert Pysmith(src="src", dest="dest", manifest=manifest)._cache._path == manifest + ".cache"
+        assert isinstance(Pysmith(src="src", dest="dest", manifest=manifest, cache=False)._cache, NullCache)
+        assert isinstance(Pysmith(src="src", dest="dest")._cache, NullCache)
+
+    def test_build_incremental_destination_missing(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        manifest = str(tmp_path / "manifest.json")
+        src.mkdir()
+        (src / "a.txt").write_bytes(b"a")
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), manifest=manifest).use(UpperPlugin())
+        pysmith.build()
+        pysmith.clean()
+        pysmith.build()
+
+        assert (dest / "a.txt").read_bytes() == b"A"
+
+    @pytest.mark.parametrize("link_mode", (None, "hardlink"))
+    def test_build_copies_unmodified_files(self, tmp_path, link_mode):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        (src / "dir").mkdir(parents=True)
+        (src / "dir" / "a.txt").write_bytes(b"a")
+        (src / "b.md").write_bytes(b"b")
+
+        Pysmith(src=str(src), dest=str(dest), link_mode=link_mode).use(UpperPlugin(match_pattern="*.md")).build()
+
+        assert (dest / "dir" / "a.txt").read_bytes() == b"a"
+        assert (dest / "b.md").read_bytes() == b"B"
+        assert os.path.samefile(str(src / "dir" / "a.txt"), str(dest / "dir" / "a.txt")) == (link_mode == "hardlink")
+        assert (src / "b.md").read_bytes() == b"b"
+
+    def test_build_with_jobs(self, tmp_path):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+        (src / "b.txt").write_bytes(b"b")
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), jobs=2)
+        pysmith.use(UpperFilePlugin("*.md")).use(UpperPlugin(match_pattern="*.txt"))
+        pysmith.build()
+
+        assert (dest / "a.md").read_bytes() == b"A"
+        assert (dest / "b.txt").read_bytes() == b"B"
+
+    @pytest.mark.parametrize("jobs", (None, 2))
+    def test_build_report(self, tmp_path, jobs):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"aa")
+        (src / "b.txt").write_bytes(b"b")
+        profile_dir = tmp_path / "profiles"
+        report_path = tmp_path / "report.json"
+
+        pysmith = Pysmith(src=str(src), dest=str(tmp_path / "dest"), jobs=jobs, report=str(report_path),
+                          profile_dir=str(profile_dir))
+        pysmith.use(RenameFilePlugin("*.md")).use(UpperPlugin())
+        report = pysmith.build()
+
+        assert [phase.name for phase in report.phases] == ["load", "RenameFilePlugin", "UpperPlugin", "write"]
+        load, rename, upper, write = report.phases
+        assert (load.files, load.bytes_out) == (2, 3)
+        assert (rename.files, rename.bytes_in, rename.bytes_out, rename.renames) == (1, 2, 4, 1)
+        assert (upper.files, upper.bytes_in, upper.bytes_out, upper.renames) == (None, 5, 5, 0)
+        assert (write.files, write.bytes_out) == (2, 5)
+        assert report.wall_time > 0
+        assert json.loads(report_path.read_text()) == json.loads(json.dumps(report.to_dict()))
+        assert sorted(os.listdir(str(profile_dir))) == ["00-RenameFilePlugin.prof", "01-UpperPlugin.prof"]
+
+    def test_build_report_without_sizes(self, tmp_path):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"aa")
+
+        pysmith = Pysmith(src=str(src), dest=str(tmp_path / "dest"))
+        pysmith.use(RenameFilePlugin("*.md")).use(UpperPlugin())
+        load, rename, upper, write = pysmith.build().phases
+
+        assert load.bytes_out == 2
+        assert (rename.files, rename.bytes_in, rename.bytes_out, rename.renames) == (1, 0, 0, 1)
+        assert (upper.bytes_in, upper.bytes_out) == (0, 0)
+        assert write.bytes_out == 4
+
+    @pytest.mark.parametrize("jobs", (None, 2))
+    def test_build_with_cache(self, tmp_path, jobs):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        cache = tmp_path / "cache"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+
+        pysmith = Pysmith(src=str(src), dest=str(dest), jobs=jobs, cache=str(cache))
+        pysmith.use(CachedUpperFilePlugin("*.md"))
+        pysmith.build()
+
+        assert (dest / "a.md").read_bytes() == b"A"
+        [entry] = [os.path.join(path, name) for path, _, names in os.walk(str(cache)) for name in names]
+        with open(entry, "wb") as f:
+            pickle.dump(b"cached", f)
+
+        pysmith.build()
+        assert (dest / "a.md").read_bytes() == b"cached"
+
+        pysmith.clear_cache().build()
+        assert (dest / "a.md").read_bytes() == b"A"
+
+    def test_build_prunes_cache(self, tmp_path):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+
+        pysmith = Pysmith(src=str(src), dest=str(tmp_path / "dest"), cache=str(tmp_path / "cache"), cache_size=0)
+        pysmith.use(CachedUpperFilePlugin("*.md"))
+        pysmith.build()
+
+        assert os.listdir(str(tmp_path / "cache")) != []
+        assert [name for _, _, names in os.walk(str(tmp_path / "cache")) for name in names] == []
+
+    @pytest.mark.parametrize("polling", (False, True))
+    def test_watch(self, tmp_path, polling):
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        (src / "dir").mkdir(parents=True)
+        (src / "a.md").write_bytes(b"a")
+        (src / "dir" / "b.md").write_bytes(b"b")
+
+        plugin = CountingFilePlugin("*.md")
+        pysmith = Pysmith(src=str(src), dest=str(dest)).use(plugin)
+        stop_event = threading.Event()
+        thread = threading.Thread(target=pysmith.watch, kwargs={
+            "debounce": 0.05, "polling": polling, "poll_interval": 0.05, "stop_event": stop_event})
+
+        def wait_until(condition):
+            deadline = time.monotonic() + 10
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert condition()
+
+        def read(path):
+            try:
+                return path.read_bytes()
+            except FileNotFoundError:
+                return None
+
+        thread.start()
+        try:
+            wait_until(lambda: read(dest / "dir" / "b.md") == b"B")
+            assert sorted(plugin.processed) == ["a.md", os.path.join("dir", "b.md")]
+
+            # Only the modified file is processed again.
+            plugin.processed.clear()
+            (src / "a.md").write_bytes(b"a2")
+            wait_until(lambda: read(dest / "a.md") == b"A2")
+            assert plugin.processed == ["a.md"]
+
+            (src / "c.md").write_bytes(b"c")
+            wait_until(lambda: read(dest / "c.md") == b"C")
+
+            (src / "dir" / "b.md").unlink()
+            wait_until(lambda: not (dest / "dir").exists())
+
+            # Errors do not stop the watch.
+            (src / "a.md").write_bytes(b"error")
+            time.sleep(0.2)
+            (src / "a.md").write_bytes(b"a3")
+            wait_until(lambda: read(dest / "a.md") == b"A3")
+        finally:
+            stop_event.set()
+            thread.join()
+
+        assert not thread.is_alive()
+        assert isinstance(pysmith._cache, NullCache)
+
+    @pytest.mark.parametrize("watch", (False, True))
+    def test_serve(self, tmp_path, watch):
+        src = tmp_path / "src"
+        src.mkdir()
+        (src / "a.md").write_bytes(b"a")
+        manifest = tmp_path / "manifest.json"
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        pysmith = Pysmith(src=str(src), dest=str(tmp_path / "dest"), manifest=str(manifest))
+        pysmith.use(UpperFilePlugin("*.md"))
+        stop_event = threading.Event()
+        thread = threading.Thread(target=pysmith.serve, kwargs={
+            "host": "127.0.0.1", "port": port, "watch": watch, "debounce": 0.05, "stop_event": stop_event})
+
+        def get(path):
+            try:
+                with urllib.request.urlopen("http://127.0.0.1:{}{}".format(port, path)) as response:
+                    return response.read()
+            except (urllib.error.URLError, ConnectionError):
+                return None
+
+        def wait_until(condition):
+            deadline = time.monotonic() + 10
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert condition()
+
+        thread.start()
+        try:
+            wait_until(lambda: get("/a.md") == b"A")
+            if watch:
+                (src / "a.md").write_bytes(b"changed")
+                wait_until(lambda: get("/a.md") == b"CHANGED")
+        finally:
+            stop_event.set()
+            thread.join()
+
+        assert not (tmp_path / "dest").exists()
+        assert not manifest.exists()
+
     def test_handle_errors_consumes_filenotfound(self):
         pysmith = Pysmith(src="src", dest="dest")
         pysmith._handle_clean_error(None, None, (FileNotFoundError, FileNotFoundError("error")))
@@ -219,45 +1258,32 @@ class TestPysmith(object):
             "f1": "fileInfo1",
             "f2": "fileInfo2",
         }
-        mock_scantree.assert_called_once_with("src")
+        mock_scantree.assert_called_once_with("src", ignore=pysmith._ignore, sort=False)
         mock_file_info_from_entry.assert_has_calls((call("value1"), call("value2")))
 
-    def test_write_file_directory_exists(self, mock_exists, mock_isdir):
-        mock_open = unittest.mock.mock_open()
-        mock_exists.return_value = True
-        mock_isdir.return_value = True
-
-        pysmith = Pysmith(src="src", dest="dest")
-        with unittest.mock.patch("pysmith.open", mock_open):
-            pysmith._write_file("file_name", b"contents")
-
-        path = os.path.join("dest", "file_name")
-        dirname = os.path.dirname(path)
-        mock_exists.assert_called_once_with(dirname)
-        mock_isdir.assert_called_once_with(dirname)
-        mock_open.assert_called_once_with(path, "wb")
-        mock_open.return_value.write.assert_called_once_with(b"contents")
+    @pytest.mark.parametrize("io_workers", (None, 2))
+    def test_load_files_ignore(self, tmp_path, io_workers):
+        for name in ("index.md", "notes.swp", "drafts/post.md", "assets/vendor/lib.js", "assets/app.js",
+                     "node_modules/pkg/index.js"):
+            path = tmp_path / "src" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"contents")
 
-    def test_write_file_directory_does_not_exist(self, mock_exists, mock_makedirs, mock_isdir):
-        mock_open = unittest.mock.mock_open()
-        mock_exists.return_value = False
+        ignore_file = tmp_path / ".pysmithignore"
+        ignore_file.write_text("# Vendored code\nassets/vendor/\n/drafts\n")
+        pysmith = Pysmith(src=str(tmp_path / "src"), dest=str(tmp_path / "dest"), io_workers=io_workers,
+                          ignore=["node_modules/", "*.swp"], ignore_file=str(ignore_file))
 
-        pysmith = Pysmith(src="src", dest="dest")
-        with unittest.mock.patch("pysmith.open", mock_open):
-            pysmith._write_file("file_name", b"contents")
+        assert sorted(pysmith._load_files()) == [os.path.join("assets", "app.js"), "index.md"]
 
-        path = os.path.join("dest", "file_name")
-        dirname = os.path.dirname(path)
-        mock_exists.assert_called_once_with(dirname)
-        mock_makedirs.assert_called_once_with(dirname)
-        mock_isdir.assert_not_called()
-        mock_open.assert_called_once_with(path, "wb")
-        mock_open.return_value.write.assert_called_once_with(b"contents")
+    def test_load_files_parallel(self, tmp_path):
+        (tmp_path / "dir").mkdir()
+        (tmp_path / "dir" / "a.txt").write_bytes(b"a")
+        (tmp_path / "b.txt").write_bytes(b"b")
 
-    def test_write_file_path_is_not_directory(self, mock_exists, mock_isdir):
-        mock_exists.return_value = True
-        mock_isdir.return_value = False
+        files = Pysmith(src=str(tmp_path), dest="dest", io_workers=2)._load_files()
+        serial_files = Pysmith(src=str(tmp_path), dest="dest")._load_files()
 
-        pysmith = Pysmith(src="src", dest="dest")
-        with pytest.raises(NotADirectoryError):
-            pysmith._write_file("file_name", b"contents")
+        assert list(files) == list(serial_files)
+        assert files[os.path.join("dir", "a.txt")].contents == b"a"
+        assert files["b.txt"].stats.st_size == 1
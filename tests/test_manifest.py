@@ -0,0 +1,126 @@
+import os
+
+from pysmith import FileInfo
+from pysmith.dependencies import SOURCE, TEMPLATE, DependencyGraph
+from pysmith.manifest import ChangeSet, Manifest
+from pysmith.util import content_digest
+
+
+def create_file_info(contents, size=None, mtime=0):
+    stats = os.stat_result((0, 0, 0, 0, 0, 0, len(contents) if size is None else size, 0, 0, 0, 0, 0, 0, 0, mtime))
+    return FileInfo("name", "path", stats, contents)
+
+
+class TestChangeSet(object):
+
+    def test_empty(self):
+        assert not ChangeSet()
+
+    def test_not_empty(self):
+        assert ChangeSet(removed=["file"])
+
+
+class TestManifest(object):
+
+    def test_load_missing_file(self, tmp_path):
+        assert Manifest.load(str(tmp_path / "manifest.json")) is None
+
+    def test_load_other_version(self, tmp_path):
+        path = tmp_path / "manifest.json"
+        path.write_text("{\"version\": -1}")
+
+        assert Manifest.load(str(path)) is None
+
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / "manifest.json")
+        sources = {"a.md": {"size": 1, "mtime": 2, "digest": "abc"}}
+        outputs = {"a.html": "def"}
+        output_stats = {"a.html": {"size": 3, "mtime": 4}}
+
+        Manifest("fingerprint", sources, outputs, output_stats).save(path)
+        manifest = Manifest.load(path)
+
+        assert manifest.fingerprint == "fingerprint"
+        assert manifest.sources == sources
+        assert manifest.outputs == outputs
+        assert manifest.output_stats == output_stats
+        assert os.listdir(str(tmp_path)) == ["manifest.json"]
+
+    def test_update_sources_without_previous(self):
+        manifest = Manifest()
+        changes = manifest.update_sources({"a.md": create_file_info(b"a", mtime=5)})
+
+        assert changes.added == ["a.md"]
+        assert changes.changed == []
+        assert changes.removed == []
+        assert manifest.sources == {
+            "a.md": {"size": 1, "mtime": 5, "digest": content_digest(b"a")},
+        }
+
+    def test_update_sources_with_previous(self):
+        previous = Manifest(sources={
+            "same_stats.md": {"size": 1, "mtime": 1, "digest": "stale"},
+            "touched.md": {"size": 1, "mtime": 1, "digest": content_digest(b"b")},
+            "changed.md": {"size": 1, "mtime": 1, "digest": content_digest(b"c")},
+            "removed.md": {"size": 1, "mtime": 1, "digest": "removed"},
+        })
+
+        manifest = Manifest()
+        files = {
+            "same_stats.md": create_file_info(b"a", mtime=1),
+            "touched.md": create_file_info(b"b", mtime=2),
+            "changed.md": create_file_info(b"d", mtime=2),
+            "added.md": create_file_info(b"e", mtime=2),
+        }
+        changes = manifest.update_sources(files, previous)
+
+        assert changes.added == ["added.md"]
+        assert changes.changed == ["changed.md"]
+        assert changes.removed == ["removed.md"]
+        assert manifest.sources["same_stats.md"]["digest"] == "stale"
+        assert manifest.sources["touched.md"] == {"size": 1, "mtime": 2, "digest": content_digest(b"b")}
+
+    def test_update_sources_reuses_digest(self):
+        previous = Manifest(sources={"a.md": {"size": 1, "mtime": 1, "digest": "recorded"}})
+        stats = os.stat_result((0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1))
+        file_info = FileInfo("a.md", "missing/a.md", stats)
+
+        Manifest().update_sources({"a.md": file_info}, previous)
+
+        assert file_info.digest == "recorded"
+
+    def test_save_and_load_dependencies(self, tmp_path):
+        path = str(tmp_path / "manifest.json")
+        template = tmp_path / "layout.html"
+        template.write_text("layout")
+        graph = DependencyGraph()
+        graph.add_output("a.html", [(SOURCE, "a.md"), (TEMPLATE, str(template))])
+
+        manifest = Manifest()
+        manifest.update_inputs(graph)
+        manifest.save(path)
+        loaded = Manifest.load(path)
+
+        assert loaded.dependencies.get_inputs("a.html") == {(SOURCE, "a.md"), (TEMPLATE, str(template))}
+        assert loaded.inputs == manifest.inputs
+        assert list(loaded.inputs) == [str(template)]
+
+    def test_get_changed_inputs(self, tmp_path):
+        unchanged = tmp_path / "unchanged.html"
+        changed = tmp_path / "changed.html"
+        removed = tmp_path / "removed.html"
+        for path in (unchanged, changed, removed):
+            path.write_text("template")
+
+        graph = DependencyGraph()
+        graph.add_output("a.html", [(TEMPLATE, str(path)) for path in (unchanged, changed, removed)])
+        graph.add_output("b.html", [(TEMPLATE, "relative.html"), (TEMPLATE, str(tmp_path / "missing.html"))])
+        manifest = Manifest()
+        manifest.update_inputs(graph)
+
+        assert manifest.get_changed_inputs() == []
+
+        changed.write_text("changed template")
+        removed.unlink()
+
+        assert manifest.get_changed_inputs() == [(TEMPLATE, str(changed)), (TEMPLATE, str(removed))]
@@ -0,0 +1,117 @@
+import os
+import pickle
+
+import pytest
+
+from pysmith import BuildInfo, FileInfo
+from pysmith.cache import NullCache
+from pysmith.parallel import _process_chunk, load_stage, open_stage, run_file_plugin
+from pysmith.plugin_util import Access, FilePlugin
+
+from .util import UnpicklablePlugin, UpperPlugin, create_build_info
+
+
+class MetadataSizePlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.metadata["pid"] = os.getpid()
+        file_info.metadata["metadata_size"] = len(build_info.metadata)
+
+    def get_access(self):
+        return Access(files=[self._match_pattern])
+
+
+@pytest.mark.parametrize("plugin_type", (UpperPlugin, UnpicklablePlugin))
+def test_run_file_plugin(executor, plugin_type):
+    build_info = create_build_info(40)
+    expected = create_build_info(40)
+    UpperPlugin("*.md").build(expected)
+
+    plugin = plugin_type("*.md")
+    run_file_plugin(plugin, build_info, list(plugin.get_files(build_info)), executor, 2)
+
+    assert list(build_info.files) == list(expected.files)
+    for file_name, file_info in build_info.files.items():
+        assert file_info.contents == expected.files[file_name].contents
+
+    if plugin_type is UpperPlugin:
+        assert build_info.files["file1.md"].metadata["pid"] != os.getpid()
+    else:
+        assert build_info.files["file1.md"].metadata["pid"] == os.getpid()
+
+
+def test_run_file_plugin_few_files(executor):
+    build_info = create_build_info(20)
+    plugin = UpperPlugin("*.md")
+    assert run_file_plugin(plugin, build_info, list(plugin.get_files(build_info)), executor, 2) == 0.0
+
+    assert build_info.files["file1.md"].contents == b"C1!"
+    assert build_info.files["file1.md"].metadata["pid"] == os.getpid()
+
+
+def test_run_file_plugin_unused_metadata(executor):
+    build_info = create_build_info(40)
+    plugin = MetadataSizePlugin("*.md")
+    run_file_plugin(plugin, build_info, list(plugin.get_files(build_info)), executor, 2)
+
+    assert build_info.files["file1.md"].metadata["pid"] != os.getpid()
+    assert build_info.files["file1.md"].metadata["metadata_size"] == 0
+
+
+def test_run_file_plugin_no_files(executor):
+    build_info = BuildInfo()
+    plugin = UpperPlugin("*.md")
+    run_file_plugin(plugin, build_info, list(plugin.get_files(build_info)), executor, 2)
+    assert build_info.files == {}
+
+
+def test_run_file_plugin_preserves_identity(executor):
+    file_info = FileInfo("name", "path", None, b"a")
+    build_info = BuildInfo(files={"a.md": file_info})
+    build_info.metadata["suffix"] = b""
+
+    plugin = UpperPlugin("*.md")
+    run_file_plugin(plugin, build_info, list(plugin.get_files(build_info)), executor, 2)
+
+    assert build_info.files["a.md"] is file_info
+    assert file_info.contents == b"A"
+
+
+def test_open_stage():
+    build_info = BuildInfo()
+    build_info.metadata["suffix"] = b"!"
+
+    with open_stage([UpperPlugin("*.md")], build_info, "UpperPlugin") as stage:
+        plugins, stage_build_info = load_stage(stage)
+        assert stage_build_info.metadata == {"suffix": b"!"}
+
+    assert not os.path.exists(stage)
+    # The stage stays loaded in the process once its file is removed.
+    assert load_stage(stage)[0] is plugins
+
+    with open_stage([UpperPlugin("*.md")], build_info, "UpperPlugin", Access(files=["*.md"])) as stage:
+        assert load_stage(stage)[1].metadata == {}
+
+
+def test_open_stage_unpicklable():
+    with open_stage([UnpicklablePlugin("*.md")], BuildInfo(), "UnpicklablePlugin") as stage:
+        assert stage is None
+
+
+def test_process_chunk_unmodified_file(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"contents")
+    file_info = FileInfo("a.md", str(path), None)
+    file_info.contents
+
+    stage = tmp_path / "stage"
+    stage.write_bytes(pickle.dumps(([UpperPlugin("*")], {"suffix": b""}, NullCache())))
+    sent = pickle.loads(pickle.dumps([("a.md", file_info)]))
+
+    assert sent[0][1]._contents is None
+    [(output_name, processed)], cpu_time = _process_chunk(str(stage), sent)
+
+    assert output_name is None
+    assert processed.contents == b"CONTENTS"
+    assert processed.modified
+    assert cpu_time >= 0
@@ -1,8 +1,14 @@
+import os
+import pickle
+import re
 import unittest.mock
 
 import pytest
 
-from pysmith.plugin_util import lambda_or_metadata_selector
+from pysmith import BuildInfo
+from pysmith.plugin_util import (Access, AsyncFilePlugin, FilePlugin, get_access, is_async_plugin, is_file_plugin,
+                                 lambda_or_metadata_selector)
+from .util import MockFileInfo
 
 
 @pytest.mark.parametrize("selector", (
@@ -23,3 +29,87 @@ def test_lambda_or_metadata_selector(selector):
 def test_lambda_or_metadata_selector_invalid_input_type():
     with pytest.raises(ValueError):
         lambda_or_metadata_selector(None)
+
+
+class RenamePlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = file_info.contents.upper()
+        if file_name.startswith("rename"):
+            return "renamed_" + file_name
+
+        return None
+
+
+class AsyncRenamePlugin(AsyncFilePlugin):
+
+    async def process_file_async(self, build_info, file_name, file_info):
+        return RenamePlugin.process_file(self, build_info, file_name, file_info)
+
+
+class AsyncBuildPlugin(object):
+
+    async def build_async(self, build_info):
+        pass
+
+
+@pytest.mark.parametrize("match_pattern", ("*.md", re.compile(r"\.md$")), ids=("glob", "regex"))
+def test_file_plugin_build(match_pattern):
+    build_info = BuildInfo(files={
+        "a.md": MockFileInfo(b"a"),
+        "rename.md": MockFileInfo(b"b"),
+        "c.txt": MockFileInfo(b"c"),
+    })
+
+    RenamePlugin(match_pattern).build(build_info)
+
+    assert build_info.files == {
+        "a.md": MockFileInfo(b"A"),
+        "c.txt": MockFileInfo(b"c"),
+        "renamed_rename.md": MockFileInfo(b"B"),
+    }
+
+
+@pytest.mark.parametrize("match_pattern", ("*.md", re.compile(r"\.md$")), ids=("glob", "regex"))
+def test_file_plugin_matches(match_pattern):
+    plugin = RenamePlugin(match_pattern)
+
+    assert plugin.matches("a.md")
+    assert plugin.matches(os.path.join("dir", "b.md"))
+    assert not plugin.matches("c.txt")
+
+
+def test_get_access():
+    access = Access(files=["*.md"])
+    mock_plugin = unittest.mock.Mock(spec=["build", "get_access"])
+    mock_plugin.get_access.return_value = access
+
+    assert get_access(mock_plugin) is access
+    assert get_access(RenamePlugin("*")) is None
+    assert get_access(object()) is None
+
+
+def test_async_file_plugin_build():
+    build_info = BuildInfo(files={"a.md": MockFileInfo(b"a"), "rename.md": MockFileInfo(b"b")})
+
+    AsyncRenamePlugin("*.md").build(build_info)
+
+    assert build_info.files == {"a.md": MockFileInfo(b"A"), "renamed_rename.md": MockFileInfo(b"B")}
+
+
+def test_is_file_plugin():
+    assert is_file_plugin(RenamePlugin("*"))
+    assert not is_file_plugin(object())
+
+
+def test_is_async_plugin():
+    assert is_async_plugin(AsyncRenamePlugin("*"))
+    assert is_async_plugin(AsyncBuildPlugin())
+    assert not is_async_plugin(RenamePlugin("*"))
+    assert not is_async_plugin(unittest.mock.Mock())
+
+
+def test_metadata_selector_pickle():
+    selector = pickle.loads(pickle.dumps(lambda_or_metadata_selector("key")))
+
+    assert selector(MockFileInfo(b"", metadata={"key": "value"})) == "value"
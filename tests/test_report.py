@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+
+from pysmith.diff import ADDED, OutputChange, OutputDiff
+from pysmith.report import BuildReport, PhaseReport
+
+
+def test_phase_measure():
+    phase = PhaseReport("phase")
+
+    with phase.measure() as measured:
+        sum(range(10000))
+
+    assert measured is phase
+    assert phase.wall_time > 0
+    assert phase.cpu_time >= 0
+
+
+def test_phase_measure_other_threads():
+    phase = PhaseReport("phase")
+    done = threading.Event()
+
+    def busy():
+        while not done.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    try:
+        with phase.measure():
+            time.sleep(0.2)
+    finally:
+        done.set()
+        thread.join()
+
+    assert phase.cpu_time < 0.1
+
+
+def test_phase_to_dict():
+    phase = PhaseReport("phase")
+    phase.files = 2
+    phase.bytes_in = 3
+    phase.bytes_out = 4
+    phase.renames = 1
+
+    assert phase.to_dict() == {
+        "name": "phase",
+        "wall_time": 0.0,
+        "cpu_time": 0.0,
+        "files": 2,
+        "bytes_in": 3,
+        "bytes_out": 4,
+        "renames": 1,
+    }
+
+
+def test_build_report_write_json(tmp_path):
+    report = BuildReport()
+    report.add_phase("load").files = 1
+    report.add_phase("write")
+    report.wall_time = 1.5
+    report.outputs = {"a.html": "written"}
+
+    path = tmp_path / "report.json"
+    report.write_json(str(path))
+
+    data = json.loads(path.read_text())
+    assert data["wall_time"] == 1.5
+    assert [phase["name"] for phase in data["phases"]] == ["load", "write"]
+    assert data["phases"][0]["files"] == 1
+    assert data["outputs"] == {"a.html": "written"}
+    assert data["diff"] is None
+
+
+def test_build_report_diff():
+    report = BuildReport()
+    report.diff = OutputDiff([OutputChange("a.html", ADDED, None, 3)])
+
+    assert report.to_dict()["diff"] == {
+        "size_delta": 3,
+        "changes": [{"file_name": "a.html", "status": "added", "old_size": None, "new_size": 3, "size_delta": 3}],
+    }
@@ -0,0 +1,101 @@
+import re
+import threading
+
+import pytest
+
+from pysmith.plugin_util import Access
+from pysmith.schedule import combine_access, get_dependencies, run_graph
+
+
+FILE_NAMES = ["index.md", "about.md", "style.scss", "app.js", "logo.png"]
+
+
+def test_combine_access():
+    access = combine_access([
+        Access(files=["*.md"]),
+        Access(files=["*.html"], creates=["*.css"], reads_metadata=True),
+        Access(writes_metadata=True),
+    ])
+
+    assert access.files == ["*.md", "*.html"]
+    assert access.creates == ["*.css"]
+    assert access.reads_metadata
+    assert access.writes_metadata
+
+
+def test_combine_access_undeclared():
+    assert combine_access([Access(files=["*.md"]), None]) is None
+
+
+def test_get_dependencies_disjoint_files():
+    accesses = [
+        Access(files=["*.md"]),
+        Access(files=[re.compile(r".*\.(sass|scss)")], creates=["*.css"]),
+        Access(files=["*.js"]),
+        Access(files=["*.md"]),
+        Access(files=["*.css"]),
+    ]
+
+    assert get_dependencies(accesses, FILE_NAMES) == [set(), set(), set(), {0}, {1}]
+
+
+def test_get_dependencies_undeclared():
+    accesses = [Access(files=["*.md"]), None, Access(files=["*.js"])]
+
+    assert get_dependencies(accesses, FILE_NAMES) == [set(), {0}, {1}]
+
+
+def test_get_dependencies_metadata():
+    accesses = [
+        Access(files=["*.md"], writes_metadata=True),
+        Access(files=["*.js"]),
+        Access(files=["*.png"], writes_metadata=True),
+        Access(files=["*.scss"], reads_metadata=True),
+    ]
+
+    assert get_dependencies(accesses, FILE_NAMES) == [set(), set(), {0}, {0, 1, 2}]
+
+
+def test_get_dependencies_created_files():
+    accesses = [
+        Access(files=["*.md"], creates=["*.html"]),
+        Access(files=["*.js"], creates=["*.md"]),
+        Access(files=["*.html"]),
+        Access(files=["*.html"]),
+        Access(files=["*.png"]),
+    ]
+
+    assert get_dependencies(accesses, FILE_NAMES) == [set(), {0}, {0}, {0, 2}, set()]
+
+
+def test_run_graph_runs_independent_tasks_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    order = []
+
+    def create_task(name, wait):
+        def task():
+            if wait:
+                barrier.wait()
+
+            order.append(name)
+
+        return task
+
+    tasks = [create_task("a", True), create_task("b", True), create_task("c", False)]
+    run_graph(tasks, [set(), set(), {0, 1}], 2)
+
+    assert sorted(order[:2]) == ["a", "b"]
+    assert order[2] == "c"
+
+
+def test_run_graph_error():
+    ran = []
+
+    def fail():
+        raise ValueError("failed")
+
+    tasks = [fail, lambda: ran.append("b"), lambda: ran.append("c")]
+    with pytest.raises(ValueError):
+        run_graph(tasks, [set(), {0}, {1}], 2)
+
+    assert ran == []
@@ -0,0 +1,159 @@
+import email.utils
+import http.client
+import os
+import threading
+
+import pytest
+
+from pysmith import FileInfo
+from pysmith.server import DevServer, SiteContents
+from pysmith.util import content_digest
+
+
+def create_files(files):
+    return {
+        os.path.join(*file_name.split("/")): FileInfo("name", "path", None, contents)
+        for file_name, contents in files.items()
+    }
+
+
+def update(site, files):
+    site.update(files, {file_name: content_digest(file_info.contents) for file_name, file_info in files.items()})
+
+
+@pytest.fixture
+def site():
+    site = SiteContents()
+    update(site, create_files({
+        "index.html": b"home",
+        "about/index.html": b"about",
+        "css/style.css": b"css",
+        "data.bin": b"data",
+    }))
+    return site
+
+
+@pytest.fixture
+def server(site):
+    server = DevServer(("127.0.0.1", 0), site)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def request(server, path, method="GET", headers={}):
+    connection = http.client.HTTPConnection(*server.server_address)
+    try:
+        connection.request(method, path, headers=headers)
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("path, expected", (
+    ("/", b"home"),
+    ("/about/", b"about"),
+    ("/about/index.html", b"about"),
+    ("/css/style.css", b"css"),
+    ("/css/./../css/style.css", b"css"),
+    ("/../index.html", b"home"),
+    ("/missing", None),
+    ("/css/", None),
+))
+def test_resolve(site, path, expected):
+    resource, redirect = site.resolve(path)
+
+    assert redirect is None
+    assert (resource.file_info.contents if resource is not None else None) == expected
+
+
+def test_resolve_redirect(site):
+    assert site.resolve("/about") == (None, "/about/")
+
+
+def test_update_keeps_last_modified(site):
+    last_modified = site.resolve("/")[0].last_modified
+    about_last_modified = site.resolve("/about/")[0].last_modified
+
+    update(site, create_files({"index.html": b"home", "about/index.html": b"changed"}))
+
+    assert site.resolve("/")[0].last_modified == last_modified
+    assert site.resolve("/about/")[0].last_modified >= about_last_modified
+    assert site.resolve("/about/")[0].file_info.contents == b"changed"
+    assert site.resolve("/css/style.css") == (None, None)
+
+
+def test_get(server):
+    response, body = request(server, "/css/style.css?v=1")
+
+    assert response.status == 200
+    assert body == b"css"
+    assert response.getheader("Content-Type") == "text/css"
+    assert response.getheader("Content-Length") == "3"
+    assert response.getheader("ETag") == "\"{}\"".format(content_digest(b"css"))
+    assert response.getheader("Cache-Control") == "no-cache"
+    assert email.utils.parsedate_to_datetime(response.getheader("Last-Modified"))
+
+
+def test_get_unknown_content_type(server):
+    response, _ = request(server, "/data.bin")
+
+    assert response.getheader("Content-Type") == "application/octet-stream"
+
+
+def test_get_index(server):
+    response, body = request(server, "/about/")
+
+    assert response.status == 200
+    assert body == b"about"
+    assert response.getheader("Content-Type") == "text/html"
+
+
+def test_get_redirect(server):
+    response, _ = request(server, "/about")
+
+    assert response.status == 301
+    assert response.getheader("Location") == "/about/"
+
+
+def test_head(server):
+    response, body = request(server, "/", method="HEAD")
+
+    assert response.status == 200
+    assert body == b""
+    assert response.getheader("Content-Length") == "4"
+
+
+def test_if_none_match(server):
+    etag = request(server, "/")[0].getheader("ETag")
+
+    response, body = request(server, "/", headers={"If-None-Match": "\"other\", " + etag})
+    assert response.status == 304
+    assert body == b""
+    assert response.getheader("ETag") == etag
+
+    response, body = request(server, "/", headers={"If-None-Match": "\"other\""})
+    assert response.status == 200
+    assert body == b"home"
+
+
+def test_if_modified_since(server):
+    last_modified = request(server, "/")[0].getheader("Last-Modified")
+
+    assert request(server, "/", headers={"If-Modified-Since": last_modified})[0].status == 304
+    assert request(server, "/", headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"})[0].status == 200
+    assert request(server, "/", headers={"If-Modified-Since": "invalid"})[0].status == 200
+
+
+def test_not_found(server, site):
+    response, _ = request(server, "/missing")
+    assert response.status == 404
+
+    update(site, create_files({"404.html": b"not found"}))
+    response, body = request(server, "/missing", headers={"If-None-Match": "*"})
+    assert response.status == 404
+    assert body == b"not found"
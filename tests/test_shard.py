@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from pysmith import FileInfo
+from pysmith.contrib.core.collection import Collection
+from pysmith.plugin_util import FilePlugin
+from pysmith.shard import get_listing_digest, get_shard, get_shard_key, get_shard_stop, load_shards, save_shard
+
+from .util import create_file_info
+
+
+class BarrierPlugin(FilePlugin):
+    barrier = True
+
+
+def test_get_shard():
+    assert [get_shard(file_name, 4) for file_name in ("index.md", "about.md", "posts/a.md")] == [2, 3, 0]
+    assert get_shard("index.md", 1) == 0
+
+
+def test_get_shard_spreads_files():
+    shards = [get_shard("posts/{}.md".format(index), 4) for index in range(100)]
+
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_get_shard_stop():
+    file_plugin = FilePlugin("*.md")
+    collection = Collection(collection_name="all", match_pattern="*", order_by=lambda f: f.name)
+
+    assert get_shard_stop([]) == 0
+    assert get_shard_stop([file_plugin, file_plugin]) == 2
+    assert get_shard_stop([file_plugin, collection, file_plugin]) == 1
+    assert get_shard_stop([file_plugin, BarrierPlugin("*.md"), file_plugin]) == 1
+
+
+def test_get_listing_digest(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"a")
+    digest = get_listing_digest({"a.md": create_file_info(str(path))})
+
+    os.utime(str(path), ns=(0, 0))
+    assert get_listing_digest({"a.md": create_file_info(str(path))}) == digest
+    assert get_listing_digest({"b.md": create_file_info(str(path))}) != digest
+
+    path.write_bytes(b"b")
+    assert get_listing_digest({"a.md": create_file_info(str(path))}) != digest
+
+    path.write_bytes(b"aa")
+    assert get_listing_digest({"a.md": create_file_info(str(path))}) != digest
+
+
+def test_get_shard_key():
+    key = get_shard_key(["f1", "f2"], "sources")
+
+    assert get_shard_key(["f1", "f2"], "sources") == key
+    assert get_shard_key(["f1"], "sources") != key
+    assert get_shard_key(["f1", "f2"], "other") != key
+
+
+def test_save_and_load(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for name in ("a.md", "b.md", "c.md"):
+        (src / name).write_bytes(name.encode())
+
+    sources = {name: create_file_info(str(src / name)) for name in ("a.md", "b.md", "c.md")}
+    moved = FileInfo("b.md", "/elsewhere/b.md", None)
+    paths = [str(tmp_path / "shards" / "1.shard"), str(tmp_path / "shards" / "0.shard")]
+
+    size = save_shard(paths[0], "key", 1, 2, [("c.md", "c.html", FileInfo("c.md", "c.md", None, b"c")),
+                                              (None, "created.txt", FileInfo("x", "x", None, b"x"))], {"b": 1})
+    assert size == os.path.getsize(paths[0])
+    save_shard(paths[1], "key", 0, 2, [("b.md", "b.md", moved), ("a.md", "a.html", FileInfo("a", "a", None, b"A"))],
+               {"a": 1, "b": 0})
+
+    files, metadata = load_shards(paths, "key", sources)
+    assert [file_name for file_name, _ in files] == ["a.html", "b.md", "c.html", "created.txt"]
+    assert files[0][1].contents == b"A"
+    assert files[1][1].path == str(src / "b.md")
+    assert files[1][1].contents == b"b.md"
+    assert metadata == {"a": 1, "b": 1}
+    assert sorted(os.listdir(str(tmp_path / "shards"))) == ["0.shard", "1.shard"]
+
+
+def test_load_other_key(tmp_path):
+    path = str(tmp_path / "0.shard")
+    save_shard(path, "key", 0, 1, [], {})
+
+    with pytest.raises(ValueError):
+        load_shards([path], "other", {})
+
+
+def test_load_missing_shard(tmp_path):
+    path = str(tmp_path / "0.shard")
+    save_shard(path, "key", 0, 2, [], {})
+
+    with pytest.raises(ValueError):
+        load_shards([path], "key", {})
+
+    with pytest.raises(ValueError):
+        load_shards([], "key", {})
+
+
+def test_load_inconsistent_shards(tmp_path):
+    paths = [str(tmp_path / "0.shard"), str(tmp_path / "1.shard")]
+    save_shard(paths[0], "key", 0, 2, [], {})
+    save_shard(paths[1], "key", 1, 3, [], {})
+
+    with pytest.raises(ValueError):
+        load_shards(paths, "key", {})
+
+    with pytest.raises(ValueError):
+        load_shards([paths[0], paths[0]], "key", {})
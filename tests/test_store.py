@@ -0,0 +1,126 @@
+import fnmatch
+import os
+import re
+
+import pytest
+
+from pysmith.store import FileStore, may_overlap
+
+
+FILE_NAMES = [
+    os.path.join(*name.split("/")) for name in (
+        "index.md", "about.html", "posts/a.md", "posts/b.html", "posts/2020/c.md", "posts/2020/d.tar.gz",
+        "postscript/e.md", "css/style.scss", "css/print.sass", "js/app.js", "README", ".gitignore", "a[b.md",
+    )
+]
+
+PATTERNS = [
+    "*", "*.md", "*.html", "*.tar.gz", "*.gz", "*md", "posts/*", "posts/*.md", "posts/2020/*", "post*/*.md",
+    "*/2020/*.md", "index.md", "missing.md", "*.[mh]*", "*.s[ac]ss", "?????.md", "*/*.md", "*.gitignore", "README",
+    "a[b.md", "[!p]*.md", "/*",
+]
+
+
+@pytest.fixture
+def store():
+    return FileStore({file_name: file_name.upper() for file_name in FILE_NAMES})
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_match_same_as_fnmatch(store, pattern):
+    pattern = os.path.join(*pattern.split("/")) if not pattern.startswith("/") else pattern
+    assert store.match(pattern) == fnmatch.filter(FILE_NAMES, pattern)
+
+
+def test_match_after_mutations(store):
+    del store["posts/a.md".replace("/", os.sep)]
+    store["posts/new.md".replace("/", os.sep)] = "new"
+    store["index.md"] = "replaced"
+    store["moved.md"] = store.pop("about.html")
+
+    expected = list(store)
+    for pattern in PATTERNS:
+        assert store.match(pattern) == fnmatch.filter(expected, pattern)
+
+
+def test_mapping_behavior(store):
+    backing = {"a.md": "a"}
+    store = FileStore(backing)
+    store["b.md"] = "b"
+    del store["a.md"]
+
+    assert backing == {"b.md": "b"}
+    assert store == {"b.md": "b"}
+    assert "b.md" in store
+    assert "a.md" not in store
+    assert len(store) == 1
+    assert list(store.items()) == [("b.md", "b")]
+
+
+def test_empty_index_buckets_removed():
+    store = FileStore({"a.md": "a"})
+    del store["a.md"]
+
+    assert store._by_extension == {}
+    assert store._by_directory == {}
+    assert store._positions == {}
+
+
+def test_clear():
+    backing = {"a.md": "a", "posts/b.md": "b"}
+    store = FileStore(backing)
+    store.clear()
+
+    assert backing == {}
+    assert len(store) == 0
+    assert store.match("*.md") == []
+    assert store._by_extension == {}
+    assert store._by_directory == {}
+    assert store._positions == {}
+
+    store["c.md"] = "c"
+    assert store.match("*.md") == ["c.md"]
+
+
+def test_rename(store):
+    file_info = store["index.md"]
+    store.rename("index.md", os.path.join("posts", "index.md"))
+
+    assert "index.md" not in store
+    assert store[os.path.join("posts", "index.md")] is file_info
+    assert list(store)[-1] == os.path.join("posts", "index.md")
+    assert store.match("posts/*.md") == fnmatch.filter(store, "posts/*.md")
+
+    with pytest.raises(KeyError):
+        store.rename("missing", "other")
+
+
+def test_snapshot(store):
+    snapshot = store.snapshot()
+    del store["index.md"]
+
+    assert snapshot[0] == ("index.md", "INDEX.MD")
+    assert len(snapshot) == len(store) + 1
+
+
+@pytest.mark.parametrize("pattern1, pattern2, expected", (
+    ("*.md", "*.md", True),
+    ("*.md", "*.html", False),
+    ("*.md", "*", True),
+    ("*.md", "posts/*", True),
+    ("posts/*", "css/*", False),
+    ("posts/*", "posts/2020/*", True),
+    ("posts/*", "postscript/*", False),
+    ("index.md", "*.md", True),
+    ("*.html", "index.md", False),
+    ("*.md", re.compile(r"\.html$"), True),
+))
+def test_may_overlap(pattern1, pattern2, expected):
+    if isinstance(pattern1, str):
+        pattern1 = os.path.join(*pattern1.split("/"))
+
+    if isinstance(pattern2, str):
+        pattern2 = os.path.join(*pattern2.split("/"))
+
+    assert may_overlap(pattern1, pattern2) == expected
+    assert may_overlap(pattern2, pattern1) == expected
@@ -1,8 +1,17 @@
+import concurrent.futures
+import errno
 import os
+import re
+import sys
 import unittest.mock
 from unittest.mock import call
 
-from pysmith.util import scantree
+import pytest
+
+import pysmith.util
+from pysmith.ignore import IgnoreRules
+from pysmith.util import (config_fingerprint, content_digest, copy_file, exchange_paths, file_digest, read_file,
+                          remove_file, scantree, scantree_parallel)
 
 
 def create_dir_entry(name, path, is_dir):
@@ -45,3 +54,271 @@ def test_scantree(monkeypatch):
         call("root"),
         call(os.path.join("root", "dir")),
     ), any_order=True)
+
+
+def test_scantree_ignore(tmp_path, monkeypatch):
+    for name in ("a", "b.swp", "dir/c", "dir/vendor/d", "node_modules/e"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"contents")
+
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr("os.scandir", lambda path: scanned.append(path) or scandir(path))
+    ignore = IgnoreRules(["node_modules/", "dir/vendor", "*.swp"])
+
+    entries = list(scantree(str(tmp_path), ignore=ignore))
+    assert sorted(name for name, _ in entries) == ["a", os.path.join("dir", "c")]
+    assert sorted(scanned) == [str(tmp_path), str(tmp_path / "dir")]
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        parallel_entries = list(scantree_parallel(str(tmp_path), executor, ignore))
+
+    assert [name for name, _ in parallel_entries] == [name for name, _ in entries]
+
+
+def test_scantree_deep_tree(tmp_path):
+    depth = sys.getrecursionlimit() + 100
+    directory = str(tmp_path)
+    for _ in range(depth):
+        directory += os.sep + "d"
+        os.mkdir(directory)
+
+    with open(directory + os.sep + "file", "wb") as f:
+        f.write(b"contents")
+
+    try:
+        assert [name for name, _ in scantree(str(tmp_path))] == [os.sep.join(["d"] * depth + ["file"])]
+    finally:
+        # shutil.rmtree recurses into the tree, so it is removed here rather than by the tmp_path fixture.
+        os.remove(directory + os.sep + "file")
+        for _ in range(depth):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+
+@pytest.mark.parametrize("parallel", (False, True), ids=("sequential", "parallel"))
+def test_scantree_sort(tmp_path, parallel):
+    names = ("c", "a/z", "a/b/y", "a/a", "b")
+    for name in names:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"contents")
+
+    if parallel:
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            entries = list(scantree_parallel(str(tmp_path), executor, sort=True))
+    else:
+        entries = list(scantree(str(tmp_path), sort=True))
+
+    expected = ("a/a", "a/b/y", "a/z", "b", "c")
+    assert [name for name, _ in entries] == [os.path.join(*name.split("/")) for name in expected]
+
+
+@pytest.mark.parametrize("size", (None, 8, 4, 12), ids=("unknown", "exact", "grew", "shrank"))
+def test_read_file(tmp_path, monkeypatch, size):
+    monkeypatch.setattr("pysmith.util._READ_CHUNK_SIZE", 2)
+    path = tmp_path / "file"
+    path.write_bytes(b"contents")
+
+    assert read_file(str(path), size) == b"contents"
+
+
+def test_read_file_short_reads(tmp_path, monkeypatch):
+    read = os.read
+    requests = []
+
+    def short_read(fd, count):
+        requests.append(count)
+        return read(fd, min(count, 4096))
+
+    monkeypatch.setattr(os, "read", short_read)
+    monkeypatch.setattr("pysmith.util._MAX_READ_SIZE", 8192)
+    path = tmp_path / "file"
+    path.write_bytes(bytes(range(256)) * 40)
+
+    assert read_file(str(path), 10240) == bytes(range(256)) * 40
+    assert max(requests) == 8192
+
+
+def test_read_file_empty(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"")
+
+    assert read_file(str(path), 0) == b""
+    assert read_file(str(path)) == b""
+
+
+def test_scantree_parallel(tmp_path):
+    for name in ("b", "a/c", "a/d/e", "a/d/f", "g/h", "i"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"contents")
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        entries = list(scantree_parallel(str(tmp_path), executor))
+
+    assert [(name, entry.path) for name, entry in entries] == [
+        (name, entry.path) for name, entry in scantree(str(tmp_path))
+    ]
+    assert sorted(name for name, _ in entries) == sorted(
+        os.path.join(*name.split("/")) for name in ("b", "a/c", "a/d/e", "a/d/f", "g/h", "i"))
+
+
+def test_remove_file(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"contents")
+
+    assert remove_file(str(path))
+    assert not path.exists()
+    assert not remove_file(str(path))
+
+
+@pytest.mark.parametrize("link_mode", (None, "hardlink", "reflink"))
+def test_copy_file(tmp_path, link_mode):
+    src = tmp_path / "src"
+    dest = tmp_path / "dest"
+    src.write_bytes(b"contents")
+    dest.write_bytes(b"previous contents")
+
+    copy_file(str(src), str(dest), link_mode=link_mode)
+
+    assert dest.read_bytes() == b"contents"
+    assert os.path.samefile(str(src), str(dest)) == (link_mode == "hardlink")
+
+
+@pytest.mark.parametrize("error", (errno.EXDEV, errno.EPERM))
+def test_copy_file_hardlink_unsupported(tmp_path, monkeypatch, error):
+    def unsupported_link(src, dst):
+        raise OSError(error, "unsupported")
+
+    monkeypatch.setattr(os, "link", unsupported_link)
+    src = tmp_path / "src"
+    dest = tmp_path / "dest"
+    src.write_bytes(b"contents")
+
+    assert copy_file(str(src), str(dest), link_mode="hardlink") == 8
+    assert dest.read_bytes() == b"contents"
+    assert not os.path.samefile(str(src), str(dest))
+
+
+def test_copy_file_hardlink_error(tmp_path, monkeypatch):
+    def failing_link(src, dst):
+        raise OSError(errno.EIO, "error")
+
+    monkeypatch.setattr(os, "link", failing_link)
+    src = tmp_path / "src"
+    src.write_bytes(b"contents")
+
+    with pytest.raises(OSError):
+        copy_file(str(src), str(tmp_path / "dest"), link_mode="hardlink")
+
+
+def test_copy_file_replaces_hardlink(tmp_path):
+    src = tmp_path / "src"
+    other = tmp_path / "other"
+    dest = tmp_path / "dest"
+    src.write_bytes(b"contents")
+    other.write_bytes(b"other")
+    os.link(str(src), str(dest))
+
+    copy_file(str(other), str(dest))
+
+    assert src.read_bytes() == b"contents"
+    assert dest.read_bytes() == b"other"
+
+
+def test_copy_file_kernel_copy_unsupported(tmp_path, monkeypatch):
+    def unsupported_copy(in_fd, out_fd, offset, count):
+        os.write(out_fd, b"partial")
+        raise OSError(errno.EXDEV, "unsupported")
+
+    monkeypatch.setattr(pysmith.util, "_KERNEL_COPIES", (unsupported_copy,))
+    src = tmp_path / "src"
+    dest = tmp_path / "dest"
+    src.write_bytes(b"contents")
+
+    copy_file(str(src), str(dest))
+
+    assert dest.read_bytes() == b"contents"
+
+
+def test_copy_file_kernel_copy_error(tmp_path, monkeypatch):
+    def failing_copy(in_fd, out_fd, offset, count):
+        raise OSError(errno.EIO, "error")
+
+    monkeypatch.setattr(pysmith.util, "_KERNEL_COPIES", (failing_copy,))
+    src = tmp_path / "src"
+    src.write_bytes(b"contents")
+
+    with pytest.raises(OSError):
+        copy_file(str(src), str(tmp_path / "dest"))
+
+
+class FingerprintPlugin(object):
+
+    def __init__(self, value, selector=None):
+        self._value = value
+        self._pattern = re.compile(r".*\.md")
+        self._selector = selector
+
+
+class StatefulPlugin(object):
+
+    def __init__(self, value):
+        self._value = value
+        self._cache = object()
+
+    def __getstate__(self):
+        return {"value": self._value}
+
+
+def test_content_digest():
+    assert content_digest(b"contents") == content_digest(b"contents")
+    assert content_digest(b"contents") != content_digest(b"other")
+
+
+def test_exchange_paths(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "file").write_bytes(b"a")
+    (tmp_path / "b").write_bytes(b"b")
+
+    if not exchange_paths(str(tmp_path / "a"), str(tmp_path / "b")):
+        pytest.skip("Atomic exchange is not supported")
+
+    assert (tmp_path / "a").read_bytes() == b"b"
+    assert (tmp_path / "b" / "file").read_bytes() == b"a"
+
+    with pytest.raises(FileNotFoundError):
+        exchange_paths(str(tmp_path / "a"), str(tmp_path / "missing"))
+
+
+def test_file_digest(tmp_path):
+    contents = os.urandom(3 * 1024 * 1024 + 7)
+    (tmp_path / "file").write_bytes(contents)
+
+    assert file_digest(str(tmp_path / "file")) == content_digest(contents)
+
+
+def test_config_fingerprint_stable():
+    assert config_fingerprint([FingerprintPlugin("a")]) == config_fingerprint([FingerprintPlugin("a")])
+
+
+@pytest.mark.parametrize("other", (
+    [FingerprintPlugin("b")],
+    [FingerprintPlugin("a", selector=lambda f: f.metadata["key"])],
+    [FingerprintPlugin("a"), FingerprintPlugin("a")],
+), ids=("value", "selector", "plugins"))
+def test_config_fingerprint_changes(other):
+    assert config_fingerprint([FingerprintPlugin("a")]) != config_fingerprint(other)
+
+
+def test_config_fingerprint_uses_getstate():
+    assert config_fingerprint(StatefulPlugin("a")) == config_fingerprint(StatefulPlugin("a"))
+    assert config_fingerprint(StatefulPlugin("a")) != config_fingerprint(StatefulPlugin("b"))
+
+
+def test_config_fingerprint_cycle():
+    plugin = FingerprintPlugin("a")
+    plugin._value = plugin
+    assert config_fingerprint(plugin) == config_fingerprint(plugin)
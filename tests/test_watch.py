@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+
+import pytest
+
+from pysmith import watch
+from pysmith.ignore import IgnoreRules
+from pysmith.watch import RESCAN, InotifyWatcher, PollingWatcher, create_watcher
+
+
+requires_inotify = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+
+
+def wait_for_changes(watcher, expected):
+    changes = set()
+    deadline = time.monotonic() + 5
+    while not expected <= changes and time.monotonic() < deadline:
+        changes |= watcher.wait(0.1)
+
+    return changes
+
+
+@pytest.fixture(params=("inotify", "polling"))
+def create(request):
+    if request.param == "inotify":
+        if not sys.platform.startswith("linux"):
+            pytest.skip("inotify is only available on Linux")
+
+        return InotifyWatcher
+
+    return lambda path, **kwargs: PollingWatcher(path, interval=0.01, **kwargs)
+
+
+def test_wait_timeout(tmp_path, create):
+    (tmp_path / "a").write_bytes(b"a")
+
+    with create(str(tmp_path)) as watcher:
+        assert watcher.wait(0.05) == set()
+
+
+def test_wait_modified(tmp_path, create):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "a").write_bytes(b"a")
+
+    with create(str(tmp_path)) as watcher:
+        (tmp_path / "dir" / "a").write_bytes(b"changed")
+
+        assert os.path.join("dir", "a") in wait_for_changes(watcher, {os.path.join("dir", "a")})
+
+
+def test_wait_created_and_deleted(tmp_path, create):
+    (tmp_path / "a").write_bytes(b"a")
+
+    with create(str(tmp_path)) as watcher:
+        os.remove(str(tmp_path / "a"))
+        (tmp_path / "b").write_bytes(b"b")
+
+        changes = wait_for_changes(watcher, {"a", "b"})
+        assert {"a", "b"} <= changes
+
+
+def test_wait_new_directory(tmp_path, create):
+    with create(str(tmp_path)) as watcher:
+        (tmp_path / "dir").mkdir()
+        (tmp_path / "dir" / "a").write_bytes(b"a")
+        wait_for_changes(watcher, {"dir"} if isinstance(watcher, InotifyWatcher) else {os.path.join("dir", "a")})
+
+        # Files in new directories are watched too.
+        (tmp_path / "dir" / "a").write_bytes(b"changed")
+        time.sleep(0.02)
+        assert os.path.join("dir", "a") in wait_for_changes(watcher, {os.path.join("dir", "a")})
+
+
+def test_wait_ignored(tmp_path, create):
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "a.js").write_bytes(b"a")
+
+    with create(str(tmp_path), ignore=IgnoreRules(["node_modules/", "*.swp"])) as watcher:
+        (tmp_path / "node_modules" / "a.js").write_bytes(b"changed")
+        (tmp_path / "b.swp").write_bytes(b"b")
+        (tmp_path / "c").write_bytes(b"c")
+
+        assert wait_for_changes(watcher, {"c"}) == {"c"}
+
+
+@requires_inotify
+def test_inotify_overflow(tmp_path):
+    with InotifyWatcher(str(tmp_path)) as watcher:
+        read_fd, write_fd = os.pipe()
+        os.close(watcher._fd)
+        watcher._fd = read_fd
+        os.write(write_fd, watch._EVENT_HEADER.pack(-1, watch._IN_Q_OVERFLOW, 0, 0))
+        os.close(write_fd)
+
+        assert watcher.wait(5) == {RESCAN}
+
+
+def test_create_watcher(tmp_path):
+    with create_watcher(str(tmp_path), polling=True) as watcher:
+        assert isinstance(watcher, PollingWatcher)
+
+    with create_watcher(str(tmp_path)) as watcher:
+        expected = InotifyWatcher if sys.platform.startswith("linux") else PollingWatcher
+        assert isinstance(watcher, expected)
+
+
+@requires_inotify
+def test_create_watcher_falls_back_to_polling(tmp_path, monkeypatch):
+    def fail():
+        raise OSError("error")
+
+    monkeypatch.setattr(watch, "_load_libc", fail)
+
+    with create_watcher(str(tmp_path)) as watcher:
+        assert isinstance(watcher, PollingWatcher)
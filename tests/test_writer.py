@@ -0,0 +1,258 @@
+import os
+import unittest.mock
+
+import pytest
+
+from pysmith import FileInfo
+from pysmith.util import content_digest
+from pysmith.writer import DELETED, UNCHANGED, WRITTEN, OutputWriter
+from .util import MockFileInfo, create_patch
+
+
+@pytest.fixture
+def mock_exists(monkeypatch):
+    return create_patch(monkeypatch, "os.path.exists")
+
+
+@pytest.fixture
+def mock_makedirs(monkeypatch):
+    return create_patch(monkeypatch, "os.makedirs")
+
+
+@pytest.fixture
+def mock_isdir(monkeypatch):
+    return create_patch(monkeypatch, "os.path.isdir")
+
+
+def test_invalid_link_mode():
+    with pytest.raises(ValueError):
+        OutputWriter("dest", link_mode="symlink")
+
+
+def test_write_directory_exists(mock_exists, mock_isdir):
+    mock_open = unittest.mock.mock_open()
+    mock_exists.return_value = True
+    mock_isdir.return_value = True
+
+    writer = OutputWriter("dest")
+    with unittest.mock.patch("pysmith.writer.open", mock_open):
+        writer.write("file_name", MockFileInfo(b"contents"))
+
+    path = os.path.join("dest", "file_name")
+    dirname = os.path.dirname(path)
+    mock_exists.assert_called_once_with(dirname)
+    mock_isdir.assert_called_once_with(dirname)
+    mock_open.assert_called_once_with(path, "wb")
+    mock_open.return_value.write.assert_called_once_with(b"contents")
+    assert writer.files_written == 1
+    assert writer.bytes_written == 8
+
+
+def test_write_directory_does_not_exist(mock_exists, mock_makedirs, mock_isdir):
+    mock_open = unittest.mock.mock_open()
+    mock_exists.return_value = False
+
+    writer = OutputWriter("dest")
+    with unittest.mock.patch("pysmith.writer.open", mock_open):
+        writer.write("file_name", MockFileInfo(b"contents"))
+
+    path = os.path.join("dest", "file_name")
+    dirname = os.path.dirname(path)
+    mock_exists.assert_called_once_with(dirname)
+    mock_makedirs.assert_called_once_with(dirname)
+    mock_isdir.assert_not_called()
+    mock_open.assert_called_once_with(path, "wb")
+    mock_open.return_value.write.assert_called_once_with(b"contents")
+
+
+def test_write_path_is_not_directory(mock_exists, mock_isdir):
+    mock_exists.return_value = True
+    mock_isdir.return_value = False
+
+    writer = OutputWriter("dest")
+    with pytest.raises(NotADirectoryError):
+        writer.write("file_name", MockFileInfo(b"contents"))
+
+
+def test_write_creates_directories_once(mock_exists, mock_makedirs, mock_isdir):
+    mock_open = unittest.mock.mock_open()
+    mock_exists.return_value = False
+
+    writer = OutputWriter("dest")
+    with unittest.mock.patch("pysmith.writer.open", mock_open):
+        writer.write(os.path.join("a", "b", "file1"), MockFileInfo(b"contents"))
+        writer.write(os.path.join("a", "b", "file2"), MockFileInfo(b"contents"))
+        writer.write(os.path.join("a", "file3"), MockFileInfo(b"contents"))
+        writer.write("file4", MockFileInfo(b"contents"))
+
+    mock_makedirs.assert_called_once_with(os.path.join("dest", "a", "b"))
+    assert writer.files_written == 4
+
+
+def test_write_copies_unmodified_files(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(b"contents")
+    file_info = FileInfo("src", str(src), src.stat())
+
+    writer = OutputWriter(str(tmp_path / "dest"))
+    writer.write(os.path.join("dir", "file"), file_info)
+
+    assert (tmp_path / "dest" / "dir" / "file").read_bytes() == b"contents"
+    assert file_info._contents is None
+    assert writer.bytes_written == 8
+
+
+@pytest.mark.parametrize("workers", (None, 2))
+def test_write_release(tmp_path, workers):
+    file_info = FileInfo("src", str(tmp_path / "src"), None, b"contents")
+
+    with OutputWriter(str(tmp_path / "dest"), workers=workers) as writer:
+        writer.write("file", file_info, release=True)
+
+    assert file_info._contents is None
+    assert file_info.path == str(tmp_path / "dest" / "file")
+    assert file_info.contents == b"contents"
+
+
+def test_write_concurrently(tmp_path):
+    dest = tmp_path / "dest"
+    with OutputWriter(str(dest), workers=4) as writer:
+        for i in range(50):
+            writer.write(os.path.join("dir{}".format(i % 5), "file{}".format(i)), MockFileInfo(b"x" * i))
+
+    assert writer.files_written == 50
+    assert writer.bytes_written == sum(range(50))
+    for i in range(50):
+        assert (dest / "dir{}".format(i % 5) / "file{}".format(i)).read_bytes() == b"x" * i
+
+
+def test_write_concurrently_error(tmp_path):
+    file_info = FileInfo("missing", str(tmp_path / "missing"), None)
+
+    with pytest.raises(FileNotFoundError):
+        with OutputWriter(str(tmp_path / "dest"), workers=2) as writer:
+            writer.write("file", file_info)
+
+
+def test_delete(tmp_path):
+    dest = tmp_path / "dest"
+    (dest / "a" / "b").mkdir(parents=True)
+    (dest / "a" / "b" / "file").write_bytes(b"contents")
+    (dest / "other").write_bytes(b"contents")
+
+    writer = OutputWriter(str(dest))
+    writer.delete(os.path.join("a", "b", "file"))
+    writer.delete("missing")
+
+    assert os.listdir(str(dest)) == ["other"]
+    assert writer.files_deleted == 1
+    assert writer.outcomes == {os.path.join("a", "b", "file"): DELETED}
+
+    writer.write(os.path.join("a", "b", "file"), MockFileInfo(b"new"))
+    assert (dest / "a" / "b" / "file").read_bytes() == b"new"
+
+
+def test_keep():
+    writer = OutputWriter("dest")
+    writer.keep("file")
+
+    assert writer.outcomes == {"file": UNCHANGED}
+    assert writer.files_unchanged == 1
+
+
+@pytest.mark.parametrize("workers", (None, 2))
+def test_write_skip_unchanged(tmp_path, workers):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    for name in ("same", "different", "size"):
+        (dest / name).write_bytes(b"old")
+        os.utime(str(dest / name), ns=(0, 0))
+
+    with OutputWriter(str(dest), workers=workers, skip_unchanged=True) as writer:
+        writer.write("same", MockFileInfo(b"old"))
+        writer.write("different", MockFileInfo(b"new"))
+        writer.write("size", MockFileInfo(b"longer"))
+        writer.write("missing", MockFileInfo(b"new"))
+
+    assert writer.outcomes == {"same": UNCHANGED, "different": WRITTEN, "size": WRITTEN, "missing": WRITTEN}
+    assert (writer.files_written, writer.files_unchanged) == (3, 1)
+    assert os.stat(str(dest / "same")).st_mtime_ns == 0
+    assert (dest / "different").read_bytes() == b"new"
+    assert (dest / "size").read_bytes() == b"longer"
+    for name, output in writer.outputs.items():
+        stats = os.stat(str(dest / name))
+        assert output == {
+            "digest": content_digest((dest / name).read_bytes()), "size": stats.st_size, "mtime": stats.st_mtime_ns,
+        }
+
+
+def test_write_skip_unchanged_with_previous(tmp_path, monkeypatch):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    (dest / "file").write_bytes(b"old")
+    os.utime(str(dest / "file"), ns=(0, 0))
+    mock_file_digest = unittest.mock.Mock()
+    monkeypatch.setattr("pysmith.writer.file_digest", mock_file_digest)
+
+    # The recorded state matches the destination, so the recorded digest is trusted rather than hashing the file.
+    writer = OutputWriter(str(dest), skip_unchanged=True)
+    writer.write("file", MockFileInfo(b"new"), {"digest": content_digest(b"new"), "size": 3, "mtime": 0})
+    assert writer.outcomes == {"file": UNCHANGED}
+    mock_file_digest.assert_not_called()
+
+    mock_file_digest.return_value = content_digest(b"old")
+    writer = OutputWriter(str(dest), skip_unchanged=True)
+    writer.write("file", MockFileInfo(b"new"), {"digest": content_digest(b"new"), "size": 3, "mtime": 1})
+    assert writer.outcomes == {"file": WRITTEN}
+    assert (dest / "file").read_bytes() == b"new"
+
+
+def test_prune(tmp_path):
+    dest = tmp_path / "dest"
+    (dest / "a" / "b").mkdir(parents=True)
+    (dest / "a" / "b" / "stale").write_bytes(b"stale")
+    (dest / "a" / "keep").write_bytes(b"keep")
+    (dest / "stale").write_bytes(b"stale")
+
+    writer = OutputWriter(str(dest))
+    writer.prune({os.path.join("a", "keep"), "missing"})
+
+    assert os.listdir(str(dest)) == ["a"]
+    assert os.listdir(str(dest / "a")) == ["keep"]
+    assert writer.outcomes == {os.path.join("a", "b", "stale"): DELETED, "stale": DELETED}
+
+
+@pytest.mark.parametrize("workers", (None, 2))
+def test_write_previous_dest(tmp_path, workers):
+    previous = tmp_path / "previous"
+    previous.mkdir()
+    (previous / "same").write_bytes(b"same")
+    (previous / "different").write_bytes(b"old")
+
+    with OutputWriter(str(tmp_path / "dest"), workers=workers, previous_dest=str(previous)) as writer:
+        writer.write(os.path.join("dir", "same"), MockFileInfo(b"same"))
+        writer.write("same", MockFileInfo(b"same"))
+        writer.write("different", MockFileInfo(b"new"))
+
+    assert writer.outcomes == {os.path.join("dir", "same"): WRITTEN, "same": UNCHANGED, "different": WRITTEN}
+    assert os.path.samefile(str(previous / "same"), str(tmp_path / "dest" / "same"))
+    assert (tmp_path / "dest" / "different").read_bytes() == b"new"
+    assert (previous / "different").read_bytes() == b"old"
+
+
+def test_write_previous_dest_link_fails(tmp_path, monkeypatch):
+    previous = tmp_path / "previous"
+    previous.mkdir()
+    (previous / "same").write_bytes(b"same")
+    os.utime(str(previous / "same"), ns=(0, 0))
+
+    def fail(*args):
+        raise OSError("error")
+
+    monkeypatch.setattr(os, "link", fail)
+    writer = OutputWriter(str(tmp_path / "dest"), previous_dest=str(previous))
+    writer.write("same", MockFileInfo(b"same"))
+
+    assert writer.outcomes == {"same": UNCHANGED}
+    assert (tmp_path / "dest" / "same").read_bytes() == b"same"
+    assert os.stat(str(tmp_path / "dest" / "same")).st_mtime_ns == 0
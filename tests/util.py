@@ -1,11 +1,43 @@
+import concurrent.futures
+import os
 import unittest.mock
 
+import pytest
+
+from pysmith import BuildInfo, FileInfo
+from pysmith.plugin_util import FilePlugin
+from pysmith.util import content_digest
+
 
 class MockFileInfo(object):
 
     def __init__(self, contents, metadata=None):
         self.contents = contents
         self.metadata = metadata or {}
+        self.modified = True
+        self.dependencies = set()
+
+    @property
+    def size(self):
+        return len(self.contents)
+
+    @property
+    def text(self):
+        return self.contents.decode() if isinstance(self.contents, bytes) else self.contents
+
+    @text.setter
+    def text(self, value):
+        self.contents = value.encode()
+
+    @property
+    def digest(self):
+        return content_digest(self.get_buffer())
+
+    def add_dependency(self, kind, name):
+        self.dependencies.add((kind, name))
+
+    def get_buffer(self):
+        return self.contents
 
     def __eq__(self, other):
         return self.contents == other.contents and self.metadata == other.metadata
@@ -14,6 +46,44 @@ class MockFileInfo(object):
         return "MockFileInfo(contents={}, metadata={}".format(self.contents, self.metadata)
 
 
+class UpperPlugin(FilePlugin):
+
+    def process_file(self, build_info, file_name, file_info):
+        file_info.contents = file_info.contents.upper() + build_info.metadata["suffix"]
+        file_info.metadata["pid"] = os.getpid()
+        if file_name.startswith("rename"):
+            return "renamed_" + file_name
+
+        return None
+
+
+class UnpicklablePlugin(UpperPlugin):
+
+    def __init__(self, match_pattern):
+        super().__init__(match_pattern)
+        self._selector = lambda f: f
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+def create_build_info(count):
+    build_info = BuildInfo(files={
+        "{}{}.md".format("rename" if i % 3 == 0 else "file", i): FileInfo("name", "path", None, b"c%d" % i)
+        for i in range(count)
+    })
+    build_info.files["other.txt"] = FileInfo("name", "path", None, b"other")
+    build_info.metadata["suffix"] = b"!"
+    return build_info
+
+
+def create_file_info(path, contents=None):
+    return FileInfo(os.path.basename(path), path, os.stat(path), contents)
+
+
 def create_patch(monkeypatch, target):
     mock = unittest.mock.Mock()
     monkeypatch.setattr(target, mock)